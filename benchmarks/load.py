@@ -0,0 +1,418 @@
+"""
+Load test of the web API, against a local app.
+
+The app runs in a process of its own (in a threaded werkzeug server), so the clients don't compete with it for the
+GIL. It has stand-ins for its services: Redis is replaced with fakeredis, Celery tasks run eagerly (in the request's
+thread), and the data source is a SQLite database with synthetic data. Only the app's database is real: it's the PostgreSQL database given with --database-url, and its
+tables are dropped and created again, so never point it at a database you care about.
+
+Concurrent clients run a mix of scenarios (see SCENARIOS) for the given duration:
+
+    dashboard     loading a dashboard and the results of all its widgets
+    query_result  fetching a query's result with max_age (--miss-rate of them miss the cache and execute the query)
+    job           polling an executed query's job
+    search        searching queries
+    api_results   fetching a query's results.json with the query's API key
+
+Each endpoint's latency percentiles (p50/p95/p99) and throughput are reported, along with the database queries and
+Redis commands each request runs (on average). Pipelines count as one Redis command, and the work streamed responses
+do after their headers are sent isn't counted.
+
+Usage:
+
+    python -m benchmarks.load --database-url postgresql://localhost/redash_load --concurrency 8 --duration 30
+
+Needs fakeredis (see requirements_dev.txt).
+"""
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Weights of the scenarios in the mix (the --mix option overrides them):
+SCENARIOS = collections.OrderedDict([
+    ('dashboard', 2),
+    ('query_result', 4),
+    ('job', 2),
+    ('search', 1),
+    ('api_results', 2),
+])
+
+SEARCH_TERMS = ['events', 'country', 'Query', 'count', 'nothing']
+
+
+class Counters(threading.local):
+    """Database queries and Redis commands run by the current thread (each request is served by its own thread)."""
+    db_queries = 0
+    redis_commands = 0
+
+counters = Counters()
+
+
+class CountingRedis(object):
+    """Proxy of a Redis client, counting the commands sent through it."""
+    def __init__(self, redis):
+        self._redis = redis
+
+    def __getattr__(self, name):
+        attr = getattr(self._redis, name)
+        if not callable(attr):
+            return attr
+
+        def command(*args, **kwargs):
+            counters.redis_commands += 1
+            return attr(*args, **kwargs)
+
+        return command
+
+
+class NoSignals(object):
+    """Stand-in for the signal module: tasks run eagerly in the server's threads, where handlers can't be set."""
+    SIGINT = 2
+
+    @staticmethod
+    def signal(signum, handler):
+        pass
+
+
+def setup_environment(database_url):
+    """Set up the stand-ins, which has to happen before the app's modules are imported."""
+    os.environ['REDASH_DATABASE_URL'] = database_url
+    os.environ['REDASH_ENABLED_QUERY_RUNNERS'] = 'redash.query_runner.sqlite'
+    os.environ['REDASH_VERSION_CHECK'] = 'false'
+
+    import redis
+    import fakeredis
+    redis.StrictRedis = fakeredis.FakeStrictRedis
+
+    import redash
+    redash.redis_connection = CountingRedis(redash.redis_connection)
+
+    from redash.worker import celery
+    celery.conf.update(CELERY_ALWAYS_EAGER=True, CELERY_RESULT_BACKEND='cache', CELERY_CACHE_BACKEND='memory')
+
+    from redash import tasks
+    tasks.signal = NoSignals
+
+    from redash.models import db
+    execute_sql = db.database.execute_sql
+
+    def counting_execute_sql(*args, **kwargs):
+        counters.db_queries += 1
+        return execute_sql(*args, **kwargs)
+
+    db.database.execute_sql = counting_execute_sql
+
+
+def create_data(dbpath, rows):
+    connection = sqlite3.connect(dbpath)
+    connection.execute("CREATE TABLE events (id INTEGER, country TEXT, browser TEXT, amount REAL, created_at TEXT)")
+    connection.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?)",
+                           ((i, random.choice(['IL', 'US', 'DE', 'FR']), random.choice(['Chrome', 'Firefox']),
+                             random.random() * 100, '2016-01-01T00:00:{:02d}'.format(i % 60)) for i in xrange(rows)))
+    connection.commit()
+    connection.close()
+
+
+def create_fixtures(dbpath, queries_count, dashboards_count, widgets_count):
+    """Create the app's fixtures: a user, a SQLite data source, queries with results, and dashboards."""
+    from redash import models, utils
+    from redash.query_runner.sqlite import Sqlite
+    from redash.utils.configuration import ConfigurationContainer
+
+    models.create_db(True, True)
+    models.db.connect_db()
+
+    org, admin_group, default_group = models.init_db()
+    user = models.User.create(org=org, name='Load Test', email='load@example.com',
+                              groups=[admin_group.id, default_group.id])
+    data_source = models.DataSource.create_with_group(
+        org=org, name='SQLite', type='sqlite',
+        options=ConfigurationContainer({'dbpath': dbpath}, Sqlite.configuration_schema()))
+
+    queries = []
+    for i in range(queries_count):
+        text = "SELECT country, browser, count(*) AS count, sum(amount) AS amount FROM events " \
+               "WHERE id % {} = 0 GROUP BY country, browser".format(i + 1)
+        query = models.Query.create(org=org, name="Query {}".format(i), description='', query=text, user=user,
+                                    data_source=data_source, is_archived=False, schedule=None)
+        models.Visualization.create(query=query, type='CHART', name='Chart', description='',
+                                    options=json.dumps({'columnMapping': {'country': 'x', 'count': 'y'}}))
+
+        data, error = data_source.query_runner.run_query(text)
+        models.QueryResult.store_result(org.id, data_source.id, utils.gen_query_hash(text), text, data, 0.1,
+                                        utils.utcnow())
+        queries.append(models.Query.get_by_id(query.id))
+
+    dashboards = []
+    for i in range(dashboards_count):
+        dashboard = models.Dashboard.create(org=org, name="Dashboard {}".format(i), user=user, layout='[]',
+                                            groups=[default_group.id])
+        widgets = []
+        for query in random.sample(queries, min(widgets_count, len(queries))):
+            visualization = random.choice(list(query.visualizations))
+            widgets.append(models.Widget.create(dashboard=dashboard, visualization=visualization, width=1,
+                                                options='{}'))
+
+        dashboard.layout = json.dumps([[w.id] for w in widgets])
+        dashboard.save()
+        dashboards.append(dashboard)
+
+    models.db.close_db(None)
+
+    return {
+        'api_key': user.api_key,
+        'data_source_id': data_source.id,
+        'queries': [(q.id, q.query, q.api_key) for q in queries],
+        'dashboards': [d.slug for d in dashboards]
+    }
+
+
+def make_app_server(app):
+    from werkzeug.serving import make_server
+
+    @app.before_request
+    def reset_counters():
+        counters.db_queries = 0
+        counters.redis_commands = 0
+
+    @app.after_request
+    def add_counters(response):
+        response.headers['X-Load-DB-Queries'] = str(counters.db_queries)
+        response.headers['X-Load-Redis-Commands'] = str(counters.redis_commands)
+        return response
+
+    return make_server('127.0.0.1', 0, app, threaded=True)
+
+
+def serve(args, dbpath, connection):
+    """
+    Run the app (in the server process): create its data and fixtures, and serve it until terminated. The server's
+    port and the fixtures are sent back through the connection (or the error that kept the app from starting).
+    """
+    try:
+        setup_environment(args.database_url)
+        from redash.wsgi import app
+
+        random.seed(0)
+        create_data(dbpath, args.rows)
+        fixtures = create_fixtures(dbpath, args.queries, args.dashboards, args.widgets)
+        server = make_app_server(app)
+    except Exception as e:
+        connection.send((None, "{}: {}".format(e.__class__.__name__, e)))
+        raise
+
+    connection.send((server.server_port, fixtures))
+    server.serve_forever()
+
+
+def start_server_process(args, dbpath):
+    """Start the app's process, and return it along with the server's port and the fixtures, once it's serving."""
+    connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(args, dbpath, child_connection))
+    process.daemon = True
+    process.start()
+
+    # Creating the fixtures takes a while:
+    while not connection.poll(1):
+        if not process.is_alive():
+            raise Exception("The app's process exited before it started serving.")
+
+    port, fixtures = connection.recv()
+    if port is None:
+        process.join()
+        raise Exception("The app failed to start: {}".format(fixtures))
+
+    return process, port, fixtures
+
+
+class Client(object):
+    def __init__(self, base_url, fixtures, miss_rate, jobs, record):
+        import requests
+
+        self.base_url = base_url
+        self.fixtures = fixtures
+        self.miss_rate = miss_rate
+        self.jobs = jobs
+        self.record = record
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = 'Key {}'.format(fixtures['api_key'])
+
+    def request(self, name, method, path, **kwargs):
+        started_at = time.time()
+        response = self.session.request(method, self.base_url + path, **kwargs)
+        content = response.content
+        latency = time.time() - started_at
+
+        self.record(name, latency, response.status_code,
+                    int(response.headers.get('X-Load-DB-Queries', 0)),
+                    int(response.headers.get('X-Load-Redis-Commands', 0)))
+
+        return response, content
+
+    def dashboard(self):
+        slug = random.choice(self.fixtures['dashboards'])
+        self.request('dashboard', 'GET', '/api/dashboards/{}'.format(slug))
+        self.request('dashboard_results', 'GET', '/api/dashboards/{}/results'.format(slug))
+
+    def query_result(self):
+        query_id, text, _ = random.choice(self.fixtures['queries'])
+        max_age = 0 if random.random() < self.miss_rate else 3600
+        response, content = self.request('query_result', 'POST', '/api/query_results',
+                                         data=json.dumps({'query': text, 'query_id': query_id, 'max_age': max_age,
+                                                          'data_source_id': self.fixtures['data_source_id']}))
+
+        if response.status_code == 200:
+            job = json.loads(content).get('job')
+            if job:
+                self.jobs.append(job['id'])
+
+    def job(self):
+        if not self.jobs:
+            return self.query_result()
+
+        self.request('job', 'GET', '/api/jobs/{}'.format(random.choice(self.jobs)))
+
+    def search(self):
+        self.request('search', 'GET', '/api/queries/search', params={'q': random.choice(SEARCH_TERMS)})
+
+    def api_results(self):
+        query_id, _, api_key = random.choice(self.fixtures['queries'])
+        # Authenticated with the query's API key only (None drops the session's header):
+        self.request('api_results', 'GET', '/api/queries/{}/results.json'.format(query_id),
+                     params={'api_key': api_key}, headers={'Authorization': None})
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(round(p / 100.0 * (len(values) - 1)))]
+
+
+def report(samples, duration):
+    results = {}
+    for name, name_samples in sorted(samples.iteritems()):
+        latencies = [s[0] * 1000 for s in name_samples]
+        results[name] = {
+            'requests': len(name_samples),
+            'errors': len([s for s in name_samples if s[1] >= 400]),
+            'throughput': len(name_samples) / duration,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'db_queries': sum(s[2] for s in name_samples) / float(len(name_samples)),
+            'redis_commands': sum(s[3] for s in name_samples) / float(len(name_samples)),
+        }
+
+    return results
+
+
+def print_report(results):
+    print "{:<18} {:>8} {:>7} {:>8} {:>9} {:>9} {:>9} {:>8} {:>8}".format(
+        'endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'db/req', 'redis/req')
+    for name, r in sorted(results.iteritems()):
+        print "{:<18} {:>8} {:>7} {:>8.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>8.1f} {:>8.1f}".format(
+            name, r['requests'], r['errors'], r['throughput'], r['p50'], r['p95'], r['p99'], r['db_queries'],
+            r['redis_commands'])
+
+
+def parse_mix(value):
+    mix = collections.OrderedDict()
+    for part in value.split(','):
+        name, weight = part.split('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError("Unknown scenario: {}".format(name))
+        mix[name] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the web API against a local app.")
+    parser.add_argument('--database-url', required=True,
+                        help="PostgreSQL database for the app (its tables get dropped and created again)")
+    parser.add_argument('--concurrency', type=int, default=8, help="number of concurrent clients (default: 8)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run the load for (default: 30)")
+    parser.add_argument('--mix', type=parse_mix, default=SCENARIOS,
+                        help="weights of the scenarios, like dashboard=2,search=1 (default: {})".format(
+                            ",".join("{}={}".format(k, v) for k, v in SCENARIOS.iteritems())))
+    parser.add_argument('--miss-rate', type=float, default=0.1,
+                        help="fraction of query result fetches that execute the query (default: 0.1)")
+    parser.add_argument('--queries', type=int, default=50, help="number of queries to create (default: 50)")
+    parser.add_argument('--dashboards', type=int, default=5, help="number of dashboards to create (default: 5)")
+    parser.add_argument('--widgets', type=int, default=10, help="widgets per dashboard (default: 10)")
+    parser.add_argument('--rows', type=int, default=10000, help="rows of the SQLite table (default: 10000)")
+    parser.add_argument('--output', help="file to write the results to (JSON)")
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    directory = tempfile.mkdtemp()
+    dbpath = os.path.join(directory, 'load.sqlite')
+    process = None
+
+    try:
+        process, port, fixtures = start_server_process(args, dbpath)
+        base_url = 'http://127.0.0.1:{}'.format(port)
+
+        samples = collections.defaultdict(list)
+        lock = threading.Lock()
+        jobs = collections.deque(maxlen=1000)
+
+        def record(name, latency, status_code, db_queries, redis_commands):
+            with lock:
+                samples[name].append((latency, status_code, db_queries, redis_commands))
+
+        scenarios = args.mix.keys()
+        weights = args.mix.values()
+        deadline = time.time() + args.duration
+
+        def run_client():
+            client = Client(base_url, fixtures, args.miss_rate, jobs, record)
+            while time.time() < deadline:
+                scenario = weighted_choice(scenarios, weights)
+                try:
+                    getattr(client, scenario)()
+                except Exception as e:
+                    print >> sys.stderr, "{} failed: {}".format(scenario, e)
+
+        started_at = time.time()
+        clients = [threading.Thread(target=run_client) for _ in range(args.concurrency)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        duration = time.time() - started_at
+    finally:
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join()
+        shutil.rmtree(directory)
+
+    results = report(samples, duration)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'duration': duration, 'results': results}, f, indent=2,
+                      sort_keys=True)
+
+    return 0
+
+
+def weighted_choice(choices, weights):
+    point = random.random() * sum(weights)
+    for choice, weight in zip(choices, weights):
+        point -= weight
+        if point < 0:
+            return choice
+    return choices[-1]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+Benchmarks of the stages query results go through, from fetching them to serving them.
+
+Results are synthetic (of several sizes and widths) and are fetched from a SQLite database by the SQLite query runner.
+Each stage is timed separately:
+
+    fetch        the SQLite query runner's whole run_query (running the query, fetching the rows, building the data and
+                 serializing it)
+    build        building the result's data (fetch_data: converting values and building the rows)
+    serialize    serializing the data to JSON
+    store        storing the result (QueryResult.store_result, only with --with-database)
+    reload       loading the stored result and decoding it (only with --with-database)
+    json         the API's JSON response
+    csv          the CSV export
+    xlsx         the Excel export
+
+Usage:
+
+    python -m benchmarks.results_pipeline --output results.json
+    python -m benchmarks.results_pipeline --baseline results.json --threshold 0.2
+
+With --baseline, the timings are compared with the ones stored in the given file (the output of an earlier run), and the
+command fails (with exit code 1) when any of them is slower than the baseline by more than the threshold (and by more
+than --min-difference seconds, so the shortest stages don't fail on noise).
+
+`make benchmark` compares with benchmarks/baseline.json, and `make benchmark-baseline` records it again. Timings depend
+on the machine, so record a baseline on the machine the comparisons run on before relying on them.
+"""
+import argparse
+import datetime
+import decimal
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from redash import models, utils
+# The app has to be set up before the handlers are imported (it imports them itself):
+from redash.wsgi import app
+from redash.handlers.query_results import QueryResultAPI
+from redash.query_runner import TYPE_BOOLEAN, TYPE_DATE, TYPE_DATETIME, TYPE_FLOAT, TYPE_INTEGER, TYPE_STRING
+from redash.query_runner.sqlite import Sqlite
+from redash.utils.configuration import ConfigurationContainer
+
+STAGES = ('fetch', 'build', 'serialize', 'store', 'reload', 'json', 'csv', 'xlsx')
+DATABASE_STAGES = ('store', 'reload')
+
+# The types of the synthetic columns, cycled through to get each width: (SQLite type, Redash type). REAL and NUMERIC
+# columns are both floats to Redash, but the build stage gets them as floats and as Decimals (see python_value).
+COLUMN_TYPES = [
+    ('INTEGER', TYPE_INTEGER),
+    ('TEXT', TYPE_STRING),
+    ('REAL', TYPE_FLOAT),
+    ('TEXT', TYPE_DATETIME),
+    ('NUMERIC', TYPE_FLOAT),
+    ('TEXT', TYPE_DATE),
+    ('INTEGER', TYPE_BOOLEAN),
+]
+
+
+def generate_value(column_type, i):
+    if column_type == TYPE_INTEGER:
+        return i
+    if column_type == TYPE_STRING:
+        return u"value {}".format(random.randint(0, 10 ** 6))
+    if column_type == TYPE_FLOAT:
+        return random.random() * 1000
+    if column_type == TYPE_DATETIME:
+        return (datetime.datetime(2016, 1, 1) + datetime.timedelta(seconds=i)).isoformat()
+    if column_type == TYPE_DATE:
+        return (datetime.date(2016, 1, 1) + datetime.timedelta(days=i % 1000)).isoformat()
+    if column_type == TYPE_BOOLEAN:
+        return i % 2
+    return None
+
+
+def python_value(sqlite_type, column_type, value):
+    """The value as a driver with native types (like psycopg2) would return it."""
+    if sqlite_type == 'NUMERIC':
+        return decimal.Decimal(repr(value))
+    if column_type == TYPE_DATETIME:
+        return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+    if column_type == TYPE_DATE:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    if column_type == TYPE_BOOLEAN:
+        return bool(value)
+    return value
+
+
+def create_table(dbpath, rows, width):
+    column_types = [COLUMN_TYPES[i % len(COLUMN_TYPES)] for i in range(width)]
+    table = "results_{}x{}".format(rows, width)
+
+    connection = sqlite3.connect(dbpath)
+    connection.execute("CREATE TABLE {} ({})".format(
+        table, ", ".join("c{} {}".format(i, sqlite_type) for i, (sqlite_type, _) in enumerate(column_types))))
+    connection.executemany("INSERT INTO {} VALUES ({})".format(table, ", ".join("?" * width)),
+                           ([generate_value(t, i) for _, t in column_types] for i in xrange(rows)))
+    connection.commit()
+    connection.close()
+
+    return table, column_types
+
+
+class ListCursor(object):
+    """A DB-API cursor over rows already fetched, so building the data is timed on its own."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = len(rows)
+        self.position = 0
+
+    def fetchmany(self, size):
+        batch = self.rows[self.position:self.position + size]
+        self.position += len(batch)
+        return batch
+
+
+def timed(func, repeat):
+    """Run func repeat times, and return the best time (in seconds) along with its last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started_at = time.time()
+        result = func()
+        elapsed = time.time() - started_at
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
+
+
+def run_benchmark(runner, table, column_types, stages, repeat, data_source=None):
+    timings = {}
+    query = "SELECT * FROM {}".format(table)
+
+    def fetch():
+        json_data, error = runner.run_query(query)
+        if error is not None:
+            raise Exception("Failed running the benchmark's query: {}".format(error))
+
+    timings['fetch'], _ = timed(fetch, repeat)
+
+    connection = sqlite3.connect(runner.configuration['dbpath'])
+    cursor = connection.cursor()
+    cursor.execute(query)
+    rows = cursor.fetchall()
+    description = cursor.description
+    connection.close()
+
+    columns = [{'name': d[0], 'friendly_name': d[0], 'type': t} for d, (_, t) in zip(description, column_types)]
+    # Values of the types drivers with native types return, so the value converters get exercised too:
+    rows = [tuple(python_value(sqlite_type, t, v) for (sqlite_type, t), v in zip(column_types, row)) for row in rows]
+
+    timings['build'], data = timed(lambda: runner.fetch_data(ListCursor(rows), columns), repeat)
+    timings['serialize'], json_data = timed(lambda: utils.json_dumps(data), repeat)
+    # Only the serialized data is needed from here on:
+    rows = data = None
+
+    if 'store' in stages:
+        query_text = u"{} /* {} */".format(query, utils.generate_token(10))
+
+        def store():
+            query_result, _ = models.QueryResult.store_result(data_source.org_id, data_source.id,
+                                                              utils.gen_query_hash(query_text), query_text, json_data,
+                                                              1, utils.utcnow())
+            return query_result
+
+        timings['store'], query_result = timed(store, repeat)
+
+        if 'reload' in stages:
+            timings['reload'], _ = timed(lambda: models.QueryResult.get_by_id(query_result.id).to_dict(), repeat)
+
+    query_result = models.QueryResult(id=1, data=json_data, query=query, query_hash=utils.gen_query_hash(query),
+                                      runtime=1, retrieved_at=utils.utcnow(), data_source=1)
+
+    with app.test_request_context('/'):
+        if 'json' in stages:
+            timings['json'], _ = timed(lambda: QueryResultAPI().make_json_response(query_result), repeat)
+        if 'csv' in stages:
+            timings['csv'], _ = timed(lambda: QueryResultAPI.make_csv_response(query_result), repeat)
+        if 'xlsx' in stages:
+            timings['xlsx'], _ = timed(lambda: QueryResultAPI.make_excel_response(query_result), repeat)
+
+    return dict((stage, timing) for stage, timing in timings.iteritems() if stage in stages)
+
+
+def create_data_source(dbpath):
+    org = models.Organization.select().order_by(models.Organization.id).first()
+    if org is None:
+        raise Exception("--with-database needs an organization in the database.")
+
+    options = ConfigurationContainer({'dbpath': dbpath}, Sqlite.configuration_schema())
+    return models.DataSource.create(org=org, name="benchmark {}".format(utils.generate_token(10)), type='sqlite',
+                                    options=options)
+
+
+def delete_data_source(data_source):
+    models.Query.update(latest_query_data=None).where(models.Query.data_source == data_source).execute()
+    models.QueryResult.delete().where(models.QueryResult.data_source == data_source).execute()
+    data_source.delete_instance()
+
+
+def compare(results, baseline, threshold, min_difference=0):
+    """Return the benchmarks that are slower than the baseline by more than the threshold (a fraction), and by more
+    than min_difference seconds."""
+    regressions = []
+    for name, timings in sorted(results.iteritems()):
+        for stage, timing in sorted(timings.iteritems()):
+            baseline_timing = baseline.get(name, {}).get(stage)
+            if baseline_timing and timing > baseline_timing * (1 + threshold) and \
+                    timing - baseline_timing > min_difference:
+                regressions.append((name, stage, baseline_timing, timing))
+
+    return regressions
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the query results pipeline.")
+    parser.add_argument('--rows', type=parse_list, default=[1000, 100000, 1000000],
+                        help="comma separated numbers of rows (default: 1000,100000,1000000)")
+    parser.add_argument('--widths', type=parse_list, default=[5, 20],
+                        help="comma separated numbers of columns (default: 5,20)")
+    parser.add_argument('--stages', type=lambda v: v.split(','), default=[s for s in STAGES if s not in DATABASE_STAGES],
+                        help="comma separated stages to run (default: all but {})".format(", ".join(DATABASE_STAGES)))
+    parser.add_argument('--with-database', action='store_true',
+                        help="also run the stages that use the database (store results in the configured database, "
+                             "and delete them afterwards)")
+    parser.add_argument('--repeat', type=int, default=3, help="times to run each stage (the best time counts)")
+    parser.add_argument('--output', help="file to write the results to (JSON)")
+    parser.add_argument('--baseline', help="results of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="how much slower than the baseline a stage may be (fraction, default: 0.2)")
+    parser.add_argument('--min-difference', type=float, default=0.01,
+                        help="how much slower than the baseline a stage may be regardless of the threshold "
+                             "(seconds, default: 0.01)")
+    args = parser.parse_args(argv)
+
+    stages = list(args.stages)
+    if args.with_database:
+        stages.extend(s for s in DATABASE_STAGES if s not in stages)
+    else:
+        stages = [s for s in stages if s not in DATABASE_STAGES]
+
+    random.seed(0)
+    directory = tempfile.mkdtemp()
+    dbpath = os.path.join(directory, 'benchmark.sqlite')
+    runner = Sqlite({'dbpath': dbpath})
+    data_source = create_data_source(dbpath) if args.with_database else None
+
+    results = {}
+    try:
+        for rows in args.rows:
+            for width in args.widths:
+                name = "{}x{}".format(rows, width)
+                table, column_types = create_table(dbpath, rows, width)
+                results[name] = run_benchmark(runner, table, column_types, stages, args.repeat, data_source)
+
+                print "{:>12}  {}".format(name, "  ".join("{}={:.4f}s".format(stage, results[name][stage])
+                                                          for stage in STAGES if stage in results[name]))
+                sys.stdout.flush()
+    finally:
+        if data_source is not None:
+            delete_data_source(data_source)
+        shutil.rmtree(directory)
+
+    output = {
+        'json_backend': utils.JSON_BACKEND,
+        'repeat': args.repeat,
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+        regressions = compare(results, baseline, args.threshold, args.min_difference)
+        for name, stage, baseline_timing, timing in regressions:
+            print "Regression: {} {} took {:.4f}s (baseline: {:.4f}s, +{:.0%})".format(
+                name, stage, timing, baseline_timing, timing / baseline_timing - 1)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
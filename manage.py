@@ -8,7 +8,7 @@ from flask_script import Manager
 
 from redash import settings, models, __version__
 from redash.wsgi import app
-from redash.cli import users, database, data_sources, organization
+from redash.cli import users, database, data_sources, organization, query_executions
 from redash.monitor import get_status
 
 manager = Manager(app)
@@ -16,6 +16,7 @@ manager.add_command("database", database.manager)
 manager.add_command("users", users.manager)
 manager.add_command("ds", data_sources.manager)
 manager.add_command("org", organization.manager)
+manager.add_command("executions", query_executions.manager)
 
 
 
@@ -0,0 +1,20 @@
+from playhouse.migrate import PostgresqlMigrator, migrate
+
+from redash.models import db
+from redash import models
+
+if __name__ == '__main__':
+    db.connect_db()
+    migrator = PostgresqlMigrator(db.database)
+
+    cursor = db.database.execute_sql("SELECT column_name FROM information_schema.columns WHERE table_name='data_sources' and column_name='settings';")
+    if cursor.rowcount > 0:
+        print "Column exists. Skipping."
+        exit()
+
+    with db.database.transaction():
+        migrate(
+            migrator.add_column('data_sources', 'settings', models.DataSource.settings),
+        )
+
+    db.close_db(None)
@@ -0,0 +1,10 @@
+from redash.models import db, QueryExecution
+
+if __name__ == '__main__':
+    db.connect_db()
+
+    with db.database.transaction():
+        if not QueryExecution.table_exists():
+            QueryExecution.create_table()
+
+    db.close_db(None)
@@ -0,0 +1,20 @@
+from playhouse.migrate import PostgresqlMigrator, migrate
+
+from redash.models import db
+from redash import models
+
+if __name__ == '__main__':
+    db.connect_db()
+    migrator = PostgresqlMigrator(db.database)
+
+    cursor = db.database.execute_sql("SELECT column_name FROM information_schema.columns WHERE table_name='query_results' and column_name='truncated';")
+    if cursor.rowcount > 0:
+        print "Column exists. Skipping."
+        exit()
+
+    with db.database.transaction():
+        migrate(
+            migrator.add_column('query_results', 'truncated', models.QueryResult.truncated),
+        )
+
+    db.close_db(None)
@@ -135,6 +135,14 @@
       return this.query_result.runtime;
     }
 
+    QueryResult.prototype.isTruncated = function () {
+      return this.query_result.data && this.query_result.data.truncated;
+    }
+
+    QueryResult.prototype.getTotalRows = function () {
+      return this.query_result.data && this.query_result.data.total_rows;
+    }
+
     QueryResult.prototype.getRawData = function () {
       if (!this.query_result.data) {
         return null;
@@ -397,17 +405,28 @@
         params['query_id'] = queryId;
       };
 
-      QueryResultResource.post(params, function (response) {
-        queryResult.update(response);
+      var post = function(params) {
+        QueryResultResource.post(params, function (response) {
+          queryResult.update(response);
 
-        if ('job' in response) {
-          refreshStatus(queryResult, query);
-        }
-      }, function(error) {
-        if (error.status === 403) {
-          queryResult.update(error.data);
-        }
-      });
+          if ('job' in response) {
+            refreshStatus(queryResult, query);
+          }
+        }, function(error) {
+          if (error.status === 400 && error.data.job && error.data.job.confirm_cost) {
+            // The query is estimated to cost more than the data source's limits:
+            if (confirm(error.data.job.error)) {
+              post(_.extend({}, params, {'confirm_cost': true}));
+            } else {
+              queryResult.update(error.data);
+            }
+          } else if (error.status === 403) {
+            queryResult.update(error.data);
+          }
+        });
+      };
+
+      post(params);
 
       return queryResult;
     }
@@ -7,6 +7,7 @@ import logging
 from flask import redirect, request, jsonify
 
 from redash import models, settings
+from redash.cache import ModelCache, ProcessCache, get_version
 from redash.authentication import google_oauth, saml_auth
 from redash.authentication.org_resolving import current_org
 from redash.authentication.helper import get_login_url
@@ -15,6 +16,11 @@ from redash.tasks import record_event
 login_manager = LoginManager()
 logger = logging.getLogger('authentication')
 
+# Resolved principals, kept for a short while as they're looked up on every request. Changes to users, groups and
+# queries bump models.User.CACHE_VERSION, which invalidates them in all processes.
+_users_cache = ModelCache(models.User, settings.AUTH_CACHE_TTL)
+_query_api_keys_cache = ProcessCache(settings.AUTH_CACHE_TTL)
+
 
 def sign(key, path, expires):
     if not key:
@@ -28,10 +34,19 @@ def sign(key, path, expires):
 
 @login_manager.user_loader
 def load_user(user_id):
-    try:
-        return models.User.get_by_id_and_org(user_id, current_org.id)
-    except models.User.DoesNotExist:
-        return None
+    version = get_version(models.User.CACHE_VERSION)
+    key = ('id', current_org.id, user_id)
+    user = _users_cache.get(key, version)
+
+    if user is None:
+        try:
+            user = models.User.get_by_id_and_org(user_id, current_org.id)
+        except models.User.DoesNotExist:
+            return None
+
+        _users_cache.set(key, version, user)
+
+    return user
 
 
 def hmac_load_user_from_request(request):
@@ -63,15 +78,26 @@ def get_user_from_api_key(api_key, query_id):
     if not api_key:
         return None
 
+    version = get_version(models.User.CACHE_VERSION)
+    user = _users_cache.get(('api_key', current_org.id, api_key), version)
+    if user is not None:
+        return user
+
+    groups = _query_api_keys_cache.get((current_org.id, api_key, query_id), version)
+    if groups is not None:
+        return models.ApiUser(api_key, current_org._get_current_object(), groups)
+
     user = None
 
     try:
         user = models.User.get_by_api_key_and_org(api_key, current_org.id)
+        _users_cache.set(('api_key', current_org.id, api_key), version, user)
     except models.User.DoesNotExist:
         if query_id:
             query = models.Query.get_by_id_and_org(query_id, current_org.id)
             if query and query.api_key == api_key:
                 user = models.ApiUser(api_key, query.org, query.groups.keys())
+                _query_api_keys_cache.set((current_org.id, api_key, query_id), version, user.groups)
 
     return user
 
@@ -6,15 +6,30 @@ single Organization in your installation.
 """
 
 import logging
+from redash import settings
+from redash.cache import ModelCache, get_version
 from redash.models import Organization
 from werkzeug.local import LocalProxy
-from flask import request
+from flask import request, g
+
+_orgs_cache = ModelCache(Organization, settings.ORG_CACHE_TTL)
 
 
 def _get_current_org():
+    # current_org is dereferenced several times per request, so the organization is memoized for the request:
+    if getattr(g, 'current_org', None) is not None:
+        return g.current_org
+
     slug = request.view_args.get('org_slug', 'default')
-    org = Organization.get_by_slug(slug)
+    version = get_version(Organization.CACHE_VERSION)
+    org = _orgs_cache.get(slug, version)
+
+    if org is None:
+        org = Organization.get_by_slug(slug)
+        _orgs_cache.set(slug, version, org)
+
     logging.debug("Current organization: %s (slug: %s)", org, slug)
+    g.current_org = org
     return org
 
 
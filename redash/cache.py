@@ -0,0 +1,88 @@
+"""
+In-process caching of objects loaded from the database.
+
+Entries are stored along with a version token kept in Redis (one per kind of object). Saving an object bumps its
+kind's version, which makes every process drop the entries it has for that kind on its next lookup. This way a
+lookup costs a single Redis GET instead of a database query, while changes are still visible right away in all the
+processes. Entries also expire after a TTL, as a safety net.
+"""
+import copy
+import threading
+import time
+
+from redash import redis_connection
+from redash.utils import generate_token
+
+
+def _version_key(name):
+    return "cache_version:{}".format(name)
+
+
+def get_version(name):
+    key = _version_key(name)
+    version = redis_connection.get(key)
+
+    if version is None:
+        # Version tokens are random (and not a counter), so when Redis is flushed the processes don't end up using
+        # entries that were stored with an older token that happens to equal the new one.
+        redis_connection.setnx(key, generate_token(16))
+        version = redis_connection.get(key)
+
+    return version
+
+
+def bump_version(name):
+    redis_connection.set(_version_key(name), generate_token(16))
+
+
+class ProcessCache(object):
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        expires_at, entry_version, value = entry
+        if entry_version != version or expires_at < time.time():
+            return None
+
+        return value
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, version, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ModelCache(ProcessCache):
+    """ProcessCache for peewee model instances.
+
+    Only the instances' data is kept, and every lookup returns a new instance, so requests running in different
+    threads never share (and modify) the same object.
+    """
+    def __init__(self, model, ttl):
+        super(ModelCache, self).__init__(ttl)
+        self.model = model
+
+    def get(self, key, version):
+        data = super(ModelCache, self).get(key, version)
+
+        if data is None:
+            return None
+
+        instance = self.model(**copy.deepcopy(data))
+        # Like instances loaded from the database, it starts without dirty fields:
+        instance._prepare_instance()
+        return instance
+
+    def set(self, key, version, instance):
+        super(ModelCache, self).set(key, version, copy.deepcopy(instance._data))
@@ -0,0 +1,45 @@
+from flask_script import Manager
+from redash import models
+
+manager = Manager(help="Reports of the query executions log. This commands assume single organization operation.")
+
+
+def print_report(rows, key):
+    print "{:>8}  {:<40}  {:>10}  {:>8}  {:>10}  {:>10}  {:>12}  {:>12}".format(
+        key, "name", "executions", "failures", "avg wait", "avg run", "max run", "total MB")
+
+    for row in rows:
+        print u"{:>8}  {:<40}  {:>10}  {:>8}  {:>10.2f}  {:>10.2f}  {:>12.2f}  {:>12.2f}".format(
+            int(row[key]), (row.get('name') or u'')[:40], row['executions'], row['failures'],
+            row['avg_wait_time'] or 0, row['avg_run_time'] or 0, row['max_run_time'] or 0,
+            (row['total_bytes'] or 0) / 1024.0 / 1024)
+
+
+@manager.option('--days', dest='days', type=int, default=7, help="how many days back to look (default: 7)")
+@manager.option('--limit', dest='limit', type=int, default=20, help="how many queries to list (default: 20)")
+def slowest_queries(days=7, limit=20):
+    """List the saved queries that ran the longest on average."""
+    org = models.Organization.get_by_slug('default')
+    print_report(models.QueryExecution.slowest_queries(org, days, limit), 'query_id')
+
+
+@manager.option('--days', dest='days', type=int, default=7, help="how many days back to look (default: 7)")
+@manager.option('--limit', dest='limit', type=int, default=20, help="how many data sources to list (default: 20)")
+def heaviest_data_sources(days=7, limit=20):
+    """List the data sources that spent the most time running queries."""
+    org = models.Organization.get_by_slug('default')
+    print_report(models.QueryExecution.heaviest_data_sources(org, days, limit), 'data_source_id')
+
+
+@manager.option('--days', dest='days', type=int, default=7, help="how many days back to look (default: 7)")
+def busiest_hours(days=7):
+    """List the executions started in each hour of the day (UTC)."""
+    org = models.Organization.get_by_slug('default')
+    print_report(models.QueryExecution.busiest_hours(org, days), 'hour')
+
+
+@manager.command
+def flush():
+    """Write the buffered executions to the log now."""
+    count = models.QueryExecution.flush()
+    print "Wrote {} executions.".format(count)
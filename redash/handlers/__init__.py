@@ -1,10 +1,11 @@
-from flask import jsonify, url_for
+from flask import jsonify, url_for, abort, make_response
 from flask_login import login_required
 
 from redash import settings
 from redash.wsgi import app
 from redash.permissions import require_super_admin
 from redash.monitor import get_status
+from redash.metrics import profiler, registry
 
 
 def org_scoped_rule(rule):
@@ -28,5 +29,32 @@ def status_api():
     return jsonify(status)
 
 
+@app.route('/metrics')
+@login_required
+@require_super_admin
+def metrics_scrape():
+    response = make_response(registry.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+
+@app.route('/api/admin/profiles')
+@login_required
+@require_super_admin
+def profiles_api():
+    return jsonify({'profiles': profiler.recent_reports()})
+
+
+@app.route('/api/admin/profiles/<profile_id>')
+@login_required
+@require_super_admin
+def profile_api(profile_id):
+    report = profiler.get_report(profile_id)
+    if report is None:
+        abort(404)
+
+    return jsonify(report)
+
+
 from redash.handlers import alerts, authentication, base, dashboards, data_sources, events, queries, query_results, \
-    static, users, visualizations, widgets, embed, groups
+    static, users, visualizations, widgets, embed, groups, query_executions
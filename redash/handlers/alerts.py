@@ -3,7 +3,7 @@ import time
 from flask import request
 from funcy import project
 
-from redash import models
+from redash import models, serializers
 from redash.wsgi import api
 from redash.permissions import require_access, require_admin_or_owner, view_only
 from redash.handlers.base import BaseResource, require_fields, get_object_or_404
@@ -71,7 +71,7 @@ class AlertListResource(BaseResource):
         return alert.to_dict()
 
     def get(self):
-        return [alert.to_dict() for alert in models.Alert.all(groups=self.current_user.groups)]
+        return serializers.serialize_alerts(models.Alert.all(groups=self.current_user.groups))
 
 
 class AlertSubscriptionListResource(BaseResource):
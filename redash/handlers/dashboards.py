@@ -1,9 +1,9 @@
-from flask import request
+from flask import request, Response, stream_with_context
 
 from funcy import distinct, take
 from itertools import chain
 
-from redash import models
+from redash import models, utils
 from redash.wsgi import api
 from redash.permissions import require_permission
 from redash.meila_permissions import require_group_permission
@@ -47,7 +47,7 @@ class DashboardAPI(BaseResource):
     def get(self, dashboard_slug=None):
         dashboard = get_object_or_404(models.Dashboard.get_by_slug_and_org, dashboard_slug, self.current_org)
 
-        return dashboard.to_dict(with_widgets=True, user=self.current_user)
+        return Response(dashboard.to_json_with_widgets(self.current_user), mimetype='application/json')
 
     @require_permission('edit_dashboard')
     def post(self, dashboard_slug):
@@ -68,6 +68,28 @@ class DashboardAPI(BaseResource):
 
         return dashboard.to_dict(with_widgets=True, user=self.current_user)
 
+class DashboardResultsAPI(BaseResource):
+    @require_group_permission
+    def get(self, dashboard_slug=None):
+        """Return the latest results of all the dashboard's visualizations in a single (streamed) response.
+
+        Each query result is sent once, even when several visualizations use it, and only with the columns its
+        visualizations use.
+        """
+        dashboard = get_object_or_404(models.Dashboard.get_by_slug_and_org, dashboard_slug, self.current_org)
+        visualizations, results = dashboard.latest_results(self.current_user)
+        format = request.args.get('format')
+
+        def generate():
+            yield '{"visualizations": %s, "query_results": {' % utils.json_dumps(visualizations)
+            for i, (query_result, columns) in enumerate(results.itervalues()):
+                yield '%s"%d": ' % (',' if i else '', query_result.id)
+                yield query_result.to_json(columns, format)
+            yield '}}'
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 class DashboardGroupAPI(BaseResource):
     def post(self):
         print '----- add group ------'
@@ -104,5 +126,6 @@ class DashboardDelGroupAPI(BaseResource):
 api.add_org_resource(DashboardListAPI, '/api/dashboards', endpoint='dashboards')
 api.add_org_resource(DashboardRecentAPI, '/api/dashboards/recent', endpoint='recent_dashboards')
 api.add_org_resource(DashboardAPI, '/api/dashboards/<dashboard_slug>', endpoint='dashboard')
+api.add_org_resource(DashboardResultsAPI, '/api/dashboards/<dashboard_slug>/results', endpoint='dashboard_results')
 api.add_org_resource(DashboardGroupAPI, '/api/dashboards/group', endpoint='dashboard_group')
 api.add_org_resource(DashboardDelGroupAPI, '/api/dashboards/delgroup', endpoint='dashboard_del_group')
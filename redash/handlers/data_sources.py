@@ -8,6 +8,7 @@ from redash.utils.configuration import ConfigurationContainer, ValidationError
 from redash.permissions import require_admin
 from redash.query_runner import query_runners, get_configuration_schema_for_type
 from redash.handlers.base import BaseResource, get_object_or_404
+from redash.utils.schema_index import MATCH_PREFIX, MATCH_SUBSTRING
 
 
 class DataSourceTypeListAPI(BaseResource):
@@ -39,6 +40,15 @@ class DataSourceAPI(BaseResource):
         except ValidationError:
             abort(400)
 
+        if 'settings' in req:
+            if not isinstance(req['settings'], dict):
+                abort(400)
+            try:
+                models.DataSource.validate_settings(req['settings'])
+            except ValueError as e:
+                abort(400, message=e.message)
+            data_source.settings = req['settings']
+
         data_source.type = req['type']
         data_source.name = req['name']
         data_source.save()
@@ -106,3 +116,48 @@ class DataSourceSchemaAPI(BaseResource):
         return schema
 
 api.add_org_resource(DataSourceSchemaAPI, '/api/data_sources/<data_source_id>/schema')
+
+
+SCHEMA_PAGE_SIZE = 50
+SCHEMA_MAX_PAGE_SIZE = 250
+
+
+class DataSourceSchemaTableListAPI(BaseResource):
+    def get(self, data_source_id):
+        data_source = get_object_or_404(models.DataSource.get_by_id_and_org, data_source_id, self.current_org)
+        index = data_source.get_schema_index()
+
+        match = request.args.get('match', MATCH_PREFIX)
+        if match not in (MATCH_PREFIX, MATCH_SUBSTRING):
+            abort(400, message="Unsupported match type: {}.".format(match))
+
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            page_size = min(max(int(request.args.get('page_size', SCHEMA_PAGE_SIZE)), 1), SCHEMA_MAX_PAGE_SIZE)
+        except ValueError:
+            abort(400, message="page and page_size should be numbers.")
+
+        names = index.search(request.args.get('q', ''), match=match)
+
+        return {
+            'count': len(names),
+            'page': page,
+            'page_size': page_size,
+            'tables': index.page(names, page, page_size)
+        }
+
+
+class DataSourceSchemaTableAPI(BaseResource):
+    def get(self, data_source_id, table_name):
+        data_source = get_object_or_404(models.DataSource.get_by_id_and_org, data_source_id, self.current_org)
+        table = data_source.get_schema_index().get(table_name)
+
+        if table is None:
+            abort(404, message="Table not found.")
+
+        return table
+
+api.add_org_resource(DataSourceSchemaTableListAPI, '/api/data_sources/<data_source_id>/schema/tables',
+                     endpoint='data_source_schema_tables')
+api.add_org_resource(DataSourceSchemaTableAPI, '/api/data_sources/<data_source_id>/schema/tables/<table_name>',
+                     endpoint='data_source_schema_table')
@@ -1,6 +1,6 @@
 from flask import request
 
-from redash import statsd_client
+from redash import settings, statsd_client
 from redash.wsgi import api
 from redash.handlers.base import BaseResource
 
@@ -17,6 +17,9 @@ api.add_org_resource(EventAPI, '/api/events', endpoint='events')
 
 class MetricsAPI(BaseResource):
     def post(self):
+        if not settings.METRICS_STATSD:
+            return "OK."
+
         for stat_line in request.data.split():
             stat, value = stat_line.split(':')
             statsd_client._send_stat('client.{}'.format(stat), value, 1)
@@ -1,3 +1,6 @@
+import base64
+import json
+
 from flask import request
 from flask_restful import abort
 from flask_login import login_required
@@ -7,11 +10,11 @@ from funcy import distinct, take
 from itertools import chain
 
 from redash.handlers.query_results import run_query
-from redash import models
+from redash import models, serializers
 from redash.wsgi import app, api
 from redash.permissions import require_permission, require_access, require_admin_or_owner, not_view_only, view_only
 from redash.handlers.base import BaseResource, get_object_or_404
-from redash.utils import collect_parameters_from_request
+from redash.utils import collect_parameters_from_request, json_dumps
 
 
 @app.route('/api/queries/format', methods=['POST'])
@@ -28,21 +31,55 @@ class QuerySearchAPI(BaseResource):
     def get(self):
         term = request.args.get('q', '')
 
-        return [q.to_dict() for q in models.Query.search(term, self.current_user.groups)]
+        return serializers.serialize_queries(models.Query.search(term, self.current_user.groups))
 
 class QueryRecentAPI(BaseResource):
     @require_permission('view_query')
     def get(self):
         queries = models.Query.recent(self.current_user.groups, self.current_user.id)
-        recent = [d.to_dict(with_last_modified_by=False) for d in queries]
+        recent = serializers.serialize_queries(queries, with_last_modified_by=False)
 
         global_recent = []
         if len(recent) < 10:
-            global_recent = [d.to_dict(with_last_modified_by=False) for d in models.Query.recent(self.current_user.groups)]
+            global_recent = serializers.serialize_queries(models.Query.recent(self.current_user.groups),
+                                                          with_last_modified_by=False)
 
         return take(20, distinct(chain(recent, global_recent), key=lambda d: d['id']))
 
 
+QUERIES_PAGE_SIZE = 50
+QUERIES_MAX_PAGE_SIZE = 250
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json_dumps(position))
+
+
+def decode_cursor(cursor):
+    try:
+        value, query_id = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        return value, int(query_id)
+    except (TypeError, ValueError):
+        abort(400, message="Invalid cursor.")
+
+
+def get_queries_filters():
+    """Parse the data_source_id, user_id and scheduled filters of the queries list and count endpoints."""
+    filters = {}
+
+    try:
+        for name in ('data_source_id', 'user_id'):
+            if request.args.get(name):
+                filters[name] = int(request.args[name])
+    except ValueError:
+        abort(400, message="data_source_id and user_id should be numbers.")
+
+    if request.args.get('scheduled'):
+        filters['scheduled'] = request.args['scheduled'].lower() in ('true', '1')
+
+    return filters
+
+
 class QueryListAPI(BaseResource):
     @require_permission('create_query')
     def post(self):
@@ -62,7 +99,46 @@ class QueryListAPI(BaseResource):
 
     @require_permission('view_query')
     def get(self):
-        return [q.to_dict(with_stats=True) for q in models.Query.all_queries(self.current_user.groups)]
+        """Return all the queries, or when page_size or cursor are given, a page of them.
+
+        Pages are sorted by the sort argument (created_at, updated_at or name; prefixed with - for descending order,
+        default: -created_at) and can be filtered by data_source_id, user_id and scheduled. The response's next_cursor
+        is the cursor to pass for the next page.
+        """
+        if 'page_size' not in request.args and 'cursor' not in request.args:
+            return serializers.serialize_queries(models.Query.all_queries(self.current_user.groups), with_stats=True)
+
+        sort = request.args.get('sort', '-created_at')
+        descending = sort.startswith('-')
+        sort = sort.lstrip('-')
+        if sort not in models.Query.LIST_SORT_FIELDS:
+            abort(400, message="Unsupported sort field: {}.".format(sort))
+
+        try:
+            page_size = min(max(int(request.args.get('page_size', QUERIES_PAGE_SIZE)), 1), QUERIES_MAX_PAGE_SIZE)
+        except ValueError:
+            abort(400, message="page_size should be a number.")
+
+        after = None
+        if request.args.get('cursor'):
+            after = decode_cursor(request.args['cursor'])
+
+        queries = models.Query.accessible(self.current_org, self.current_user, **get_queries_filters())
+        results, next_after = models.Query.list_page(queries, sort=sort, descending=descending, after=after,
+                                                     page_size=page_size)
+
+        return {
+            'results': results,
+            'page_size': page_size,
+            'next_cursor': encode_cursor(next_after) if next_after else None
+        }
+
+
+class QueryCountAPI(BaseResource):
+    @require_permission('view_query')
+    def get(self):
+        queries = models.Query.accessible(self.current_org, self.current_user, **get_queries_filters())
+        return {'count': queries.count()}
 
 
 class QueryAPI(BaseResource):
@@ -113,11 +189,16 @@ class QueryRefreshResource(BaseResource):
 
         parameter_values = collect_parameters_from_request(request.args)
 
-        return run_query(query.data_source, parameter_values, query.query, query.id)
+        check_cost = request.args.get('confirm_cost', '').lower() not in ('true', '1')
+        limit_rows = request.args.get('full_results', '').lower() not in ('true', '1')
+
+        return run_query(query.data_source, parameter_values, query.query, query.id, check_cost=check_cost,
+                         limit_rows=limit_rows)
 
 
 api.add_org_resource(QuerySearchAPI, '/api/queries/search', endpoint='queries_search')
 api.add_org_resource(QueryRecentAPI, '/api/queries/recent', endpoint='recent_queries')
 api.add_org_resource(QueryListAPI, '/api/queries', endpoint='queries')
+api.add_org_resource(QueryCountAPI, '/api/queries/count', endpoint='queries_count')
 api.add_org_resource(QueryRefreshResource, '/api/queries/<query_id>/refresh', endpoint='query_refresh')
 api.add_org_resource(QueryAPI, '/api/queries/<query_id>', endpoint='query')
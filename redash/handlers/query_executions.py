@@ -0,0 +1,29 @@
+from flask import request
+from flask_restful import abort
+
+from redash import models
+from redash.wsgi import api
+from redash.permissions import require_admin
+from redash.handlers.base import BaseResource
+
+REPORTS = {
+    'slowest_queries': models.QueryExecution.slowest_queries,
+    'heaviest_data_sources': models.QueryExecution.heaviest_data_sources,
+    'busiest_hours': models.QueryExecution.busiest_hours
+}
+
+
+class QueryExecutionReportResource(BaseResource):
+    @require_admin
+    def get(self, report):
+        if report not in REPORTS:
+            abort(404)
+
+        kwargs = {'days': request.args.get('days', 7, type=int)}
+        if report != 'busiest_hours':
+            kwargs['limit'] = request.args.get('limit', 20, type=int)
+
+        return {'report': report, 'days': kwargs['days'], 'rows': REPORTS[report](self.current_org, **kwargs)}
+
+
+api.add_org_resource(QueryExecutionReportResource, '/api/query_executions/<report>', endpoint='query_execution_report')
@@ -4,19 +4,20 @@ import cStringIO
 import time
 
 import pystache
-from flask import make_response, request
+from flask import make_response, request, g
 from flask_login import current_user
 from flask_restful import abort
 import xlsxwriter
 from redash import models, settings, utils
+from redash.metrics import tracing
 from redash.wsgi import api
-from redash.tasks import QueryTask, record_event
+from redash.tasks import QueryTask, record_event, record_rejected_execution
 from redash.permissions import require_permission, not_view_only, has_access
 from redash.handlers.base import BaseResource, get_object_or_404
 from redash.utils import collect_query_parameters, collect_parameters_from_request
 
 
-def run_query(data_source, parameter_values, query_text, query_id, max_age=0):
+def run_query(data_source, parameter_values, query_text, query_id, max_age=0, check_cost=True, limit_rows=True):
     query_parameters = set(collect_query_parameters(query_text))
     missing_params = set(query_parameters) - set(parameter_values.keys())
     if missing_params:
@@ -33,10 +34,20 @@ def run_query(data_source, parameter_values, query_text, query_id, max_age=0):
 
     if query_result:
         return {'query_result': query_result.to_dict()}
-    else:
-        job = QueryTask.add_task(query_text, data_source,
-                                 metadata={"Username": current_user.name, "Query ID": query_id})
-        return {'job': job.to_dict()}
+
+    metadata = {"Username": current_user.name, "Query ID": query_id, "Trace ID": tracing.new_trace_id()}
+
+    if check_cost:
+        error = data_source.check_cost(query_text)
+        if error:
+            record_rejected_execution(query_text, data_source, metadata)
+            # The UI asks the user to confirm, and resubmits the query with confirm_cost:
+            return {'job': {'status': 4, 'error': error, 'confirm_cost': True}}, 400
+
+    g.trace_id = metadata["Trace ID"]
+    with tracing.use_trace(metadata["Trace ID"], endpoint=request.endpoint, user_id=current_user.id):
+        job = QueryTask.add_task(query_text, data_source, metadata=metadata, limit_rows=limit_rows)
+    return {'job': job.to_dict()}
 
 
 class QueryResultListAPI(BaseResource):
@@ -62,7 +73,12 @@ class QueryResultListAPI(BaseResource):
             'query': query
         })
 
-        return run_query(data_source, parameter_values, query, query_id, max_age)
+        # Queries estimated to cost more than the data source's limits only run once confirmed:
+        check_cost = not params.get('confirm_cost', False)
+        # Results are capped at the data source's row limit, unless full results were asked for:
+        limit_rows = not params.get('full_results', False)
+
+        return run_query(data_source, parameter_values, query, query_id, max_age, check_cost, limit_rows)
 
 
 ONE_YEAR = 60 * 60 * 24 * 365.25
@@ -145,14 +161,15 @@ class QueryResultAPI(BaseResource):
             abort(404)
 
     def make_json_response(self, query_result):
-        data = json.dumps({'query_result': query_result.to_dict()}, cls=utils.JSONEncoder)
+        # ?format=compact returns the rows as arrays of values, in the order of the columns.
+        data = u'{{"query_result": {}}}'.format(query_result.to_json(format=request.args.get('format')))
         return make_response(data, 200, {})
 
     @staticmethod
     def make_csv_response(query_result):
         s = cStringIO.StringIO()
 
-        query_data = json.loads(query_result.data)
+        query_data = query_result.get_data()
         writer = csv.DictWriter(s, fieldnames=[col['name'] for col in query_data['columns']])
         writer.writer = utils.UnicodeWriter(s)
         writer.writeheader()
@@ -166,7 +183,7 @@ class QueryResultAPI(BaseResource):
     def make_excel_response(query_result):
         s = cStringIO.StringIO()
 
-        query_data = json.loads(query_result.data)
+        query_data = query_result.get_data()
         book = xlsxwriter.Workbook(s)
         sheet = book.add_worksheet("result")
 
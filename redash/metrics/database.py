@@ -1,10 +1,11 @@
 from functools import wraps
+import threading
 import time
 import logging
 from peewee import Model
 import peewee
 from playhouse.postgres_ext import PostgresqlExtDatabase
-from redash import statsd_client
+from redash import settings, statsd_client
 
 metrics_logger = logging.getLogger("metrics")
 
@@ -13,6 +14,7 @@ class MeteredPostgresqlExtDatabase(PostgresqlExtDatabase):
     def __init__(self, *args, **kwargs):
         self.query_count = 0
         self.query_duration = 0
+        self._sql_log = threading.local()
         return super(MeteredPostgresqlExtDatabase, self).__init__(*args, **kwargs)
 
     def execute_sql(self, *args, **kwargs):
@@ -28,6 +30,20 @@ class MeteredPostgresqlExtDatabase(PostgresqlExtDatabase):
             duration = (time.time() - start_time) * 1000
             self.query_duration += duration
 
+            statements = getattr(self._sql_log, 'statements', None)
+            if statements is not None:
+                statements.append({'sql': args[0] if args else kwargs.get('sql'), 'duration': duration})
+
+    def start_sql_log(self):
+        """Start logging the SQL statements the current thread executes (along with their durations)."""
+        self._sql_log.statements = []
+
+    def stop_sql_log(self):
+        """Stop logging the current thread's SQL statements, and return the ones logged."""
+        statements = getattr(self._sql_log, 'statements', None) or []
+        self._sql_log.statements = None
+        return statements
+
     def reset_metrics(self):
         # TODO: instead of manually managing reset of metrics, we should store them in a LocalProxy based object, that
         # is guaranteed to be "replaced" when the current request is done.
@@ -51,7 +67,9 @@ def patch_query_execute():
             return result
         finally:
             duration = (time.time() - start_time) * 1000
-            statsd_client.timing('db.{}.{}'.format(name, action), duration)
+            # Only sent to statsd, as keeping these in the registry would cost a Redis round trip for each query:
+            if settings.METRICS_STATSD:
+                statsd_client.timing('db.{}.{}'.format(name, action), duration)
             metrics_logger.debug("model=%s query=%s duration=%.2f", name, action, duration)
 
     @wraps(real_clone)
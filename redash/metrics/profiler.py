@@ -0,0 +1,131 @@
+"""
+Opt-in profiling of single requests, for super admins.
+
+A request of a super admin sent with the X-Redash-Profile header (or the _profile query string argument) runs under
+cProfile, and the SQL statements it executes are logged. When the request is done, the report is stored in Redis for a
+short while, and its id is sent back in the response's X-Redash-Profile header. The report can then be fetched from
+/api/admin/profiles/<id>.
+
+The flag is ignored for anyone else. Requests without it only pay for checking whether it's there.
+"""
+import cProfile
+import json
+import pstats
+import time
+import cStringIO
+
+from flask import request, g
+from flask_login import current_user
+
+from redash import redis_connection, settings, utils
+from redash.models import db
+
+PROFILE_HEADER = 'X-Redash-Profile'
+PROFILE_ARG = '_profile'
+RECENT_REPORTS_KEY = 'profiles:recent'
+
+
+def _report_key(report_id):
+    return 'profiles:report:{}'.format(report_id)
+
+
+def profiling_requested():
+    return PROFILE_HEADER in request.headers or PROFILE_ARG in request.args
+
+
+def start_profiling():
+    if not profiling_requested():
+        return
+
+    # Loading the user runs the login loader, which needs the request's database connection: init_app registers this
+    # hook after the ones that set it up.
+    if not (current_user.is_authenticated and current_user.has_permission('super_admin')):
+        return
+
+    db.database.start_sql_log()
+    g.profiler = cProfile.Profile()
+    g.profiler_start_time = time.time()
+    g.profiler.enable()
+
+
+def _stop_profiling():
+    profiler = getattr(g, 'profiler', None)
+    if profiler is None:
+        return None
+
+    profiler.disable()
+    g.profiler = None
+    return profiler
+
+
+def finish_profiling(response):
+    profiler = _stop_profiling()
+    if profiler is None:
+        return response
+
+    duration = (time.time() - g.profiler_start_time) * 1000
+    statements = db.database.stop_sql_log()
+
+    stream = cStringIO.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(settings.PROFILER_STATS_LIMIT)
+
+    report_id = utils.generate_token(16)
+    report = {
+        'id': report_id,
+        'method': request.method,
+        'path': request.full_path,
+        'endpoint': request.endpoint,
+        'status_code': response.status_code,
+        'user_id': current_user.id,
+        'created_at': time.time(),
+        'duration': duration,
+        'sql_duration': sum(s['duration'] for s in statements),
+        'sql_statements': statements,
+        'profile': stream.getvalue()
+    }
+
+    pipe = redis_connection.pipeline()
+    pipe.set(_report_key(report_id), utils.json_dumps(report), settings.PROFILER_REPORT_TTL)
+    pipe.lpush(RECENT_REPORTS_KEY, report_id)
+    pipe.ltrim(RECENT_REPORTS_KEY, 0, 99)
+    pipe.expire(RECENT_REPORTS_KEY, settings.PROFILER_REPORT_TTL)
+    pipe.execute()
+
+    response.headers[PROFILE_HEADER] = report_id
+    return response
+
+
+def discard_profiling(error):
+    """Stop profiling a request that failed (after_request hooks don't run for those)."""
+    if _stop_profiling() is not None:
+        db.database.stop_sql_log()
+
+
+def init_app(app):
+    """Register the profiling hooks. Has to be called after the database and the authentication are set up."""
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+    app.teardown_request(discard_profiling)
+
+
+def get_report(report_id):
+    report = redis_connection.get(_report_key(report_id))
+    if report is None:
+        return None
+
+    return json.loads(report)
+
+
+def recent_reports():
+    """Summaries (without the profile and statements) of the reports that haven't expired yet, newest first."""
+    report_ids = redis_connection.lrange(RECENT_REPORTS_KEY, 0, -1)
+    if not report_ids:
+        return []
+
+    reports = [json.loads(r) for r in redis_connection.mget([_report_key(i) for i in report_ids]) if r is not None]
+    for report in reports:
+        report['sql_statements'] = len(report['sql_statements'])
+        del report['profile']
+
+    return reports
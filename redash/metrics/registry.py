@@ -0,0 +1,282 @@
+"""
+Metrics shared by the web and worker processes: counters, gauges and histograms, scraped from /metrics in the Prometheus
+text format.
+
+The values are kept in Redis, so all the processes (gunicorn's workers, Celery's prefork children) update the same
+ones: each metric is a hash, with a field for each set of label values (and, for histograms, for each bucket, the sum
+and the count), updated with HINCRBY/HINCRBYFLOAT. As those are atomic, processes never need to coordinate.
+
+Updates aren't sent to Redis as they're made, which would cost each request a round trip: each process aggregates them
+in memory (adding up the increments, and keeping the last value set), and a thread of its own sends them all in a single
+pipeline every REDASH_METRICS_FLUSH_INTERVAL seconds (0 sends each update right away), so the updates of idle processes
+get there too. The thread is started by the process's first update, so forked processes (which don't inherit threads)
+get their own. A process also flushes its updates before rendering the metrics, and Celery's processes flush theirs when
+they shut down (see redash.worker), as prefork children exit without running atexit handlers.
+
+Gauges can also be given a function that collects their values when the metrics are scraped (like the sizes of the
+queues), instead of being set.
+
+Each update is also sent to statsd (under the metric's statsd name, a format string of its labels) unless
+REDASH_METRICS_STATSD is turned off. REDASH_METRICS_REGISTRY turns off the Redis side.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from redash import redis_connection, settings, statsd_client
+
+logger = logging.getLogger('metrics')
+
+_metrics = OrderedDict()
+
+# The updates waiting to be flushed, by (hash key, field): the amounts to add, and the values to set.
+_lock = threading.Lock()
+_increments = {}
+_values = {}
+_pid = os.getpid()
+# The process the flusher thread was started in:
+_flusher_pid = None
+
+
+def _escape(value):
+    return unicode(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _check_pid():
+    # A forked process (like a prefork child) starts with a copy of its parent's pending updates, which the parent
+    # flushes itself.
+    global _pid
+    if os.getpid() != _pid:
+        _pid = os.getpid()
+        _increments.clear()
+        _values.clear()
+
+
+def _start_flusher():
+    # Called with _lock held, on each update.
+    global _flusher_pid
+    if _flusher_pid == _pid or settings.METRICS_FLUSH_INTERVAL <= 0:
+        return
+
+    _flusher_pid = _pid
+    thread = threading.Thread(target=_flush_periodically, name='metrics-flusher')
+    thread.daemon = True
+    thread.start()
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Failed flushing metrics")
+
+
+def _increment(key, field, amount):
+    """Add amount to the field (with HINCRBY when it's an int, HINCRBYFLOAT otherwise)."""
+    with _lock:
+        _check_pid()
+        _increments[(key, field)] = _increments.get((key, field), 0) + amount
+        _start_flusher()
+
+    if settings.METRICS_FLUSH_INTERVAL <= 0:
+        flush()
+
+
+def _set(key, field, value):
+    with _lock:
+        _check_pid()
+        _values[(key, field)] = value
+        _start_flusher()
+
+    if settings.METRICS_FLUSH_INTERVAL <= 0:
+        flush()
+
+
+def flush():
+    """Send the updates aggregated in this process to Redis, in a single round trip."""
+    with _lock:
+        _check_pid()
+        increments = _increments.items()
+        values = _values.items()
+        _increments.clear()
+        _values.clear()
+
+    if not increments and not values:
+        return
+
+    pipeline = redis_connection.pipeline(transaction=False)
+    for (key, field), amount in increments:
+        if isinstance(amount, float):
+            pipeline.hincrbyfloat(key, field, amount)
+        else:
+            pipeline.hincrby(key, field, amount)
+    for (key, field), value in values:
+        pipeline.hset(key, field, value)
+
+    try:
+        pipeline.execute()
+    except Exception:
+        # Failing to record a metric should never fail whatever is being measured.
+        logger.exception("Failed updating metrics")
+
+
+# The flusher thread is a daemon, which doesn't get to flush the last updates of processes that exit normally:
+atexit.register(flush)
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labels=(), statsd=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.statsd = statsd
+        _metrics[name] = self
+
+    @property
+    def key(self):
+        return 'metrics:{}'.format(self.name)
+
+    def _label_string(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError("Metric {} has labels {}, got {}.".format(self.name, self.labels, tuple(labels)))
+
+        return u",".join(u'{}="{}"'.format(name, _escape(labels[name])) for name in self.labels)
+
+    def _statsd_name(self, labels):
+        if self.statsd is None or not settings.METRICS_STATSD:
+            return None
+
+        return self.statsd.format(**labels)
+
+    def samples(self, values):
+        """The lines of the metric's samples, given the values stored in its hash."""
+        raise NotImplementedError()
+
+    def _sample(self, name, label_string, value):
+        return u"{}{} {}".format(name, u"{{{}}}".format(label_string) if label_string else u"", _format_value(value))
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        label_string = self._label_string(labels)
+        if settings.METRICS_REGISTRY:
+            _increment(self.key, label_string, float(amount))
+
+        statsd_name = self._statsd_name(labels)
+        if statsd_name:
+            statsd_client.incr(statsd_name, amount)
+
+    def samples(self, values):
+        return [self._sample(self.name, label_string, float(value)) for label_string, value in sorted(values.items())]
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), statsd=None, collect=None):
+        super(Gauge, self).__init__(name, documentation, labels, statsd)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        label_string = self._label_string(labels)
+        if settings.METRICS_REGISTRY:
+            _set(self.key, label_string, value)
+
+        statsd_name = self._statsd_name(labels)
+        if statsd_name:
+            statsd_client.gauge(statsd_name, value)
+
+    def samples(self, values):
+        if self.collect is not None:
+            values = dict((self._label_string(labels), value) for labels, value in self.collect())
+
+        return [self._sample(self.name, label_string, float(value)) for label_string, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=(), statsd=None):
+        super(Histogram, self).__init__(name, documentation, labels, statsd)
+        self.buckets = sorted(buckets)
+
+    def _bucket(self, value):
+        for bucket in self.buckets:
+            if value <= bucket:
+                return _format_value(bucket)
+        return '+Inf'
+
+    def observe(self, value, **labels):
+        label_string = self._label_string(labels)
+        if settings.METRICS_REGISTRY:
+            # Each observation is counted in its own bucket only; they're summed up into cumulative buckets when
+            # scraped.
+            _increment(self.key, u"bucket|{}|{}".format(self._bucket(value), label_string), 1)
+            _increment(self.key, u"sum|{}".format(label_string), float(value))
+            _increment(self.key, u"count|{}".format(label_string), 1)
+
+        statsd_name = self._statsd_name(labels)
+        if statsd_name:
+            # Timers aggregate into percentiles, so they're used for all the histograms, not only the durations:
+            statsd_client.timing(statsd_name, value)
+
+    def samples(self, values):
+        buckets = {}
+        sums = {}
+        counts = {}
+        for field, value in values.iteritems():
+            kind, rest = field.split('|', 1)
+            if kind == 'bucket':
+                bucket, label_string = rest.split('|', 1)
+                buckets.setdefault(label_string, {})[bucket] = int(value)
+            elif kind == 'sum':
+                sums[rest] = float(value)
+            else:
+                counts[rest] = int(value)
+
+        lines = []
+        for label_string in sorted(counts):
+            prefix = label_string + u"," if label_string else u""
+            observed = buckets.get(label_string, {})
+            cumulative = 0
+            for bucket in [_format_value(b) for b in self.buckets] + ['+Inf']:
+                cumulative += observed.get(bucket, 0)
+                lines.append(self._sample(self.name + '_bucket', u'{}le="{}"'.format(prefix, bucket), cumulative))
+            lines.append(self._sample(self.name + '_sum', label_string, sums.get(label_string, 0)))
+            lines.append(self._sample(self.name + '_count', label_string, counts[label_string]))
+
+        return lines
+
+
+def render():
+    """All the registered metrics, in the Prometheus text format."""
+    flush()
+    metrics = _metrics.values()
+
+    pipeline = redis_connection.pipeline(transaction=False)
+    for metric in metrics:
+        pipeline.hgetall(metric.key)
+    stored_values = pipeline.execute()
+
+    lines = []
+    for metric, values in zip(metrics, stored_values):
+        lines.append(u"# HELP {} {}".format(metric.name, metric.documentation))
+        lines.append(u"# TYPE {} {}".format(metric.name, metric.type))
+        lines.extend(metric.samples(dict((k.decode('utf-8'), v) for k, v in values.iteritems())))
+
+    return u"\n".join(lines) + u"\n"
@@ -3,11 +3,20 @@ import time
 import logging
 
 from flask import request, g
-from redash import statsd_client
 from redash.models import db
+from redash.metrics.registry import Histogram
 
 metrics_logger = logging.getLogger("metrics")
 
+TRACE_ID_HEADER = 'X-Redash-Trace-Id'
+
+request_duration_histogram = Histogram('redash_request_duration_milliseconds', "Duration of requests, by endpoint.",
+                                       buckets=(5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000),
+                                       labels=('endpoint', 'method', 'status'), statsd='requests.{endpoint}.{method}')
+request_queries_histogram = Histogram('redash_request_database_queries',
+                                      "Number of database queries run by requests, by endpoint.",
+                                      buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200), labels=('endpoint', 'method'))
+
 
 def record_requets_start_time():
     g.start_time = time.time()
@@ -19,18 +28,31 @@ def calculate_metrics(response):
 
     request_duration = (time.time() - g.start_time) * 1000
 
-    metrics_logger.info("method=%s path=%s endpoint=%s status=%d content_type=%s content_length=%d duration=%.2f query_count=%d query_duration=%.2f",
+    metrics_logger.info("method=%s path=%s endpoint=%s status=%d content_type=%s content_length=%d duration=%.2f query_count=%d query_duration=%.2f trace_id=%s",
                         request.method,
                         request.path,
                         request.endpoint,
                         response.status_code,
                         response.content_type,
-                        response.content_length,
+                        response.content_length or -1,  # streamed responses have no content length
                         request_duration,
                         db.database.query_count,
-                        db.database.query_duration)
+                        db.database.query_duration,
+                        getattr(g, 'trace_id', None) or '-')
+
+    method = request.method.lower()
+    request_duration_histogram.observe(request_duration, endpoint=request.endpoint, method=method,
+                                       status=response.status_code)
+    request_queries_histogram.observe(db.database.query_count, endpoint=request.endpoint, method=method)
+
+    return response
+
 
-    statsd_client.timing('requests.{}.{}'.format(request.endpoint, request.method.lower()), request_duration)
+def add_trace_id_header(response):
+    # Set by requests that run queries (see redash.metrics.tracing):
+    trace_id = getattr(g, 'trace_id', None)
+    if trace_id:
+        response.headers[TRACE_ID_HEADER] = trace_id
 
     return response
 
@@ -45,4 +67,5 @@ def calculate_metrics_on_exception(error):
 def provision_app(app):
     app.before_request(record_requets_start_time)
     app.after_request(calculate_metrics)
+    app.after_request(add_trace_id_header)
     app.teardown_request(calculate_metrics_on_exception)
@@ -0,0 +1,173 @@
+"""
+Tracing of query executions, from the API call that enqueues them to their stored result.
+
+QueryTask.add_task gives each execution a trace id, carried in the task's metadata along with the time the task was
+enqueued. Each stage of the execution is then recorded as a span (its name, start time, duration and a few attributes):
+
+    enqueue       add_task, up to the task being sent to the queue
+    join          add_task finding the query already queued or running (instead of enqueue); its task_id is the one
+                  of the execution it joined, which is recorded in that execution's own trace
+    queue_wait    the task waiting in the queue for a worker
+    connect       the query runner connecting to the data source
+    execute       running the query
+    fetch         fetching the results (fetch_data)
+    serialize     serializing the results to JSON
+    run_query     the query runner's whole run_query (the four stages above, and whatever a runner does in between)
+    store         storing the result
+    alerts        scheduling the checks of the alerts of the queries that got the new result
+    execute_query the whole task
+
+Finished spans are handed to the exporter set with REDASH_TRACING_EXPORTER:
+
+    (empty)       tracing is off (the default)
+    log           spans are logged (to the redash.tracing logger)
+    file          spans are appended to REDASH_TRACING_FILE, one JSON object per line
+    a.b.Exporter  a class of your own, instantiated without arguments, with an export(span) method
+
+Stages that run deep in the query runners use the trace of the task running them (see trace). When
+tracing is off, or there is no current trace, spans cost a function call and are not recorded.
+
+API requests that run a query enqueue it under a trace of their own, with the request's endpoint and user as attributes.
+Its id is logged with the request and sent back in the response's X-Redash-Trace-Id header (see redash.metrics.request).
+"""
+import importlib
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from redash import settings, utils
+
+logger = logging.getLogger('redash.tracing')
+
+_local = threading.local()
+
+
+class LoggingExporter(object):
+    def export(self, span):
+        logger.info("trace_id=%s span=%s duration=%.3f attributes=%s", span['trace_id'], span['name'],
+                    span['duration'], utils.json_dumps(span['attributes']))
+
+
+class FileExporter(object):
+    def __init__(self, path=None):
+        self.path = path or settings.TRACING_FILE
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        line = utils.json_dumps(span) + "\n"
+        # Lines are written with a single append each, so several processes can share the file:
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+
+EXPORTERS = {
+    'log': LoggingExporter,
+    'file': FileExporter
+}
+
+
+def load_exporter(name):
+    if not name:
+        return None
+
+    if name in EXPORTERS:
+        return EXPORTERS[name]()
+
+    module_name, class_name = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+exporter = load_exporter(settings.TRACING_EXPORTER)
+
+
+def set_exporter(new_exporter):
+    """Replace the exporter (None turns tracing off). Returns the previous one."""
+    global exporter
+    previous, exporter = exporter, new_exporter
+    return previous
+
+
+def enabled():
+    return exporter is not None
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def set_current_trace(trace_id, **attributes):
+    """Set the trace (and the attributes shared by its spans) of the work this thread runs from now on."""
+    _local.trace_id = trace_id
+    _local.attributes = attributes
+
+
+def current_trace():
+    return getattr(_local, 'trace_id', None)
+
+
+def record_span(trace_id, name, start_time, end_time, **attributes):
+    """Export a span of a stage timed by the caller (start_time and end_time are timestamps, as of time.time())."""
+    if exporter is None or trace_id is None:
+        return
+
+    if trace_id == current_trace():
+        attributes = dict(getattr(_local, 'attributes', {}), **attributes)
+
+    span = {
+        'trace_id': trace_id,
+        'span_id': uuid.uuid4().hex[:16],
+        'name': name,
+        'start_time': start_time,
+        'duration': (end_time - start_time) * 1000,
+        'attributes': attributes
+    }
+
+    try:
+        exporter.export(span)
+    except Exception:
+        logger.exception("Failed exporting span %s of trace %s", name, trace_id)
+
+
+@contextmanager
+def span(name, trace_id=None, start_time=None, **attributes):
+    """
+    Time the block (or from start_time, when given) as a span of the given trace (or of the current one). Yields the
+    span's attributes, so the block can add some of its own.
+    """
+    trace_id = trace_id or current_trace()
+    if exporter is None or trace_id is None:
+        yield attributes
+        return
+
+    start_time = start_time or time.time()
+    try:
+        yield attributes
+    except Exception as e:
+        attributes.setdefault('error', e.__class__.__name__)
+        raise
+    finally:
+        record_span(trace_id, name, start_time, time.time(), **attributes)
+
+
+@contextmanager
+def use_trace(trace_id, **attributes):
+    """
+    Make trace_id the current trace of the block (with the attributes shared by its spans). The current trace is reset
+    when the block exits, whether it fails or not, so whatever the thread runs next isn't recorded in it.
+    """
+    set_current_trace(trace_id, **attributes)
+    try:
+        yield
+    finally:
+        set_current_trace(None)
+
+
+@contextmanager
+def trace(trace_id, name, start_time=None, **attributes):
+    """Make trace_id the current trace of the block (see use_trace), and time the block as a span of it (see span)."""
+    with use_trace(trace_id, **attributes):
+        with span(name, start_time=start_time) as span_attributes:
+            yield span_attributes
@@ -1,4 +1,6 @@
+import calendar
 import json
+import flask
 from flask_login import UserMixin, AnonymousUserMixin
 import hashlib
 import logging
@@ -7,6 +9,7 @@ import threading
 import time
 import datetime
 import itertools
+import pytz
 from funcy import project
 
 import peewee
@@ -19,6 +22,8 @@ from redash.query_runner import get_query_runner, get_configuration_schema_for_t
 from redash.metrics.database import MeteredPostgresqlExtDatabase, MeteredModel
 from redash.utils import generate_token
 from redash.utils.configuration import ConfigurationContainer
+from redash.utils.schema_index import SchemaIndex, get_cached_index, cache_index
+from redash.cache import ProcessCache, get_version, bump_version
 
 
 
@@ -161,6 +166,7 @@ class ApiUser(UserMixin, PermissionsCheckMixin):
 class Organization(ModelTimestampsMixin, BaseModel):
     SETTING_GOOGLE_APPS_DOMAINS = 'google_apps_domains'
     SETTING_IS_PUBLIC = "is_public"
+    CACHE_VERSION = 'organizations'
 
     id = peewee.PrimaryKeyField()
     name = peewee.CharField()
@@ -182,6 +188,11 @@ class Organization(ModelTimestampsMixin, BaseModel):
     def get_by_slug(cls, slug):
         return cls.get(cls.slug == slug)
 
+    def post_save(self, created):
+        super(Organization, self).post_save(created)
+        # Makes all processes drop their cached organizations (see org_resolving):
+        bump_version(self.CACHE_VERSION)
+
     @property
     def default_group(self):
         return self.groups.where(Group.name=='default', Group.type==Group.BUILTIN_GROUP).first()
@@ -233,11 +244,23 @@ class Group(BaseModel, BelongsToOrgMixin):
     def members(cls, group_id):
         return User.select().where(peewee.SQL("%s = ANY(groups)", group_id))
 
+    def post_save(self, created):
+        super(Group, self).post_save(created)
+        bump_version(User.CACHE_VERSION)
+
+    def delete_instance(self, *args, **kwargs):
+        super(Group, self).delete_instance(*args, **kwargs)
+        bump_version(User.CACHE_VERSION)
+        DataSourceGroup.invalidate_index()
+
     def __unicode__(self):
         return unicode(self.id)
 
 
 class User(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin, UserMixin, PermissionsCheckMixin):
+    # Version of the users (and query API keys) cached by the authentication module:
+    CACHE_VERSION = 'principals'
+
     id = peewee.PrimaryKeyField()
     org = peewee.ForeignKeyField(Organization, related_name="users")
     name = peewee.CharField(max_length=320)
@@ -283,6 +306,15 @@ class User(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin, UserMixin, Permis
         if not self.api_key:
             self.api_key = generate_token(40)
 
+    def post_save(self, created):
+        super(User, self).post_save(created)
+        # Makes all processes drop the users they resolved for authentication:
+        bump_version(self.CACHE_VERSION)
+
+    def delete_instance(self, *args, **kwargs):
+        super(User, self).delete_instance(*args, **kwargs)
+        bump_version(self.CACHE_VERSION)
+
     @property
     def gravatar_url(self):
         email_md5 = hashlib.md5(self.email.lower()).hexdigest()
@@ -290,9 +322,16 @@ class User(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin, UserMixin, Permis
 
     @property
     def permissions(self):
-        # TODO: this should be cached.
-        return list(itertools.chain(*[g.permissions for g in
-                                      Group.select().where(Group.id << self.groups)]))
+        # Cached per instance, as it's checked for every object serialized in a request. The cache is keyed on the
+        # groups, so it doesn't go stale when they're changed on this instance.
+        groups = tuple(self.groups or [])
+        cached = getattr(self, '_permissions', None)
+        if cached is None or cached[0] != groups:
+            permissions = list(itertools.chain(*[g.permissions for g in
+                                                 Group.select().where(Group.id << self.groups)]))
+            cached = self._permissions = (groups, permissions)
+
+        return cached[1]
 
     @classmethod
     def get_by_email_and_org(cls, email, org):
@@ -325,11 +364,32 @@ class ConfigurationField(peewee.TextField):
 
 
 class DataSource(BelongsToOrgMixin, BaseModel):
+    # Interactive executions of queries the database estimates (see BaseQueryRunner.estimate_cost) to return more
+    # rows, or cost more, than these limits have to be confirmed:
+    SETTING_MAX_ESTIMATED_ROWS = 'max_estimated_rows'
+    SETTING_MAX_ESTIMATED_COST = 'max_estimated_cost'
+    SETTING_MAX_ROWS = 'max_rows'
+    SETTING_MAX_RESULT_SIZE = 'max_result_size'
+    SETTING_MAX_SCHEDULED_QUEUE_SIZE = 'max_scheduled_queue_size'
+    SETTING_MAX_IN_FLIGHT_JOBS = 'max_in_flight_jobs'
+    SETTING_SCHEDULE_JITTER = 'schedule_jitter'
+    # The settings above, with the type of their (non-negative) values:
+    NUMERIC_SETTINGS = {
+        SETTING_MAX_ESTIMATED_ROWS: int,
+        SETTING_MAX_ESTIMATED_COST: float,
+        SETTING_MAX_ROWS: int,
+        SETTING_MAX_RESULT_SIZE: int,
+        SETTING_MAX_SCHEDULED_QUEUE_SIZE: int,
+        SETTING_MAX_IN_FLIGHT_JOBS: int,
+        SETTING_SCHEDULE_JITTER: int
+    }
+
     id = peewee.PrimaryKeyField()
     org = peewee.ForeignKeyField(Organization, related_name="data_sources")
     name = peewee.CharField()
     type = peewee.CharField()
     options = ConfigurationField()
+    settings = JSONField(default=dict)
     queue_name = peewee.CharField(default="queries")
     scheduled_queue_name = peewee.CharField(default="scheduled_queries")
     created_at = DateTimeTZField(default=datetime.datetime.now)
@@ -356,6 +416,7 @@ class DataSource(BelongsToOrgMixin, BaseModel):
             d['queue_name'] = self.queue_name
             d['scheduled_queue_name'] = self.scheduled_queue_name
             d['groups'] = self.groups
+            d['settings'] = self.settings
 
         if with_permissions:
             d['view_only'] = self.data_source_groups.view_only
@@ -380,20 +441,148 @@ class DataSource(BelongsToOrgMixin, BaseModel):
 
         if cache is None:
             query_runner = self.query_runner
-            schema = sorted(query_runner.get_schema(get_stats=refresh), key=lambda t: t['name'])
-
-            redis_connection.set(key, json.dumps(schema))
+            table_stats = redis_connection.get(self._table_stats_key)
+            get_stats = refresh and table_stats is None
+            schema = sorted(query_runner.get_schema(get_stats=get_stats), key=lambda t: t['name'])
+
+            if get_stats:
+                table_stats = dict((t['name'], t['size']) for t in schema if 'size' in t)
+                if table_stats:
+                    redis_connection.set(self._table_stats_key, json.dumps(table_stats), settings.SCHEMA_TABLE_STATS_TTL)
+            elif table_stats is not None:
+                table_stats = json.loads(table_stats)
+                for table in schema:
+                    if table['name'] in table_stats:
+                        table['size'] = table_stats[table['name']]
+
+            pipe = redis_connection.pipeline()
+            pipe.set(key, json.dumps(schema))
+            pipe.set(self._schema_version_key, generate_token(16))
+            pipe.execute()
         else:
             schema = json.loads(cache)
 
         return schema
 
+    def get_schema_index(self):
+        """Return a searchable index of the schema, rebuilt only when the cached schema changes."""
+        version = redis_connection.get(self._schema_version_key)
+        index = get_cached_index(self.id, version)
+
+        if index is None:
+            schema = self.get_schema()
+            # get_schema might have just populated the cache, which gives it a new version.
+            version = redis_connection.get(self._schema_version_key)
+            if version is None:
+                # Schemas cached before they got versions have none, and would have their index rebuilt every time.
+                redis_connection.setnx(self._schema_version_key, generate_token(16))
+                version = redis_connection.get(self._schema_version_key)
+            index = SchemaIndex(schema)
+            cache_index(self.id, version, index)
+
+        return index
+
+    @property
+    def _schema_version_key(self):
+        return "data_source:schema_version:{}".format(self.id)
+
+    @property
+    def _table_stats_key(self):
+        return "data_source:table_stats:{}".format(self.id)
+
+    def check_cost(self, query):
+        """Return an error message when the query's estimated rows or cost exceed this data source's limits.
+
+        Returns None when there are no limits, or when the database can't estimate the query.
+        """
+        max_rows = self._numeric_setting(self.SETTING_MAX_ESTIMATED_ROWS)
+        max_cost = self._numeric_setting(self.SETTING_MAX_ESTIMATED_COST)
+
+        if not max_rows and not max_cost:
+            return None
+
+        try:
+            estimate = self.query_runner.estimate_cost(query)
+        except Exception:
+            logging.exception("Failed estimating query cost (data source: %s).", self.id)
+            return None
+
+        if estimate is None:
+            return None
+
+        if max_rows and estimate.get('rows') is not None and estimate['rows'] > max_rows:
+            return "This query is estimated to return {:,} rows, more than this data source's limit ({:,}). " \
+                   "Confirm to run it anyway.".format(int(estimate['rows']), int(max_rows))
+
+        if max_cost and estimate.get('cost') is not None and estimate['cost'] > max_cost:
+            return "This query's estimated cost ({:,.0f}) is higher than this data source's limit ({:,.0f}). " \
+                   "Confirm to run it anyway.".format(estimate['cost'], max_cost)
+
+        return None
+
+    @property
+    def row_limit(self):
+        """Maximum number of rows interactive executions fetch (None when there is no limit)."""
+        return self._numeric_setting(self.SETTING_MAX_ROWS) or settings.QUERY_RESULTS_MAX_ROWS or None
+
+    @property
+    def result_size_limit(self):
+        """Maximum size (in bytes) of a serialized query result (None when there is no limit)."""
+        return self._numeric_setting(self.SETTING_MAX_RESULT_SIZE) or settings.QUERY_RESULTS_MAX_SIZE or None
+
+    @property
+    def max_scheduled_queue_size(self):
+        """Size of the scheduled queue beyond which refreshes of this data source's queries are deferred (or None)."""
+        return self._numeric_setting(self.SETTING_MAX_SCHEDULED_QUEUE_SIZE) or settings.SCHEDULED_QUEUE_MAX_SIZE or None
+
+    @property
+    def max_in_flight_jobs(self):
+        """Number of queued and running jobs beyond which refreshes of this data source's queries are deferred."""
+        return self._numeric_setting(self.SETTING_MAX_IN_FLIGHT_JOBS) or settings.SCHEDULED_MAX_IN_FLIGHT_JOBS or None
+
+    @property
+    def schedule_jitter(self):
+        """Window (in seconds) over which the scheduled runs of this data source's queries are spread (0 for none)."""
+        # Unlike the limits above, 0 is a valid setting here: it turns off the global jitter for this data source.
+        return self._numeric_setting(self.SETTING_SCHEDULE_JITTER, settings.SCHEDULE_JITTER)
+
+    @classmethod
+    def validate_settings(cls, values):
+        """Raise ValueError unless the numeric settings in values are non-negative numbers of the right type."""
+        for key, value_type in cls.NUMERIC_SETTINGS.iteritems():
+            value = values.get(key)
+            if value is None:
+                continue
+
+            valid_types = (int, long, float) if value_type is float else (int, long)
+            if isinstance(value, bool) or not isinstance(value, valid_types) or value < 0:
+                raise ValueError("{} should be a non-negative {}.".format(
+                    key, "number" if value_type is float else "integer"))
+
+    def _numeric_setting(self, key, default=None):
+        # Settings saved before they were validated might be strings (or garbage), which would break the scheduler:
+        value = self.settings.get(key)
+        if value is None:
+            return default
+
+        try:
+            value = self.NUMERIC_SETTINGS[key](value)
+        except (TypeError, ValueError):
+            logging.warning("Ignoring invalid %s setting of data source %s: %r", key, self.id, value)
+            return default
+
+        return value if value >= 0 else default
+
     def add_group(self, group, view_only=False):
         dsg = DataSourceGroup.create(group=group, data_source=self, view_only=view_only)
         setattr(self, 'data_source_groups', dsg)
+        # Query API keys resolve to their data source's groups:
+        bump_version(User.CACHE_VERSION)
 
     def remove_group(self, group):
         DataSourceGroup.delete().where(DataSourceGroup.group==group, DataSourceGroup.data_source==self).execute()
+        bump_version(User.CACHE_VERSION)
+        DataSourceGroup.invalidate_index()
 
     def update_group_permission(self, group, view_only):
         dsg = DataSourceGroup.get(DataSourceGroup.group==group, DataSourceGroup.data_source==self)
@@ -416,11 +605,19 @@ class DataSource(BelongsToOrgMixin, BaseModel):
 
     @property
     def groups(self):
-        groups = DataSourceGroup.select().where(DataSourceGroup.data_source==self)
-        return dict(map(lambda g: (g.group_id, g.view_only), groups))
+        return dict(DataSourceGroup.index(self.org_id).get(self.id, {}))
+
+    def delete_instance(self, *args, **kwargs):
+        super(DataSource, self).delete_instance(*args, **kwargs)
+        DataSourceGroup.invalidate_index()
+
+
+_data_source_groups_indexes = ProcessCache(settings.PERMISSIONS_CACHE_TTL)
 
 
 class DataSourceGroup(BaseModel):
+    CACHE_VERSION = 'data_source_groups'
+
     data_source = peewee.ForeignKeyField(DataSource)
     group = peewee.ForeignKeyField(Group, related_name="data_sources")
     view_only = peewee.BooleanField(default=False)
@@ -428,6 +625,62 @@ class DataSourceGroup(BaseModel):
     class Meta:
         db_table = "data_source_groups"
 
+    @classmethod
+    def index(cls, org_id):
+        """Return the groups of all the org's data sources: {data_source_id: {group_id: view_only}}.
+
+        The index is built with a single query and shared through Redis (and kept in each process) until the data source
+        groups change, so access checks don't query the database. It's also memoized for the current request.
+        """
+        memo = getattr(flask.g, 'data_source_groups', None) if flask.has_app_context() else None
+        if memo is not None and org_id in memo:
+            return memo[org_id]
+
+        version = get_version(cls.CACHE_VERSION)
+        index = _data_source_groups_indexes.get(org_id, version)
+
+        if index is None:
+            key = "data_source_groups:{}:{}".format(org_id, version)
+            cached = redis_connection.get(key)
+
+            if cached is not None:
+                # JSON object keys are strings:
+                index = dict((int(data_source_id), dict((int(group_id), view_only)
+                                                        for group_id, view_only in groups.iteritems()))
+                             for data_source_id, groups in json.loads(cached).iteritems())
+            else:
+                index = {}
+                rows = cls.select(cls.data_source, cls.group, cls.view_only).join(DataSource)\
+                    .where(DataSource.org == org_id).tuples()
+                for data_source_id, group_id, view_only in rows:
+                    index.setdefault(data_source_id, {})[group_id] = view_only
+
+                redis_connection.set(key, json.dumps(index), settings.PERMISSIONS_CACHE_TTL)
+
+            _data_source_groups_indexes.set(org_id, version, index)
+
+        if flask.has_app_context():
+            if memo is None:
+                memo = flask.g.data_source_groups = {}
+            memo[org_id] = index
+
+        return index
+
+    @classmethod
+    def invalidate_index(cls):
+        bump_version(cls.CACHE_VERSION)
+
+        if flask.has_app_context():
+            flask.g.data_source_groups = None
+
+    def post_save(self, created):
+        super(DataSourceGroup, self).post_save(created)
+        DataSourceGroup.invalidate_index()
+
+    def delete_instance(self, *args, **kwargs):
+        super(DataSourceGroup, self).delete_instance(*args, **kwargs)
+        DataSourceGroup.invalidate_index()
+
 
 class QueryResult(BaseModel, BelongsToOrgMixin):
     id = peewee.PrimaryKeyField()
@@ -438,16 +691,26 @@ class QueryResult(BaseModel, BelongsToOrgMixin):
     data = peewee.TextField()
     runtime = peewee.FloatField()
     retrieved_at = DateTimeTZField()
+    # Whether the result was cut at its data source's row limit (see DataSource.row_limit):
+    truncated = peewee.BooleanField(default=False)
 
     class Meta:
         db_table = 'query_results'
 
-    def to_dict(self):
+    def to_dict(self, format=None):
+        d = self._to_dict_without_data()
+        d['data'] = self.get_data(format)
+        return d
+
+    def get_data(self, format=None):
+        """The result's (decoded) data, with its rows in the given format (see utils.convert_data)."""
+        return utils.convert_data(json.loads(self.data), format)
+
+    def _to_dict_without_data(self):
         return {
             'id': self.id,
             'query_hash': self.query_hash,
             'query': self.query,
-            'data': json.loads(self.data),
             'data_source_id': self.data_source_id,
             'runtime': self.runtime,
             'retrieved_at': self.retrieved_at
@@ -466,28 +729,36 @@ class QueryResult(BaseModel, BelongsToOrgMixin):
     def get_latest(cls, data_source, query, max_age=0):
         query_hash = utils.gen_query_hash(query)
 
+        # Truncated results only serve the execution that asked for them, never as a query's (cached) result:
         if max_age == -1:
-            query = cls.select().where(cls.query_hash == query_hash,
-                                       cls.data_source == data_source).order_by(cls.retrieved_at.desc())
+            query = cls.select().where(cls.query_hash == query_hash, cls.data_source == data_source,
+                                       cls.truncated == False).order_by(cls.retrieved_at.desc())
         else:
             query = cls.select().where(cls.query_hash == query_hash, cls.data_source == data_source,
+                                       cls.truncated == False,
                                        peewee.SQL("retrieved_at + interval '%s second' >= now() at time zone 'utc'",
                                                   max_age)).order_by(cls.retrieved_at.desc())
 
         return query.first()
 
     @classmethod
-    def store_result(cls, org_id, data_source_id, query_hash, query, data, run_time, retrieved_at):
+    def store_result(cls, org_id, data_source_id, query_hash, query, data, run_time, retrieved_at, truncated=False):
         query_result = cls.create(org=org_id,
                                   query_hash=query_hash,
                                   query=query,
                                   runtime=run_time,
                                   data_source=data_source_id,
                                   retrieved_at=retrieved_at,
-                                  data=data)
+                                  data=data,
+                                  truncated=truncated)
 
         logging.info("Inserted query (%s) data; id=%s", query_hash, query_result.id)
 
+        if truncated:
+            # Dashboards, alerts and the API would otherwise show the capped rows as the query's result.
+            logging.info("Query (%s) result is truncated; not updating queries.", query_hash)
+            return query_result, []
+
         sql = "UPDATE queries SET latest_query_data_id = %s WHERE query_hash = %s AND data_source_id = %s RETURNING id"
         query_ids = [row[0] for row in db.database.execute_sql(sql, params=(query_result.id, query_hash, data_source_id))]
 
@@ -498,20 +769,67 @@ class QueryResult(BaseModel, BelongsToOrgMixin):
 
         logging.info("Updated %s queries with result (%s).", len(query_ids), query_hash)
 
+        Dashboard.invalidate_cache_for_queries(query_ids)
+
         return query_result, query_ids
 
+    def to_json(self, columns=None, format=None):
+        """Serialize the result like to_dict does, optionally keeping only the given columns (and filter columns).
+
+        When all columns are kept and the stored data is in the default format, it's spliced in as is, instead of being
+        decoded and encoded again.
+        """
+        d = self._to_dict_without_data()
+
+        if columns is None and format is None and not utils.may_be_compact(self.data):
+            return u'{{"data": {}, {}'.format(self.data, utils.json_dumps(d)[1:])
+
+        data = self.get_data()
+
+        if columns is not None:
+            kept = [c for c in data['columns'] if c['name'] in columns or Visualization.is_filter_column(c['name'])]
+            names = [c['name'] for c in kept]
+            data = dict(data, columns=kept, rows=[dict((name, row.get(name)) for name in names) for row in data['rows']])
+
+        d['data'] = utils.convert_data(data, format)
+
+        return utils.json_dumps(d)
+
     def __unicode__(self):
         return u"%d | %s | %s" % (self.id, self.query_hash, self.retrieved_at)
 
     @property
     def groups(self):
-        return self.data_source.groups
+        return dict(DataSourceGroup.index(self.org_id).get(self.data_source_id, {}))
 
 
-def should_schedule_next(previous_iteration, now, schedule):
+def schedule_jitter(key, window):
+    """A stable offset (in whole seconds, under window) for the scheduled runs of the query with the given key (id)."""
+    if not window or key is None:
+        return 0
+
+    fraction = int(hashlib.md5(str(key)).hexdigest()[:8], 16) / float(0x100000000)
+    return int(fraction * window)
+
+
+def should_schedule_next(previous_iteration, now, schedule, jitter_window=0, jitter_key=None):
+    """
+    With a jitter window, runs are spread by an offset of the query's own (see schedule_jitter), so queries with the
+    same schedule don't all run at once. Exact time schedules are delayed by it. Interval schedules instead get a phase
+    spread over the whole interval (the window only turns it on, as spreading them over just its start would still run
+    them all together): the query runs when the time since the epoch, modulo the interval, reaches its phase, so its
+    runs stay exactly an interval apart.
+    """
     if schedule.isdigit():
         ttl = int(schedule)
-        next_iteration = previous_iteration + datetime.timedelta(seconds=ttl)
+        if jitter_window and jitter_key is not None:
+            phase = schedule_jitter(jitter_key, ttl)
+            elapsed = calendar.timegm(previous_iteration.utctimetuple()) + previous_iteration.microsecond / 1e6
+            # The time until the query's next phase (a whole interval when the previous run was right on it):
+            wait = ttl - (elapsed - phase) % ttl
+            next_iteration = previous_iteration + datetime.timedelta(seconds=wait)
+        else:
+            next_iteration = previous_iteration + datetime.timedelta(seconds=ttl)
     else:
         hour, minute = schedule.split(':')
         hour, minute = int(hour), int(minute)
@@ -525,6 +843,7 @@ def should_schedule_next(previous_iteration, now, schedule):
             previous_iteration = normalized_previous_iteration - datetime.timedelta(days=1)
 
         next_iteration = (previous_iteration + datetime.timedelta(days=1)).replace(hour=hour, minute=minute)
+        next_iteration += datetime.timedelta(seconds=schedule_jitter(jitter_key, jitter_window))
 
     return now > next_iteration
 
@@ -607,9 +926,90 @@ class Query(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin):
 
         return q
 
+    LIST_SORT_FIELDS = ('created_at', 'updated_at', 'name')
+
+    @classmethod
+    def accessible(cls, org, user, data_source_id=None, user_id=None, scheduled=None):
+        """Return the org's non archived queries, of data sources in the user's groups, optionally filtered.
+
+        Like all_queries, this goes by the user's groups for admins too (rather than has_access, which lets admins
+        access any data source).
+        """
+        query = cls.select().where(cls.org == org, cls.is_archived == False)
+
+        data_source_ids = [ds_id for ds_id, groups in DataSourceGroup.index(org.id).iteritems()
+                           if set(groups).intersection(user.groups)]
+        if data_source_ids:
+            query = query.where(cls.data_source << data_source_ids)
+        else:
+            query = query.where(peewee.SQL('false'))
+
+        if data_source_id is not None:
+            query = query.where(cls.data_source == data_source_id)
+
+        if user_id is not None:
+            query = query.where(cls.user == user_id)
+
+        if scheduled is not None:
+            query = query.where(~(cls.schedule >> None) if scheduled else (cls.schedule >> None))
+
+        return query
+
+    @classmethod
+    def list_page(cls, query, sort='created_at', descending=True, after=None, page_size=50):
+        """Return a page of the given queries, as lightweight dicts, and the position to pass as after for the next page.
+
+        Pages are keyset paginated: after is the (sort value, id) of the previous page's last query, so fetching a
+        page doesn't get slower the further it is, and pages stay consistent when queries are added.
+        """
+        field = getattr(cls, sort)
+
+        query = query.select(cls.id, cls.name, cls.description, cls.schedule, cls.created_at, cls.updated_at,
+                             cls.data_source, cls.latest_query_data, cls.user, User.name.alias('user_name'),
+                             QueryResult.retrieved_at, QueryResult.runtime)\
+            .switch(cls).join(User, on=(cls.user == User.id))\
+            .switch(cls).join(QueryResult, join_type=peewee.JOIN_LEFT_OUTER, on=(cls.latest_query_data == QueryResult.id))
+
+        if after is not None:
+            value, last_id = after
+            if descending:
+                query = query.where((field < value) | ((field == value) & (cls.id < last_id)))
+            else:
+                query = query.where((field > value) | ((field == value) & (cls.id > last_id)))
+
+        if descending:
+            query = query.order_by(field.desc(), cls.id.desc())
+        else:
+            query = query.order_by(field.asc(), cls.id.asc())
+
+        rows = list(query.limit(page_size + 1).dicts())
+
+        results = []
+        for row in rows[:page_size]:
+            results.append({
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'schedule': row['schedule'],
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at'],
+                'data_source_id': row['data_source'],
+                'latest_query_data_id': row['latest_query_data'],
+                'retrieved_at': row['retrieved_at'],
+                'runtime': row['runtime'],
+                'user': {'id': row['user'], 'name': row['user_name']}
+            })
+
+        next_after = None
+        if len(rows) > page_size:
+            last = rows[page_size - 1]
+            next_after = (last[sort], last['id'])
+
+        return results, next_after
+
     @classmethod
     def outdated_queries(cls):
-        queries = cls.select(cls, QueryResult.retrieved_at, DataSource)\
+        queries = cls.select(cls, QueryResult.retrieved_at, QueryResult.runtime, DataSource)\
             .join(QueryResult)\
             .switch(Query).join(DataSource)\
             .where(cls.schedule != None)
@@ -617,7 +1017,8 @@ class Query(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin):
         now = utils.utcnow()
         outdated_queries = {}
         for query in queries:
-            if should_schedule_next(query.latest_query_data.retrieved_at, now, query.schedule):
+            if should_schedule_next(query.latest_query_data.retrieved_at, now, query.schedule,
+                                    query.data_source.schedule_jitter, query.id):
                 key = "{}:{}".format(query.query_hash, query.data_source.id)
                 outdated_queries[key] = query
 
@@ -669,9 +1070,17 @@ class Query(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin):
         if self.last_modified_by is None:
             self.last_modified_by = self.user
 
+        self._stored_access = None
+        if not created:
+            self._stored_access = Query.select(Query.api_key, Query.data_source)\
+                                       .where(Query.id == self.id).tuples().first()
+
     def post_save(self, created):
         if created:
             self._create_default_visualizations()
+        elif self._stored_access != (self.api_key, self.data_source_id):
+            # The users cached by the authentication module include the queries' API keys and data sources:
+            bump_version(User.CACHE_VERSION)
 
     def _create_default_visualizations(self):
         table_visualization = Visualization(query=self, name="Table",
@@ -694,10 +1103,10 @@ class Query(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin):
 
     @property
     def groups(self):
-        if self.data_source is None:
+        if self.data_source_id is None:
             return {}
 
-        return self.data_source.groups
+        return dict(DataSourceGroup.index(self.org_id).get(self.data_source_id, {}))
 
     def __unicode__(self):
         return unicode(self.id)
@@ -759,7 +1168,7 @@ class Alert(ModelTimestampsMixin, BaseModel):
         return d
 
     def evaluate(self):
-        data = json.loads(self.query.latest_query_data.data)
+        data = self.query.latest_query_data.get_data()
         # todo: safe guard for empty
         value = data['rows'][0][self.options['column']]
         op = self.options['op']
@@ -831,12 +1240,25 @@ class Dashboard(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin):
                 .join(Query, join_type=peewee.JOIN_LEFT_OUTER)\
                 .join(User, join_type=peewee.JOIN_LEFT_OUTER)
 
+            widget_list = list(widget_list)
+            queries = [w.visualization.query for w in widget_list if w.visualization_id is not None]
+
+            # Load the queries' last modifiers up front, instead of lazily per widget.
+            data_sources_groups = DataSourceGroup.index(self.org_id)
+
+            modifier_ids = set(q.last_modified_by_id for q in queries if q.last_modified_by_id is not None)
+            modifiers = dict((u.id, u) for u in User.select().where(User.id << list(modifier_ids))) if modifier_ids else {}
+            for query in queries:
+                if query.last_modified_by_id is not None:
+                    query.last_modified_by = modifiers[query.last_modified_by_id]
+
             widgets = {}
 
             for w in widget_list:
                 if w.visualization_id is None:
                     widgets[w.id] = w.to_dict()
-                elif user and has_access(w.visualization.query.groups, user, view_only):
+                elif user and has_access(data_sources_groups.get(w.visualization.query.data_source_id, {}), user,
+                                         view_only):
                     widgets[w.id] = w.to_dict()
                 else:
                     widgets[w.id] = project(w.to_dict(),
@@ -876,6 +1298,115 @@ class Dashboard(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin):
             'created_at': self.created_at
         }
 
+    def to_json_with_widgets(self, user):
+        """Return to_dict(with_widgets=True, user=user) serialized, cached per permission profile.
+
+        The cache key includes the dashboard's, widgets', visualizations' and queries' updated_at and the latest result
+        ids, so any change to these makes for a new key. Saving a dashboard, widget or visualization or storing a new
+        result also deletes the cached payloads right away.
+        """
+        if not settings.DASHBOARD_CACHE_ENABLED:
+            return utils.json_dumps(self.to_dict(with_widgets=True, user=user))
+
+        key = self._cache_key(user)
+        payload = redis_connection.get(key)
+
+        if payload is None:
+            payload = utils.json_dumps(self.to_dict(with_widgets=True, user=user))
+
+            keys_key = self._cache_keys_key(self.id)
+            pipe = redis_connection.pipeline()
+            pipe.set(key, payload, settings.DASHBOARD_CACHE_TTL)
+            pipe.sadd(keys_key, key)
+            pipe.expire(keys_key, settings.DASHBOARD_CACHE_TTL)
+            pipe.execute()
+
+        return payload
+
+    def _cache_key(self, user):
+        # Users with the same groups see the same dashboard (admins see all of it):
+        if 'admin' in user.permissions:
+            profile = 'admin'
+        else:
+            profile = sorted(user.groups or [])
+
+        versions = Widget.select(Widget.id, Widget.updated_at, Visualization.updated_at, Query.updated_at,
+                                 Query.latest_query_data)\
+            .join(Visualization, join_type=peewee.JOIN_LEFT_OUTER)\
+            .join(Query, join_type=peewee.JOIN_LEFT_OUTER)\
+            .where(Widget.dashboard == self.id)\
+            .order_by(Widget.id)\
+            .tuples()
+
+        # Changes to the data sources' groups (access granted or revoked) change the version, and with it the key:
+        access_version = get_version(DataSourceGroup.CACHE_VERSION)
+
+        fingerprint = hashlib.md5(repr((profile, access_version, self.updated_at, list(versions)))).hexdigest()
+
+        return "dashboard:{}:{}".format(self.id, fingerprint)
+
+    @staticmethod
+    def _cache_keys_key(dashboard_id):
+        return "dashboard:{}:cache_keys".format(dashboard_id)
+
+    @classmethod
+    def invalidate_cache(cls, dashboard_ids):
+        for dashboard_id in set(dashboard_ids):
+            keys_key = cls._cache_keys_key(dashboard_id)
+            keys = redis_connection.smembers(keys_key)
+            redis_connection.delete(keys_key, *keys)
+
+    @classmethod
+    def invalidate_cache_for_queries(cls, query_ids):
+        if not query_ids:
+            return
+
+        dashboard_ids = Widget.select(Widget.dashboard).join(Visualization)\
+            .where(Visualization.query << query_ids).tuples()
+        cls.invalidate_cache(dashboard_id for dashboard_id, in dashboard_ids)
+
+    def latest_results(self, user):
+        """Return the latest results of the dashboard's visualizations the user has access to.
+
+        Returns a (visualizations, results) tuple: visualizations maps each visualization id to the id of its latest
+        query result, and results maps each (distinct) query result id to a (QueryResult, columns) tuple, where columns
+        is the set of columns the visualizations using this result need (None if they might need all of them).
+        """
+        rows = Visualization.select(Visualization.id, Visualization.type, Visualization.options,
+                                    Query.latest_query_data, Query.data_source)\
+            .join(Widget).where(Widget.dashboard == self.id)\
+            .switch(Visualization).join(Query)\
+            .tuples()
+
+        rows = [row for row in rows if row[3] is not None and row[4] is not None]
+
+        data_sources_groups = DataSourceGroup.index(self.org_id)
+        access = dict((data_source_id, has_access(data_sources_groups.get(data_source_id, {}), user, view_only))
+                      for data_source_id in set(row[4] for row in rows))
+        visualizations = {}
+        columns = {}
+
+        for vis_id, vis_type, vis_options, query_result_id, data_source_id in rows:
+            if not access[data_source_id]:
+                continue
+
+            visualizations[vis_id] = query_result_id
+            needed = Visualization.columns_used(vis_type, json.loads(vis_options))
+
+            if query_result_id not in columns:
+                columns[query_result_id] = needed
+            elif needed is None or columns[query_result_id] is None:
+                columns[query_result_id] = None
+            else:
+                columns[query_result_id] |= needed
+
+        results = {}
+        if columns:
+            for query_result in QueryResult.select().where(QueryResult.id << columns.keys()):
+                results[query_result.id] = (query_result, columns[query_result.id])
+
+        return visualizations, results
+
     @classmethod
     def all(cls, org=None):
         if org:
@@ -917,6 +1448,10 @@ class Dashboard(ModelTimestampsMixin, BaseModel, BelongsToOrgMixin):
 
         super(Dashboard, self).save(*args, **kwargs)
 
+    def post_save(self, created):
+        super(Dashboard, self).post_save(created)
+        Dashboard.invalidate_cache([self.id])
+
     def __unicode__(self):
         return u"%s=%s" % (self.id, self.name)
     
@@ -966,11 +1501,47 @@ class Visualization(ModelTimestampsMixin, BaseModel):
 
         return d
 
+    FILTER_TYPES = ('filter', 'multi-filter', 'multiFilter')
+
+    @classmethod
+    def columns_used(cls, vis_type, options):
+        """Return the names of the result columns a visualization renders, or None when it might use all of them.
+
+        Filter columns (name::filter and friends) are used by dashboard filters, so callers should keep them too.
+        """
+        if vis_type == 'CHART':
+            mapping = options.get('columnMapping') or {}
+            if not mapping:
+                return None
+            return set(name for name, role in mapping.iteritems() if role != 'unused')
+
+        if vis_type == 'COUNTER':
+            return set(name for name in (options.get('counterColName', 'counter'), options.get('targetColName')) if name)
+
+        return None
+
+    @classmethod
+    def is_filter_column(cls, name):
+        parts = name.split('::') if '::' in name else name.split('__')
+        return len(parts) > 1 and parts[1] in cls.FILTER_TYPES
+
     @classmethod
     def get_by_id_and_org(cls, visualization_id, org):
         return cls.select(Visualization, Query).join(Query).where(cls.id == visualization_id,
                                                                   Query.org == org).get()
 
+    def post_save(self, created):
+        super(Visualization, self).post_save(created)
+        self._invalidate_dashboards_cache()
+
+    def delete_instance(self, *args, **kwargs):
+        super(Visualization, self).delete_instance(*args, **kwargs)
+        self._invalidate_dashboards_cache()
+
+    def _invalidate_dashboards_cache(self):
+        Dashboard.invalidate_cache(w.dashboard_id for w in Widget.select(Widget.dashboard)
+                                   .where(Widget.visualization == self.id))
+
     def __unicode__(self):
         return u"%s %s" % (self.id, self.type)
 
@@ -1021,6 +1592,11 @@ class Widget(ModelTimestampsMixin, BaseModel):
         self.dashboard.layout = json.dumps(layout)
         self.dashboard.save()
         super(Widget, self).delete_instance(*args, **kwargs)
+        Dashboard.invalidate_cache([self.dashboard_id])
+
+    def post_save(self, created):
+        super(Widget, self).post_save(created)
+        Dashboard.invalidate_cache([self.dashboard_id])
 
 
 class Event(BaseModel):
@@ -1055,7 +1631,161 @@ class Event(BaseModel):
         return event
 
 
-all_models = (Organization, Group, DataSource, DataSourceGroup, User, QueryResult, Query, Alert, AlertSubscription, Dashboard, Visualization, Widget, Event)
+class QueryExecution(BaseModel):
+    """
+    Log of query executions (successful or not), for capacity planning.
+
+    Executions are recorded in a Redis list first, and flushed to the database in batches by a periodic task, so
+    recording one costs the query's task a single Redis round trip. The list is capped (at
+    QUERY_EXECUTIONS_BUFFER_MAX_SIZE executions, dropping the oldest), so it can't grow without bounds while the
+    executions can't be written. The ids are plain integers (rather than foreign keys),
+    so the log outlives the queries and data sources it mentions.
+    """
+    BUFFER_KEY = 'query_executions:buffer'
+
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    TOO_LARGE = 'too_large'
+    # Interactive executions estimated to cost more than the data source's limits, that weren't confirmed:
+    REJECTED = 'rejected'
+
+    org_id = peewee.IntegerField()
+    query_id = peewee.IntegerField(null=True)
+    query_hash = peewee.CharField(max_length=32)
+    data_source_id = peewee.IntegerField()
+    username = peewee.CharField(max_length=320, null=True)
+    queue = peewee.CharField(null=True)
+    task_id = peewee.CharField(null=True)
+    wait_time = peewee.FloatField(null=True)
+    run_time = peewee.FloatField(null=True)
+    rows = peewee.IntegerField(null=True)
+    bytes = peewee.IntegerField(null=True)
+    outcome = peewee.CharField(max_length=20)
+    worker = peewee.CharField(null=True)
+    started_at = DateTimeTZField(index=True)
+
+    class Meta:
+        db_table = 'query_executions'
+
+    @classmethod
+    def record(cls, execution):
+        """Buffer an execution (a dict of the fields, with started_at as a timestamp) to be flushed later."""
+        if settings.QUERY_EXECUTIONS_LOG_ENABLED:
+            pipe = redis_connection.pipeline(transaction=False)
+            pipe.lpush(cls.BUFFER_KEY, json.dumps(execution))
+            pipe.ltrim(cls.BUFFER_KEY, 0, settings.QUERY_EXECUTIONS_BUFFER_MAX_SIZE - 1)
+            pipe.execute()
+
+    @classmethod
+    def flush(cls, batch_size=1000):
+        """
+        Write the oldest buffered executions (up to batch_size) to the database. Returns how many were written.
+
+        When the batch can't be written, its executions are written one by one, and the ones the database rejects
+        (like ones with values it can't store) are logged and dropped, so they can't block the log. When the database
+        can't be reached, the executions left are put back in the buffer, to be written by the next flush.
+        """
+        pipe = redis_connection.pipeline()
+        pipe.lrange(cls.BUFFER_KEY, -batch_size, -1)
+        pipe.ltrim(cls.BUFFER_KEY, 0, -batch_size - 1)
+        entries = pipe.execute()[0]
+
+        if not entries:
+            return 0
+
+        # Oldest first, as (entry, execution) pairs:
+        executions = []
+        for entry in reversed(entries):
+            try:
+                execution = json.loads(entry)
+                execution['started_at'] = datetime.datetime.fromtimestamp(execution['started_at'], pytz.utc)
+            except (ValueError, TypeError, KeyError):
+                logging.error("Dropping invalid query execution: %s", entry)
+                continue
+            executions.append((entry, execution))
+
+        if not executions:
+            return 0
+
+        try:
+            with db.database.transaction():
+                cls.insert_many([execution for _, execution in executions]).execute()
+        except Exception:
+            logging.exception("Failed writing %d query executions, writing them one by one.", len(executions))
+            return cls._write_one_by_one(executions)
+
+        return len(executions)
+
+    @classmethod
+    def _write_one_by_one(cls, executions):
+        written = 0
+        for i, (entry, execution) in enumerate(executions):
+            try:
+                with db.database.transaction():
+                    cls.insert_many([execution]).execute()
+                written += 1
+            except (peewee.DataError, peewee.IntegrityError):
+                logging.exception("Dropping query execution the database rejected: %s", entry)
+            except Exception:
+                # Put the ones left back (where they were, at the oldest end), to be written by the next flush.
+                redis_connection.rpush(cls.BUFFER_KEY, *[e for e, _ in reversed(executions[i:])])
+                raise
+
+        return written
+
+    @classmethod
+    def _report(cls, org, days, columns, group_by, order_by, limit=None, *where):
+        since = utils.utcnow() - datetime.timedelta(days=days)
+        aggregates = [peewee.fn.COUNT(cls.id).alias('executions'),
+                      peewee.fn.SUM(peewee.SQL("CASE WHEN outcome = 'success' THEN 0 ELSE 1 END")).alias('failures'),
+                      peewee.fn.AVG(cls.wait_time).alias('avg_wait_time'),
+                      peewee.fn.AVG(cls.run_time).alias('avg_run_time'),
+                      peewee.fn.MAX(cls.run_time).alias('max_run_time'),
+                      peewee.fn.SUM(cls.run_time).alias('total_run_time'),
+                      peewee.fn.SUM(cls.bytes).alias('total_bytes')]
+
+        query = cls.select(*(columns + aggregates))\
+            .where(cls.org_id == org.id, cls.started_at >= since, *where)\
+            .group_by(*group_by)\
+            .order_by(peewee.SQL(order_by))
+
+        if limit:
+            query = query.limit(limit)
+
+        return list(query.dicts())
+
+    @staticmethod
+    def _add_names(rows, model, key):
+        ids = [row[key] for row in rows]
+        names = dict(model.select(model.id, model.name).where(model.id << ids).tuples()) if ids else {}
+        for row in rows:
+            row['name'] = names.get(row[key])
+
+        return rows
+
+    @classmethod
+    def slowest_queries(cls, org, days=7, limit=20):
+        """The saved queries that ran the longest on average."""
+        rows = cls._report(org, days, [cls.query_id], [cls.query_id], 'avg_run_time DESC NULLS LAST', limit,
+                           cls.query_id.is_null(False))
+        return cls._add_names(rows, Query, 'query_id')
+
+    @classmethod
+    def heaviest_data_sources(cls, org, days=7, limit=20):
+        """The data sources that spent the most time running queries."""
+        rows = cls._report(org, days, [cls.data_source_id], [cls.data_source_id], 'total_run_time DESC NULLS LAST',
+                           limit)
+        return cls._add_names(rows, DataSource, 'data_source_id')
+
+    @classmethod
+    def busiest_hours(cls, org, days=7):
+        """The executions started in each hour of the day (UTC)."""
+        hour = peewee.fn.date_part('hour', peewee.SQL("started_at AT TIME ZONE 'UTC'"))
+        return cls._report(org, days, [hour.alias('hour')], [peewee.SQL('hour')], 'hour')
+
+
+all_models = (Organization, Group, DataSource, DataSourceGroup, User, QueryResult, Query, Alert, AlertSubscription, Dashboard, Visualization, Widget, Event, QueryExecution)
 
 
 def init_db():
@@ -1,4 +1,83 @@
-from redash import redis_connection, models, __version__
+import math
+
+from redash import redis_connection, models, settings, __version__
+from redash.metrics.registry import Gauge
+
+# Samples of the time query executions waited in their queue and ran, kept for the percentiles in the status (the most
+# recent settings.STATUS_SAMPLES_SIZE of each kind). Keys of queues and data sources gone idle expire after a week.
+SAMPLES_TTL = 7 * 24 * 3600
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _samples_key(kind, scope, name):
+    return 'monitor:{}:{}:{}'.format(kind, scope, name)
+
+
+def _add_samples(samples):
+    pipe = redis_connection.pipeline(transaction=False)
+    for key, value in samples:
+        pipe.lpush(key, value)
+        pipe.ltrim(key, 0, settings.STATUS_SAMPLES_SIZE - 1)
+        pipe.expire(key, SAMPLES_TTL)
+    pipe.execute()
+
+
+def record_wait_time(queue, data_source_id, wait_time):
+    samples = [(_samples_key('wait_time', 'data_source', data_source_id), wait_time)]
+    if queue is not None:
+        samples.append((_samples_key('wait_time', 'queue', queue), wait_time))
+
+    _add_samples(samples)
+
+
+def record_run_time(data_source_id, run_time):
+    _add_samples([(_samples_key('run_time', 'data_source', data_source_id), run_time)])
+
+
+def percentiles(samples):
+    """The (nearest rank) percentiles of the samples, along with their number."""
+    samples = sorted(float(s) for s in samples)
+    result = {'samples': len(samples)}
+    for percentile in PERCENTILES:
+        if samples:
+            rank = max(int(math.ceil(percentile / 100.0 * len(samples))), 1)
+            result['p{}'.format(percentile)] = samples[rank - 1]
+        else:
+            result['p{}'.format(percentile)] = None
+
+    return result
+
+
+def _get_percentiles(keys):
+    pipe = redis_connection.pipeline(transaction=False)
+    for key in keys:
+        pipe.lrange(key, 0, -1)
+
+    return [percentiles(samples) for samples in pipe.execute()]
+
+
+def get_queues():
+    """The queues of the data sources, along with the names of the data sources using each."""
+    queues = {}
+    for ds in models.DataSource.select():
+        for queue in (ds.queue_name, ds.scheduled_queue_name):
+            queues.setdefault(queue, set())
+            queues[queue].add(ds.name)
+
+    return queues
+
+
+def collect_queue_sizes():
+    queues = get_queues().keys()
+    pipe = redis_connection.pipeline(transaction=False)
+    for queue in queues:
+        pipe.llen(queue)
+
+    return [({'queue': queue}, size) for queue, size in zip(queues, pipe.execute())]
+
+
+queue_size_gauge = Gauge('redash_queue_size', "Number of tasks waiting in each queue.", labels=('queue',),
+                         collect=collect_queue_sizes)
 
 
 def get_status():
@@ -18,17 +97,28 @@ def get_status():
     status['manager'] = manager_status
     status['manager']['outdated_queries_count'] = len(models.Query.outdated_queries())
 
-    queues = {}
-    for ds in models.DataSource.select():
-        for queue in (ds.queue_name, ds.scheduled_queue_name):
-            queues.setdefault(queue, set())
-            queues[queue].add(ds.name)
+    queues = get_queues()
+    queue_wait_times = _get_percentiles([_samples_key('wait_time', 'queue', queue) for queue in queues])
 
     status['manager']['queues'] = {}
-    for queue, sources in queues.iteritems():
+    for (queue, sources), wait_time in zip(queues.iteritems(), queue_wait_times):
         status['manager']['queues'][queue] = {
             'data_sources': ', '.join(sources),
-            'size': redis_connection.llen(queue)
+            'size': redis_connection.llen(queue),
+            'wait_time': wait_time
+        }
+
+    data_sources = list(models.DataSource.select().order_by(models.DataSource.id))
+    times = _get_percentiles([_samples_key(kind, 'data_source', ds.id)
+                              for ds in data_sources for kind in ('wait_time', 'run_time')])
+
+    status['data_sources'] = {}
+    for i, ds in enumerate(data_sources):
+        status['data_sources'][ds.id] = {
+            'name': ds.name,
+            'type': ds.type,
+            'wait_time': times[2 * i],
+            'run_time': times[2 * i + 1]
         }
 
     return status
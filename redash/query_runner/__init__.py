@@ -1,13 +1,21 @@
+import datetime
+import decimal
 import logging
 import json
+import re
+import time
+from multiprocessing.pool import ThreadPool
 
 from redash import settings
+from redash.metrics import tracing
+from redash.utils import json_dumps, COMPACT_FORMAT, JSON_CONVERSIONS
 
 logger = logging.getLogger(__name__)
 
 __all__ = [
     'BaseQueryRunner',
     'InterruptException',
+    'ResultTooLargeError',
     'BaseSQLQueryRunner',
     'TYPE_DATETIME',
     'TYPE_BOOLEAN',
@@ -16,6 +24,8 @@ __all__ = [
     'TYPE_DATE',
     'TYPE_FLOAT',
     'SUPPORTED_COLUMN_TYPES',
+    'parse_estimate',
+    'convert_value',
     'register',
     'get_query_runner',
     'import_query_runners'
@@ -43,7 +53,94 @@ class InterruptException(Exception):
     pass
 
 
+class ResultTooLargeError(Exception):
+    pass
+
+
+def result_too_large_message(limit):
+    return "Query result is larger than this data source's limit ({:,} bytes). " \
+           "Select fewer rows or columns.".format(limit)
+
+
+ESTIMATE_SUFFIXES = {'': 1, 'K': 10 ** 3, 'M': 10 ** 6, 'B': 10 ** 9, 'G': 10 ** 9, 'T': 10 ** 12}
+ESTIMATE_REGEX = re.compile(r'^([\d.,]+)\s*([KMBGT]?)$', re.IGNORECASE)
+
+
+def parse_estimate(value):
+    """Parse a number from a query plan, like 1234, 1,234 or 1.23K. Returns None for anything else (like ?)."""
+    match = ESTIMATE_REGEX.match(value.strip())
+    if match is None:
+        return None
+
+    try:
+        number = float(match.group(1).replace(',', ''))
+    except ValueError:
+        return None
+
+    return number * ESTIMATE_SUFFIXES[match.group(2).upper()]
+
+
+def convert_value(value):
+    """Convert a value JSON has no type for (like Decimal or datetime) to one it has. Other values are returned as is."""
+    convert = JSON_CONVERSIONS.get(type(value))
+    if convert is None:
+        return value
+    return convert(value)
+
+
+def _convert_float(value):
+    if type(value) is decimal.Decimal:
+        return float(value)
+    return convert_value(value)
+
+
+def _convert_date(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return convert_value(value)
+
+
+# Types of the values the JSON encoder serializes natively (it handles UTF-8 byte strings itself, faster than decoding
+# them here would). Columns whose values are of these types are left as they are.
+NATIVE_JSON_TYPES = frozenset((int, long, float, bool, str, unicode))
+
+# How fetch_data converts the values of each type of column, when they aren't of a native type (like Decimal or
+# datetime values). Columns of other types have their values converted with convert_value.
+COLUMN_CONVERTERS = {
+    TYPE_FLOAT: _convert_float,
+    TYPE_DATETIME: _convert_date,
+    TYPE_DATE: _convert_date
+}
+
+
+# How many rows to fetch from the cursor at a time:
+FETCH_BATCH_SIZE = 1000
+# How many of each batch's rows are encoded to estimate the batch's size, when there is a result_size_limit:
+SIZE_SAMPLE_ROWS = 50
+
+
+def _estimate_size(batch):
+    # Encoding every row just to measure it would double the cost of serializing the result, so this encodes an
+    # evenly spread sample of the batch's rows and scales its size up.
+    step = max(1, len(batch) // SIZE_SAMPLE_ROWS)
+    sample = batch[::step]
+    return len(json_dumps(sample)) * len(batch) // len(sample)
+
+
 class BaseQueryRunner(object):
+    # Maximum number of rows run_query fetches (None fetches all of them). Interactive executions set it to their data
+    # source's limit (see DataSource.row_limit).
+    row_limit = None
+    # Maximum size (in bytes) of the serialized result run_query may build (None for no limit). Set by execute_query
+    # to its data source's limit (see DataSource.result_size_limit).
+    result_size_limit = None
+    # Format of the rows fetch_data returns: dicts (None), or utils.COMPACT_FORMAT for the cursor's rows as they are.
+    row_format = None
+    # Number of rows the last fetch_data call fetched (None for runners that don't use it).
+    row_count = None
+    # Whether the last fetch_data call stopped at row_limit.
+    truncated = False
+
     def __init__(self, configuration):
         self.syntax = 'sql'
         self.configuration = configuration
@@ -89,9 +186,140 @@ class BaseQueryRunner(object):
 
         return new_columns
 
+    def column_converter(self, column, value):
+        """Return the function fetch_data converts the column's values with (or None to leave them as they are).
+
+        value is the column's first value that isn't None: when it's of a type the JSON encoder handles natively,
+        the values are left as they are (any odd one later on is still handled by the encoder, only slower).
+        """
+        if type(value) in NATIVE_JSON_TYPES:
+            return None
+
+        return COLUMN_CONVERTERS.get(column['type'], convert_value)
+
+    def _pick_converters(self, batch, columns, undecided):
+        # Picks the converters of the undecided columns that have a value in this batch, and removes them from
+        # undecided. Until then, their values are all None, which need no conversion.
+        converters = []
+        for i in list(undecided):
+            value = next((row[i] for row in batch if row[i] is not None), None)
+            if value is None:
+                continue
+
+            undecided.remove(i)
+            convert = self.column_converter(columns[i], value)
+            if convert is not None:
+                converters.append((i, convert))
+
+        return converters
+
+    def fetch_data(self, cursor, columns):
+        """Fetch the rows of an executed DB-API cursor, and return them along with the columns as a result's data.
+
+        Rows are fetched in batches, and fetching stops once there are more than row_limit rows, so the rows beyond
+        the limit are never converted (or, with cursors that stream their results, even transferred). A truncated
+        result is flagged with 'truncated', and with the query's total row count in 'total_rows' when the cursor
+        knows it.
+
+        Each column's values are converted with the function column_converter picks for it once, by the column's type
+        and its first value, so the JSON encoder doesn't have to call back into Python for each Decimal or date value.
+        Columns of values the encoder handles natively are left alone, and when no column needs converting the rows
+        aren't copied at all.
+
+        With row_format set to COMPACT_FORMAT the rows are kept as the cursor returned them (sequences of values),
+        instead of being converted to dicts.
+
+        With a result_size_limit, the size of the fetched rows is estimated as each batch is fetched (from a sample
+        of its rows), and once it passes the limit the query is cancelled and ResultTooLargeError is raised, before
+        the result is built. As this is an estimate, execute_query still checks the size of the serialized result.
+
+        The fetch is recorded as a span of the current trace (see redash.metrics.tracing).
+        """
+        started_at = time.time()
+        column_names = [c['name'] for c in columns]
+        undecided = range(len(columns))
+        converters = []
+        limit = self.row_limit
+        size_limit = self.result_size_limit
+        size = 0
+        rows = []
+        truncated = False
+
+        while True:
+            batch_size = FETCH_BATCH_SIZE
+            if limit:
+                # One row beyond the limit tells whether the result is truncated.
+                batch_size = min(batch_size, limit + 1 - len(rows))
+
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+
+            if undecided:
+                converters.extend(self._pick_converters(batch, columns, undecided))
+
+            if converters:
+                batch = [list(row) for row in batch]
+                for row in batch:
+                    for i, convert in converters:
+                        row[i] = convert(row[i])
+
+            if self.row_format != COMPACT_FORMAT:
+                batch = [dict(zip(column_names, row)) for row in batch]
+
+            if size_limit:
+                size += _estimate_size(batch)
+                if size > size_limit:
+                    self._cancel_cursor(cursor)
+                    raise ResultTooLargeError(result_too_large_message(size_limit))
+
+            rows.extend(batch)
+
+            if limit and len(rows) > limit:
+                del rows[limit:]
+                truncated = True
+                break
+
+        data = {'columns': columns, 'rows': rows}
+
+        if self.row_format == COMPACT_FORMAT:
+            data['format'] = COMPACT_FORMAT
+
+        if truncated:
+            data['truncated'] = True
+            rowcount = getattr(cursor, 'rowcount', None)
+            data['total_rows'] = rowcount if rowcount and rowcount > limit else None
+
+        self.row_count = len(rows)
+        self.truncated = truncated
+        tracing.record_span(tracing.current_trace(), 'fetch', started_at, time.time(), rows=len(rows))
+
+        return data
+
+    @staticmethod
+    def _cancel_cursor(cursor):
+        # DB-API has no standard way to cancel a query, so this uses whichever the driver has (like pyhive's
+        # cursor.cancel or psycopg2's connection.cancel).
+        cancel = getattr(cursor, 'cancel', None) or getattr(getattr(cursor, 'connection', None), 'cancel', None)
+        if cancel is None:
+            return
+
+        try:
+            cancel()
+        except Exception:
+            logger.exception("Failed cancelling query.")
+
     def get_schema(self, get_stats=False):
         return []
 
+    def estimate_cost(self, query):
+        """Return the database's estimate of the query's result rows and cost, without running it.
+
+        Returns a dict with 'rows' and 'cost' (either can be None), or None when the runner can't estimate queries.
+        Interactive executions compare it with the data source's limits (see DataSource.check_cost).
+        """
+        return None
+
     def _run_query_internal(self, query):
         results, error = self.run_query(query)
 
@@ -123,10 +351,50 @@ class BaseSQLQueryRunner(BaseQueryRunner):
         return []
 
     def _get_tables_stats(self, tables_dict):
+        try:
+            sizes = self._get_catalog_tables_sizes()
+        except Exception:
+            logger.exception("Failed loading table sizes from catalog statistics, falling back to counting rows.")
+            sizes = {}
+
+        missing = []
         for t in tables_dict.keys():
-            if type(tables_dict[t]) == dict:
-                res = self._run_query_internal('select count(*) as cnt from %s' % t)
-                tables_dict[t]['size'] = res[0]['cnt']
+            if type(tables_dict[t]) != dict:
+                continue
+
+            if sizes.get(t) is not None:
+                tables_dict[t]['size'] = sizes[t]
+            else:
+                missing.append(t)
+
+        if not missing:
+            return
+
+        concurrency = min(settings.SCHEMA_TABLE_SIZE_CALCULATIONS_CONCURRENCY, len(missing))
+        if concurrency <= 1:
+            counts = [self._count_table_rows(t) for t in missing]
+        else:
+            pool = ThreadPool(concurrency)
+            try:
+                counts = pool.map(self._count_table_rows, missing)
+            finally:
+                pool.close()
+                pool.join()
+
+        for t, count in zip(missing, counts):
+            tables_dict[t]['size'] = count
+
+    def _get_catalog_tables_sizes(self):
+        """Return estimated row counts ({table name: rows}) from the database's catalog statistics.
+
+        Tables missing from the result get counted with count(*), so runners without catalog statistics don't need to
+        override this.
+        """
+        return {}
+
+    def _count_table_rows(self, table_name):
+        res = self._run_query_internal('select count(*) as cnt from %s' % table_name)
+        return res[0]['cnt']
 
 query_runners = {}
 
@@ -3,7 +3,7 @@ import json
 import logging
 import sys
 from redash.query_runner import *
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -140,7 +140,7 @@ class GoogleSpreadsheet(BaseQueryRunner):
                 })
             rows = [dict(zip(column_names, _value_eval_list(row))) for row in all_data[self.HEADER_INDEX + 1:]]
             data = {'columns': columns, 'rows': rows}
-            json_data = json.dumps(data, cls=JSONEncoder)
+            json_data = json_dumps(data)
             error = None
         except Exception as e:
             raise sys.exc_info()[1], None, sys.exc_info()[2]
@@ -3,7 +3,7 @@ import logging
 import sys
 
 from redash.query_runner import *
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -97,12 +97,10 @@ class Hive(BaseSQLQueryRunner):
 
             cursor.execute(query)
 
-            column_names = []
             columns = []
 
             for column in cursor.description:
                 column_name = column[COLUMN_NAME]
-                column_names.append(column_name)
 
                 columns.append({
                     'name': column_name,
@@ -110,10 +108,8 @@ class Hive(BaseSQLQueryRunner):
                     'type': types_map.get(column[COLUMN_TYPE], None)
                 })
 
-            rows = [dict(zip(column_names, row)) for row in cursor]
-
-            data = {'columns': columns, 'rows': rows}
-            json_data = json.dumps(data, cls=JSONEncoder)
+            data = self.fetch_data(cursor, columns)
+            json_data = json_dumps(data)
             error = None
             cursor.close()
         except KeyboardInterrupt:
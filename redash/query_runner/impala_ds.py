@@ -1,9 +1,10 @@
 import json
 import logging
+import re
 import sys
 
 from redash.query_runner import *
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,8 @@ try:
 except ImportError, e:
     enabled = False
 
+IMPALA_CARDINALITY_REGEX = re.compile(r'cardinality=(\S+)')
+
 COLUMN_NAME = 0
 COLUMN_TYPE = 1
 
@@ -97,6 +100,17 @@ class Impala(BaseSQLQueryRunner):
             raise sys.exc_info()[1], None, sys.exc_info()[2]
         return schema.values()
 
+    def estimate_cost(self, query):
+        # The first step of the text plan is the output, e.g.: |  tuple-ids=0 row-size=19B cardinality=1.23K
+        # cardinality is unavailable (-1) for tables without stats.
+        plan = u"\n".join(row.values()[0] for row in self._run_query_internal("EXPLAIN {}".format(query)))
+
+        match = IMPALA_CARDINALITY_REGEX.search(plan)
+        if match is None:
+            return None
+
+        return {'rows': parse_estimate(match.group(1)), 'cost': None}
+
     def run_query(self, query):
 
         connection = None
@@ -107,12 +121,10 @@ class Impala(BaseSQLQueryRunner):
 
             cursor.execute(query)
 
-            column_names = []
             columns = []
 
             for column in cursor.description:
                 column_name = column[COLUMN_NAME]
-                column_names.append(column_name)
 
                 columns.append({
                     'name': column_name,
@@ -120,10 +132,8 @@ class Impala(BaseSQLQueryRunner):
                     'type': types_map.get(column[COLUMN_TYPE], None)
                 })
 
-            rows = [dict(zip(column_names, row)) for row in cursor]
-
-            data = {'columns': columns, 'rows': rows}
-            json_data = json.dumps(data, cls=JSONEncoder)
+            data = self.fetch_data(cursor, columns)
+            json_data = json_dumps(data)
             error = None
             cursor.close()
         except DatabaseError as e:
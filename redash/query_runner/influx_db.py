@@ -1,7 +1,7 @@
 import json
 import logging
 
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 from redash.query_runner import *
 
 logger = logging.getLogger(__name__)
@@ -26,10 +26,10 @@ def _transform_result(results):
         for point in result.get_points():
             result_rows.append(point)
 
-    return json.dumps({
+    return json_dumps({
         "columns" : result_columns,
         "rows" : result_rows
-    }, cls=JSONEncoder)
+    })
 
 
 class InfluxDB(BaseQueryRunner):
@@ -2,8 +2,9 @@ import json
 import logging
 import sys
 
+from redash.metrics import tracing
 from redash.query_runner import *
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -92,6 +93,26 @@ class SqlServer(BaseSQLQueryRunner):
 
         return schema.values()
 
+    def _get_catalog_tables_sizes(self):
+        query = """
+        SELECT s.name AS table_schema, t.name AS table_name, SUM(p.rows) AS table_rows
+        FROM sys.tables t
+        JOIN sys.schemas s ON s.schema_id = t.schema_id
+        JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1)
+        GROUP BY s.name, t.name;
+        """
+
+        sizes = {}
+        for row in self._run_query_internal(query):
+            if row['table_schema'] != self.configuration['db']:
+                table_name = '{}.{}'.format(row['table_schema'], row['table_name'])
+            else:
+                table_name = row['table_name']
+
+            sizes[table_name] = int(row['table_rows'])
+
+        return sizes
+
 
     def run_query(self, query):
 
@@ -107,19 +128,19 @@ class SqlServer(BaseSQLQueryRunner):
             if port != 1433:
                 server = server + ':' + str(port)
 
-            connection = pymssql.connect(server, user, password, db)
+            with tracing.span('connect'):
+                connection = pymssql.connect(server, user, password, db)
             cursor = connection.cursor()
             logger.debug("SqlServer running query: %s", query)
 
-            cursor.execute(query)
-            data = cursor.fetchall()
+            with tracing.span('execute'):
+                cursor.execute(query)
 
             if cursor.description is not None:
                 columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
-                rows = [dict(zip((c['name'] for c in columns), row)) for row in data]
-
-                data = {'columns': columns, 'rows': rows}
-                json_data = json.dumps(data, cls=JSONEncoder)
+                data = self.fetch_data(cursor, columns)
+                with tracing.span('serialize'):
+                    json_data = json_dumps(data)
                 error = None
             else:
                 error = "No data was returned."
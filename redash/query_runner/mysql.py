@@ -2,7 +2,8 @@ import sys
 import json
 import logging
 
-from redash.utils import JSONEncoder
+from redash.metrics import tracing
+from redash.utils import json_dumps
 from redash.query_runner import *
 
 logger = logging.getLogger(__name__)
@@ -115,31 +116,62 @@ class Mysql(BaseSQLQueryRunner):
 
         return schema.values()
 
+    def _get_catalog_tables_sizes(self):
+        # For InnoDB tables table_rows is an estimate, which is good enough for the schema browser.
+        query = """
+        SELECT table_schema, table_name, table_rows
+        FROM information_schema.tables
+        WHERE table_type = 'BASE TABLE' AND table_schema NOT IN ('performance_schema', 'mysql');
+        """
+
+        sizes = {}
+        for row in self._run_query_internal(query):
+            if row['table_rows'] is None:
+                continue
+
+            if row['table_schema'] != self.configuration['db']:
+                table_name = '{}.{}'.format(row['table_schema'], row['table_name'])
+            else:
+                table_name = row['table_name']
+
+            sizes[table_name] = int(row['table_rows'])
+
+        return sizes
+
+    def estimate_cost(self, query):
+        # Each row of the plan is a step of the (nested loop) join, with the rows it examines for each row of the
+        # previous steps.
+        rows = 1
+        for step in self._run_query_internal("EXPLAIN {}".format(query)):
+            if step.get('rows'):
+                rows *= int(step['rows'])
+
+        return {'rows': rows, 'cost': None}
+
     def run_query(self, query):
         import MySQLdb
 
         connection = None
         try:
-            connection = MySQLdb.connect(host=self.configuration.get('host', ''),
-                                         user=self.configuration.get('user', ''),
-                                         passwd=self.configuration.get('passwd', ''),
-                                         db=self.configuration['db'],
-                                         port=self.configuration.get('port', 3306),
-                                         charset='utf8', use_unicode=True,
-                                         ssl=self._get_ssl_parameters())
+            with tracing.span('connect'):
+                connection = MySQLdb.connect(host=self.configuration.get('host', ''),
+                                             user=self.configuration.get('user', ''),
+                                             passwd=self.configuration.get('passwd', ''),
+                                             db=self.configuration['db'],
+                                             port=self.configuration.get('port', 3306),
+                                             charset='utf8', use_unicode=True,
+                                             ssl=self._get_ssl_parameters())
             cursor = connection.cursor()
             logger.debug("MySQL running query: %s", query)
-            cursor.execute(query)
-
-            data = cursor.fetchall()
+            with tracing.span('execute'):
+                cursor.execute(query)
 
             # TODO - very similar to pg.py
             if cursor.description is not None:
                 columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
-                rows = [dict(zip((c['name'] for c in columns), row)) for row in data]
-
-                data = {'columns': columns, 'rows': rows}
-                json_data = json.dumps(data, cls=JSONEncoder)
+                data = self.fetch_data(cursor, columns)
+                with tracing.span('serialize'):
+                    json_data = json_dumps(data)
                 error = None
             else:
                 json_data = None
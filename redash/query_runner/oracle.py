@@ -2,8 +2,9 @@ import json
 import logging
 import sys
 
+from redash.metrics import tracing
 from redash.query_runner import *
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 
 try:
     import cx_Oracle
@@ -118,6 +119,27 @@ class Oracle(BaseSQLQueryRunner):
 
         return schema.values()
 
+    def _get_catalog_tables_sizes(self):
+        # NUM_ROWS is filled by DBMS_STATS and is NULL for tables that were never analyzed.
+        query = """
+        SELECT TABLESPACE_NAME, TABLE_NAME, NUM_ROWS
+        FROM user_tables
+        """
+
+        sizes = {}
+        for row in self._run_query_internal(query):
+            if row['NUM_ROWS'] is None:
+                continue
+
+            if row['TABLESPACE_NAME'] != None:
+                table_name = '{}.{}'.format(row['TABLESPACE_NAME'], row['TABLE_NAME'])
+            else:
+                table_name = row['TABLE_NAME']
+
+            sizes[table_name] = int(row['NUM_ROWS'])
+
+        return sizes
+
     @classmethod
     def _convert_number(cls, value):
         try:
@@ -135,24 +157,32 @@ class Oracle(BaseSQLQueryRunner):
 
         if default_type == cx_Oracle.NUMBER:
             if scale <= 0:
-                return cursor.var(cx_Oracle.STRING, 255, outconverter=Oracle._convert_number, arraysize=cursor.arraysize)
+                # Fetched as strings so big numbers don't lose precision; column_converter turns them into ints.
+                return cursor.var(cx_Oracle.STRING, 255, arraysize=cursor.arraysize)
+
+    def column_converter(self, column, value):
+        if column['type'] == TYPE_INTEGER:
+            return Oracle._convert_number
+
+        return super(Oracle, self).column_converter(column, value)
 
     def run_query(self, query):
-        connection = cx_Oracle.connect(self.connection_string)
+        with tracing.span('connect'):
+            connection = cx_Oracle.connect(self.connection_string)
         connection.outputtypehandler = Oracle.output_handler
 
         cursor = connection.cursor()
 
         try:
-            cursor.execute(query)
+            with tracing.span('execute'):
+                cursor.execute(query)
 
             if cursor.description is not None:
                 columns = self.fetch_columns([(i[0], Oracle.get_col_type(i[1], i[5])) for i in cursor.description])
-                rows = [dict(zip((c['name'] for c in columns), row)) for row in cursor]
-
-                data = {'columns': columns, 'rows': rows}
+                data = self.fetch_data(cursor, columns)
                 error = None
-                json_data = json.dumps(data, cls=JSONEncoder)
+                with tracing.span('serialize'):
+                    json_data = json_dumps(data)
             else:
                 error = 'Query completed but it returned no data.'
                 json_data = None
@@ -4,8 +4,9 @@ import psycopg2
 import select
 import sys
 
+from redash.metrics import tracing
 from redash.query_runner import *
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -113,23 +114,58 @@ class PostgreSQL(BaseSQLQueryRunner):
 
         return schema.values()
 
+    def _get_catalog_tables_sizes(self):
+        # reltuples is the planner's estimate, maintained by VACUUM/ANALYZE. Tables that were never analyzed (and
+        # empty ones, which are cheap to count) are left out so they get counted.
+        query = """
+        SELECT n.nspname AS table_schema, c.relname AS table_name, c.reltuples AS table_rows, c.relpages AS table_pages
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'm') AND n.nspname NOT IN ('pg_catalog', 'information_schema');
+        """
+
+        sizes = {}
+        for row in self._run_query_internal(query):
+            if row['table_rows'] < 0 or (row['table_rows'] == 0 and row['table_pages'] == 0):
+                continue
+
+            if row['table_schema'] != 'public':
+                table_name = '{}.{}'.format(row['table_schema'], row['table_name'])
+            else:
+                table_name = row['table_name']
+
+            sizes[table_name] = int(row['table_rows'])
+
+        return sizes
+
+    def estimate_cost(self, query):
+        plan = self._run_query_internal("EXPLAIN (FORMAT JSON) {}".format(query))[0]['QUERY PLAN']
+        if isinstance(plan, basestring):
+            plan = json.loads(plan)
+
+        return {
+            'rows': plan[0]['Plan']['Plan Rows'],
+            'cost': plan[0]['Plan']['Total Cost']
+        }
+
     def run_query(self, query):
-        connection = psycopg2.connect(self.connection_string, async=True)
-        _wait(connection)
+        with tracing.span('connect'):
+            connection = psycopg2.connect(self.connection_string, async=True)
+            _wait(connection)
 
         cursor = connection.cursor()
 
         try:
-            cursor.execute(query)
-            _wait(connection)
+            with tracing.span('execute'):
+                cursor.execute(query)
+                _wait(connection)
 
             if cursor.description is not None:
                 columns = self.fetch_columns([(i[0], types_map.get(i[1], None)) for i in cursor.description])
-                rows = [dict(zip((c['name'] for c in columns), row)) for row in cursor]
-
-                data = {'columns': columns, 'rows': rows}
+                data = self.fetch_data(cursor, columns)
                 error = None
-                json_data = json.dumps(data, cls=JSONEncoder)
+                with tracing.span('serialize'):
+                    json_data = json_dumps(data)
             else:
                 error = 'Query completed but it returned no data.'
                 json_data = None
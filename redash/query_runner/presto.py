@@ -1,6 +1,7 @@
 import json
+import re
 
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 from redash.query_runner import *
 
 import logging
@@ -15,6 +16,8 @@ try:
 except ImportError:
     enabled = False
 
+PRESTO_ESTIMATES_REGEX = re.compile(r'Estimates: \{rows: ([^ ]+) \([^)]*\), cpu: ([^,]+),')
+
 PRESTO_TYPES_MAPPING = {
     "integer": TYPE_INTEGER,
     "long": TYPE_INTEGER,
@@ -68,6 +71,18 @@ class Presto(BaseQueryRunner):
     def __init__(self, configuration):
         super(Presto, self).__init__(configuration)
 
+    def estimate_cost(self, query):
+        # The text plan has the planner's estimates for each step, starting with the output step, e.g.:
+        # Estimates: {rows: 1000 (8.79kB), cpu: 8.79k, memory: 0B, network: 0B}
+        # Older versions don't have estimates in the plan.
+        plan = u"\n".join(row.values()[0] for row in self._run_query_internal("EXPLAIN {}".format(query)))
+
+        match = PRESTO_ESTIMATES_REGEX.search(plan)
+        if match is None:
+            return None
+
+        return {'rows': parse_estimate(match.group(1)), 'cost': parse_estimate(match.group(2))}
+
     def run_query(self, query):
         connection = presto.connect(
                 host=self.configuration.get('host', ''),
@@ -83,10 +98,11 @@ class Presto(BaseQueryRunner):
             cursor.execute(query)
             column_tuples = [(i[0], PRESTO_TYPES_MAPPING.get(i[1], None)) for i in cursor.description]
             columns = self.fetch_columns(column_tuples)
-            rows = [dict(zip(([c['name'] for c in columns]), r)) for i, r in enumerate(cursor.fetchall())]
-            data = {'columns': columns, 'rows': rows}
-            json_data = json.dumps(data, cls=JSONEncoder)
+            data = self.fetch_data(cursor, columns)
+            json_data = json_dumps(data)
             error = None
+        except ResultTooLargeError:
+            raise
         except Exception, ex:
             json_data = None
             error = ex.message
@@ -177,7 +177,7 @@ class Python(BaseQueryRunner):
         if query.latest_query_data.data is None:
             raise Exception("Query does not have results yet.")
 
-        return json.loads(query.latest_query_data.data)
+        return query.latest_query_data.get_data()
 
     def run_query(self, query):
         try:
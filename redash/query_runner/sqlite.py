@@ -3,10 +3,11 @@ import logging
 import sqlite3
 import sys
 
+from redash.metrics import tracing
 from redash.query_runner import BaseQueryRunner
 from redash.query_runner import register
 
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -59,20 +60,21 @@ class Sqlite(BaseQueryRunner):
         return schema.values()
 
     def run_query(self, query):
-        connection = sqlite3.connect(self._dbpath)
+        with tracing.span('connect'):
+            connection = sqlite3.connect(self._dbpath)
 
         cursor = connection.cursor()
 
         try:
-            cursor.execute(query)
+            with tracing.span('execute'):
+                cursor.execute(query)
 
             if cursor.description is not None:
                 columns = self.fetch_columns([(i[0], None) for i in cursor.description])
-                rows = [dict(zip((c['name'] for c in columns), row)) for row in cursor]
-
-                data = {'columns': columns, 'rows': rows}
+                data = self.fetch_data(cursor, columns)
                 error = None
-                json_data = json.dumps(data, cls=JSONEncoder)
+                with tracing.span('serialize'):
+                    json_data = json_dumps(data)
             else:
                 error = 'Query completed but it returned no data.'
                 json_data = None
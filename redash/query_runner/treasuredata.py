@@ -1,6 +1,6 @@
 import json
 
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 from redash.query_runner import *
 
 import logging
@@ -100,10 +100,11 @@ class TreasureData(BaseQueryRunner):
                 'friendly_name': col[0],
                 'type': TD_TYPES_MAPPING.get(col[1], None)} for col in columns_data]
 
-            rows = [dict(zip(([c[0] for c in columns_data]), r)) for i, r in enumerate(cursor.fetchall())]
-            data = {'columns': columns, 'rows': rows}
-            json_data = json.dumps(data, cls=JSONEncoder)
+            data = self.fetch_data(cursor, columns)
+            json_data = json_dumps(data)
             error = None
+        except ResultTooLargeError:
+            raise
         except Exception, ex:
             json_data = None
             error = ex.message
@@ -1,12 +1,15 @@
 import sys
 import json
 import logging
+import re
 
-from redash.utils import JSONEncoder
+from redash.utils import json_dumps
 from redash.query_runner import *
 
 logger = logging.getLogger(__name__)
 
+VERTICA_ESTIMATES_REGEX = re.compile(r'\[Cost: ([^,]+), Rows: ([^ \]]+)')
+
 types_map = {
     5: TYPE_BOOLEAN,
     6: TYPE_INTEGER,
@@ -91,6 +94,16 @@ class Vertica(BaseQueryRunner):
 
         return schema.values()
 
+    def estimate_cost(self, query):
+        # The first step of the text plan is the output, e.g.: +-SELECT  LIMIT 10 [Cost: 1K, Rows: 10K (NO STATISTICS)]
+        plan = u"\n".join(row.values()[0] for row in self._run_query_internal("EXPLAIN {}".format(query)))
+
+        match = VERTICA_ESTIMATES_REGEX.search(plan)
+        if match is None:
+            return None
+
+        return {'rows': parse_estimate(match.group(2)), 'cost': parse_estimate(match.group(1))}
+
     def run_query(self, query):
         import vertica_python
 
@@ -116,14 +129,12 @@ class Vertica(BaseQueryRunner):
             # TODO - very similar to pg.py
             if cursor.description is not None:
                 columns_data = [(i[0], i[1]) for i in cursor.description]
-
-                rows = [dict(zip((c[0] for c in columns_data), row)) for row in cursor.fetchall()]
                 columns = [{'name': col[0],
                             'friendly_name': col[0],
                             'type': types_map.get(col[1], None)} for col in columns_data]
 
-                data = {'columns': columns, 'rows': rows}
-                json_data = json.dumps(data, cls=JSONEncoder)
+                data = self.fetch_data(cursor, columns)
+                json_data = json_dumps(data)
                 error = None
             else:
                 json_data = None
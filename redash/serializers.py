@@ -0,0 +1,103 @@
+"""
+Serialization of lists of models for the list, search and recent endpoints.
+
+Model.to_dict works on a single instance and lazily loads the users it references, which costs a query per row. The
+functions here produce the same dicts from rows fetched with .dicts() (only the needed columns, no model instances),
+and load all the referenced users with a single query.
+"""
+from redash.models import Query, QueryResult, User, Alert
+
+
+QUERY_COLUMNS = (Query.id, Query.latest_query_data, Query.name, Query.description, Query.query, Query.query_hash,
+                 Query.schedule, Query.api_key, Query.is_archived, Query.updated_at, Query.created_at,
+                 Query.data_source, Query.user, Query.last_modified_by)
+
+
+def load_users(user_ids):
+    """Return {user_id: user_dict} for the given ids."""
+    user_ids = set(user_id for user_id in user_ids if user_id is not None)
+
+    if not user_ids:
+        return {}
+
+    return dict((user.id, user.to_dict()) for user in User.select().where(User.id << list(user_ids)))
+
+
+def serialize_queries(queries, with_stats=False, with_user=True, with_last_modified_by=True):
+    """Same as [q.to_dict(...) for q in queries], for a select of queries.
+
+    With with_stats, the select should be joined with QueryResult (like Query.all_queries is).
+    """
+    columns = list(QUERY_COLUMNS)
+    if with_stats:
+        columns.extend((QueryResult.retrieved_at, QueryResult.runtime))
+
+    rows = list(queries.select(*columns).dicts())
+
+    user_ids = []
+    if with_user:
+        user_ids.extend(row['user'] for row in rows)
+    if with_last_modified_by:
+        user_ids.extend(row['last_modified_by'] for row in rows)
+    users = load_users(user_ids)
+
+    results = []
+    for row in rows:
+        d = {
+            'id': row['id'],
+            'latest_query_data_id': row['latest_query_data'],
+            'name': row['name'],
+            'description': row['description'],
+            'query': row['query'],
+            'query_hash': row['query_hash'],
+            'schedule': row['schedule'],
+            'api_key': row['api_key'],
+            'is_archived': row['is_archived'],
+            'updated_at': row['updated_at'],
+            'created_at': row['created_at'],
+            'data_source_id': row['data_source']
+        }
+
+        if with_user:
+            d['user'] = users[row['user']]
+        else:
+            d['user_id'] = row['user']
+
+        if with_last_modified_by:
+            d['last_modified_by'] = users.get(row['last_modified_by'])
+        else:
+            d['last_modified_by_id'] = row['last_modified_by']
+
+        if with_stats:
+            d['retrieved_at'] = row['retrieved_at']
+            d['runtime'] = row['runtime']
+
+        results.append(d)
+
+    return results
+
+
+def serialize_alerts(alerts):
+    """Same as [a.to_dict() for a in alerts], for a select of alerts."""
+    rows = list(alerts.select(Alert.id, Alert.name, Alert.options, Alert.state, Alert.last_triggered_at,
+                              Alert.updated_at, Alert.created_at, Alert.rearm, Alert.query, Alert.user).dicts())
+
+    query_ids = list(set(row['query'] for row in rows))
+    queries = {}
+    if query_ids:
+        queries = dict((q['id'], q) for q in serialize_queries(Query.select().where(Query.id << query_ids)))
+
+    users = load_users(row['user'] for row in rows)
+
+    return [{
+        'id': row['id'],
+        'name': row['name'],
+        'options': row['options'],
+        'state': row['state'],
+        'last_triggered_at': row['last_triggered_at'],
+        'updated_at': row['updated_at'],
+        'created_at': row['created_at'],
+        'rearm': row['rearm'],
+        'query': queries[row['query']],
+        'user': users[row['user']]
+    } for row in rows]
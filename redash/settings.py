@@ -169,6 +169,73 @@ BIGQUERY_HTTP_TIMEOUT = int(os.environ.get("REDASH_BIGQUERY_HTTP_TIMEOUT", "600"
 
 # Enhance schema fetching
 SCHEMA_RUN_TABLE_SIZE_CALCULATIONS = parse_boolean(os.environ.get("REDASH_SCHEMA_RUN_TABLE_SIZE_CALCULATIONS", "false"))
+# How many tables without catalog statistics to count (with count(*)) concurrently:
+SCHEMA_TABLE_SIZE_CALCULATIONS_CONCURRENCY = int(os.environ.get("REDASH_SCHEMA_TABLE_SIZE_CALCULATIONS_CONCURRENCY", "4"))
+SCHEMA_TABLE_STATS_TTL = int(os.environ.get("REDASH_SCHEMA_TABLE_STATS_TTL", 3600 * 6))
+
+# Cache of serialized dashboards (with their widgets), per permission profile:
+DASHBOARD_CACHE_ENABLED = parse_boolean(os.environ.get("REDASH_DASHBOARD_CACHE_ENABLED", "true"))
+DASHBOARD_CACHE_TTL = int(os.environ.get("REDASH_DASHBOARD_CACHE_TTL", 3600))
+
+# How long (in seconds) each process may keep a resolved organization (saving an organization invalidates it anyway):
+ORG_CACHE_TTL = int(os.environ.get("REDASH_ORG_CACHE_TTL", 300))
+
+# How long (in seconds) each process may keep the users (and query API keys) it resolved for authentication:
+AUTH_CACHE_TTL = int(os.environ.get("REDASH_AUTH_CACHE_TTL", 60))
+
+# How long (in seconds) to keep the index of data source groups used for access checks (changes invalidate it anyway):
+PERMISSIONS_CACHE_TTL = int(os.environ.get("REDASH_PERMISSIONS_CACHE_TTL", 3600))
+
+# Default maximum number of rows interactive executions fetch, for data sources without their own limit (0 for no limit):
+QUERY_RESULTS_MAX_ROWS = int(os.environ.get("REDASH_QUERY_RESULTS_MAX_ROWS", 0))
+# Default maximum size (in bytes) of a query result, for data sources without their own limit (0 for no limit):
+QUERY_RESULTS_MAX_SIZE = int(os.environ.get("REDASH_QUERY_RESULTS_MAX_SIZE", 0))
+# Store query results with their rows as arrays (instead of objects), which is smaller and faster to encode. The API
+# still serves the default format unless asked for the compact one:
+QUERY_RESULTS_COMPACT_STORAGE = parse_boolean(os.environ.get("REDASH_QUERY_RESULTS_COMPACT_STORAGE", "false"))
+
+# JSON library used to serialize query results and API responses: simplejson (with its C speedups), json, or auto to use
+# simplejson when it's installed with its speedups:
+JSON_BACKEND = os.environ.get("REDASH_JSON_BACKEND", "auto")
+
+# Requests profiled by super admins (see redash.metrics.profiler): how long (in seconds) to keep their reports, and how
+# many functions to include in each:
+PROFILER_REPORT_TTL = int(os.environ.get("REDASH_PROFILER_REPORT_TTL", 600))
+PROFILER_STATS_LIMIT = int(os.environ.get("REDASH_PROFILER_STATS_LIMIT", 100))
+
+# Tracing of query executions (see redash.metrics.tracing): where to export the spans ("log", "file", or the import
+# path of an exporter class; empty to turn tracing off), and the file the "file" exporter appends them to.
+TRACING_EXPORTER = os.environ.get("REDASH_TRACING_EXPORTER", "")
+TRACING_FILE = os.environ.get("REDASH_TRACING_FILE", "/tmp/redash_traces.jsonl")
+
+# Metrics (see redash.metrics.registry): whether to keep them in Redis (for /metrics), how often (in seconds) each
+# process sends its updates there, and whether to send them to statsd too.
+METRICS_REGISTRY = parse_boolean(os.environ.get("REDASH_METRICS_REGISTRY", "true"))
+METRICS_FLUSH_INTERVAL = int(os.environ.get("REDASH_METRICS_FLUSH_INTERVAL", "10"))
+METRICS_STATSD = parse_boolean(os.environ.get("REDASH_METRICS_STATSD", "true"))
+
+# How many of the most recent queue wait and run times of each queue and data source to keep, for the percentiles in
+# the status (see redash.monitor).
+STATUS_SAMPLES_SIZE = int(os.environ.get("REDASH_STATUS_SAMPLES_SIZE", 1000))
+
+# Log of query executions (see models.QueryExecution): whether to keep it, how many executions to buffer at most, and
+# how often (in seconds) and in batches of what size the buffered executions are written to the database.
+QUERY_EXECUTIONS_LOG_ENABLED = parse_boolean(os.environ.get("REDASH_QUERY_EXECUTIONS_LOG_ENABLED", "true"))
+QUERY_EXECUTIONS_BUFFER_MAX_SIZE = int(os.environ.get("REDASH_QUERY_EXECUTIONS_BUFFER_MAX_SIZE", 100000))
+QUERY_EXECUTIONS_FLUSH_INTERVAL = int(os.environ.get("REDASH_QUERY_EXECUTIONS_FLUSH_INTERVAL", 30))
+QUERY_EXECUTIONS_FLUSH_BATCH_SIZE = int(os.environ.get("REDASH_QUERY_EXECUTIONS_FLUSH_BATCH_SIZE", 1000))
+
+# Throttling of scheduled refreshes (unless the data source sets its own limits): the scheduled queue size, and the
+# number of a data source's queued and running jobs, beyond which refreshes are deferred to the next run of the
+# scheduler (0 for no limit). Queries that take longer to run than their schedule's interval can also be refreshed only
+# once their last runtime has passed since their last result.
+SCHEDULED_QUEUE_MAX_SIZE = int(os.environ.get("REDASH_SCHEDULED_QUEUE_MAX_SIZE", 0))
+SCHEDULED_MAX_IN_FLIGHT_JOBS = int(os.environ.get("REDASH_SCHEDULED_MAX_IN_FLIGHT_JOBS", 0))
+SCHEDULED_SKIP_SLOW_QUERIES = parse_boolean(os.environ.get("REDASH_SCHEDULED_SKIP_SLOW_QUERIES", "false"))
+
+# Window (in seconds) over which the scheduled runs of queries with the same schedule are spread, each query getting a
+# stable offset within it (0 to run them on schedule). Data sources can set their own.
+SCHEDULE_JITTER = int(os.environ.get("REDASH_SCHEDULE_JITTER", 0))
 
 ### Common Client config
 COMMON_CLIENT_CONFIG = {
@@ -2,6 +2,7 @@ import datetime
 import time
 import logging
 import signal
+import socket
 from flask_mail import Message
 import redis
 import hipchat
@@ -11,14 +12,38 @@ from requests.auth import HTTPBasicAuth
 from celery import Task
 from celery.result import AsyncResult
 from celery.utils.log import get_task_logger
-from redash import redis_connection, models, statsd_client, settings, utils, mail
+from redash import redis_connection, models, settings, utils, mail
 from redash.utils import gen_query_hash
 from redash.worker import celery
-from redash.query_runner import InterruptException
+from redash.metrics import tracing
+from redash.metrics import registry
+from redash.metrics.registry import Gauge, Histogram
+from redash.monitor import record_wait_time, record_run_time
+from redash.query_runner import InterruptException, ResultTooLargeError, result_too_large_message
 from version_check import run_version_check
 
 logger = get_task_logger(__name__)
 
+query_runtime_histogram = Histogram('redash_query_runtime_milliseconds', "Runtime of queries, by data source.",
+                                    buckets=(100, 500, 1000, 5000, 10000, 30000, 60000, 300000, 600000, 1800000),
+                                    labels=('type', 'data_source'), statsd='query_runner.{type}.{data_source}.run_time')
+result_size_histogram = Histogram('redash_query_result_size_bytes', "Size of query results, by data source.",
+                                  buckets=(1024, 10240, 102400, 1048576, 10485760, 104857600),
+                                  labels=('type', 'data_source'), statsd='query_runner.{type}.{data_source}.result_size')
+outdated_queries_gauge = Gauge('redash_outdated_queries', "Number of outdated queries found by the last refresh.",
+                               statsd='manager.outdated_queries')
+enqueued_queries_gauge = Gauge('redash_enqueued_queries', "Number of outdated queries the last refresh enqueued.",
+                               statsd='manager.enqueued_queries')
+deferred_queries_gauge = Gauge('redash_deferred_queries',
+                               "Number of outdated queries the last refresh deferred, as their data source was saturated.",
+                               statsd='manager.deferred_queries')
+skipped_queries_gauge = Gauge('redash_skipped_queries',
+                              "Number of outdated queries the last refresh skipped, as they take longer to run than "
+                              "their schedule's interval.", statsd='manager.skipped_queries')
+seconds_since_refresh_gauge = Gauge('redash_seconds_since_refresh',
+                                    "Time between the last two refreshes of the outdated queries.",
+                                    statsd='manager.seconds_since_refresh')
+
 
 class BaseTask(Task):
     abstract = True
@@ -54,8 +79,11 @@ class QueryTask(object):
         return self._async_result.id
 
     @classmethod
-    def add_task(cls, query, data_source, scheduled=False, metadata={}):
+    def add_task(cls, query, data_source, scheduled=False, metadata={}, limit_rows=False):
+        started_at = time.time()
         query_hash = gen_query_hash(query)
+        metadata = dict(metadata)
+        metadata.setdefault('Trace ID', tracing.new_trace_id())
         logging.info("[Manager][%s] Inserting job", query_hash)
         logging.info("[Manager] Metadata: [%s]", metadata)
         try_count = 0
@@ -66,15 +94,15 @@ class QueryTask(object):
 
             pipe = redis_connection.pipeline()
             try:
-                pipe.watch(cls._job_lock_id(query_hash, data_source.id))
-                job_id = pipe.get(cls._job_lock_id(query_hash, data_source.id))
+                pipe.watch(cls._job_lock_id(query_hash, data_source.id, limit_rows))
+                job_id = pipe.get(cls._job_lock_id(query_hash, data_source.id, limit_rows))
                 if job_id:
                     logging.info("[Manager][%s] Found existing job: %s", query_hash, job_id)
 
                     job = cls(job_id=job_id)
                     if job.ready():
                         logging.info("[%s] job found is ready (%s), removing lock", query_hash, job.celery_status)
-                        redis_connection.delete(QueryTask._job_lock_id(query_hash, data_source.id))
+                        redis_connection.delete(QueryTask._job_lock_id(query_hash, data_source.id, limit_rows))
                         job = None
 
                 if not job:
@@ -85,12 +113,24 @@ class QueryTask(object):
                     else:
                         queue_name = data_source.queue_name
 
-                    result = execute_query.apply_async(args=(query, data_source.id, metadata), queue=queue_name)
+                    metadata['Enqueued At'] = time.time()
+                    result = execute_query.apply_async(args=(query, data_source.id, metadata),
+                                                       kwargs={'limit_rows': limit_rows},
+                                                       queue=queue_name)
                     job = cls(async_result=result)
 
                     logging.info("[Manager][%s] Created new job: %s", query_hash, job.id)
-                    pipe.set(cls._job_lock_id(query_hash, data_source.id), job.id, settings.JOB_EXPIRY_TIME)
+                    pipe.set(cls._job_lock_id(query_hash, data_source.id, limit_rows), job.id,
+                             settings.JOB_EXPIRY_TIME)
+                    pipe.zadd(cls._in_flight_jobs_key(data_source.id), **{job.id: time.time()})
                     pipe.execute()
+                    tracing.record_span(metadata['Trace ID'], 'enqueue', started_at, time.time(),
+                                        query_hash=query_hash, query_id=_query_id(metadata),
+                                        data_source_id=data_source.id, task_id=job.id, queue=queue_name)
+                else:
+                    tracing.record_span(metadata['Trace ID'], 'join', started_at, time.time(),
+                                        query_hash=query_hash, query_id=_query_id(metadata),
+                                        data_source_id=data_source.id, task_id=job.id)
                 break
 
             except redis.WatchError:
@@ -141,9 +181,88 @@ class QueryTask(object):
     def cancel(self):
         return self._async_result.revoke(terminate=True, signal='SIGINT')
 
+    @classmethod
+    def in_flight_jobs(cls, data_source_id):
+        """The number of the data source's queued and running jobs."""
+        key = cls._in_flight_jobs_key(data_source_id)
+        pipe = redis_connection.pipeline()
+        # Jobs that never got to run (like ones revoked while queued) don't remove themselves, so they expire like their
+        # locks do:
+        pipe.zremrangebyscore(key, '-inf', time.time() - settings.JOB_EXPIRY_TIME)
+        pipe.zcard(key)
+        return pipe.execute()[1]
+
+    @classmethod
+    def release(cls, query_hash, data_source_id, limit_rows, job_id):
+        """Remove the job's lock, and its entry among the data source's in-flight jobs."""
+        pipe = redis_connection.pipeline()
+        pipe.delete(cls._job_lock_id(query_hash, data_source_id, limit_rows))
+        pipe.zrem(cls._in_flight_jobs_key(data_source_id), job_id)
+        pipe.execute()
+
+    @staticmethod
+    def _in_flight_jobs_key(data_source_id):
+        # A sorted set of the data source's queued and running jobs' ids, scored by the time they were enqueued.
+        return "in_flight_jobs:%s" % data_source_id
+
     @staticmethod
-    def _job_lock_id(query_hash, data_source_id):
-        return "query_hash_job:%s:%s" % (data_source_id, query_hash)
+    def _job_lock_id(query_hash, data_source_id, limit_rows=False):
+        # Executions capped at the row limit get their own lock, so asking for full results doesn't join them.
+        lock_id = "query_hash_job:%s:%s" % (data_source_id, query_hash)
+        if limit_rows:
+            lock_id += ":limited"
+        return lock_id
+
+
+def runs_longer_than_schedule(query, now):
+    """Whether the query's last run took longer than its (interval) schedule, and hasn't been over for that long."""
+    if not query.schedule.isdigit():
+        return False
+
+    runtime = query.latest_query_data.runtime or 0
+    if runtime <= int(query.schedule):
+        return False
+
+    return now - query.latest_query_data.retrieved_at < datetime.timedelta(seconds=runtime)
+
+
+class RefreshThrottle(object):
+    """
+    Tells whether a data source is saturated: its scheduled queue, or the number of its queued and running jobs, has
+    reached the data source's limit. Queue sizes and job counts are loaded once per refresh, and updated as refreshes
+    get enqueued.
+    """
+    def __init__(self):
+        self.queue_sizes = {}
+        self.in_flight_jobs = {}
+
+    def is_saturated(self, data_source):
+        max_queue_size = data_source.max_scheduled_queue_size
+        if max_queue_size:
+            queue = data_source.scheduled_queue_name
+            if queue not in self.queue_sizes:
+                self.queue_sizes[queue] = redis_connection.llen(queue)
+
+            if self.queue_sizes[queue] >= max_queue_size:
+                return True
+
+        max_in_flight_jobs = data_source.max_in_flight_jobs
+        if max_in_flight_jobs:
+            if data_source.id not in self.in_flight_jobs:
+                self.in_flight_jobs[data_source.id] = QueryTask.in_flight_jobs(data_source.id)
+
+            if self.in_flight_jobs[data_source.id] >= max_in_flight_jobs:
+                return True
+
+        return False
+
+    def enqueued(self, data_source):
+        queue = data_source.scheduled_queue_name
+        if queue in self.queue_sizes:
+            self.queue_sizes[queue] += 1
+
+        if data_source.id in self.in_flight_jobs:
+            self.in_flight_jobs[data_source.id] += 1
 
 
 @celery.task(base=BaseTask)
@@ -153,25 +272,51 @@ def refresh_queries():
 
     logger.info("Refreshing queries...")
 
-    outdated_queries_count = 0
-    for query in models.Query.outdated_queries():
+    enqueued_queries_count = 0
+    deferred_queries_count = 0
+    skipped_queries_count = 0
+    throttle = RefreshThrottle()
+    now = utils.utcnow()
+
+    outdated_queries = models.Query.outdated_queries()
+    outdated_queries_count = len(outdated_queries)
+
+    # Oldest results first, so those are the ones refreshed when data sources have room for only some of their queries:
+    for query in sorted(outdated_queries, key=lambda q: q.latest_query_data.retrieved_at):
+        if settings.SCHEDULED_SKIP_SLOW_QUERIES and runs_longer_than_schedule(query, now):
+            skipped_queries_count += 1
+            continue
+
+        if throttle.is_saturated(query.data_source):
+            deferred_queries_count += 1
+            continue
+
         QueryTask.add_task(query.query, query.data_source, scheduled=True,
                            metadata={'Query ID': query.id, 'Username': 'Scheduled'})
-        outdated_queries_count += 1
-
-    statsd_client.gauge('manager.outdated_queries', outdated_queries_count)
+        throttle.enqueued(query.data_source)
+        enqueued_queries_count += 1
 
-    logger.info("Done refreshing queries. Found %d outdated queries." % outdated_queries_count)
+    logger.info("Done refreshing queries. Found %d outdated queries (enqueued: %d, deferred: %d, skipped: %d)." % (
+        outdated_queries_count, enqueued_queries_count, deferred_queries_count, skipped_queries_count))
 
     status = redis_connection.hgetall('redash:status')
     now = time.time()
 
     redis_connection.hmset('redash:status', {
         'outdated_queries_count': outdated_queries_count,
+        'enqueued_queries_count': enqueued_queries_count,
+        'deferred_queries_count': deferred_queries_count,
+        'skipped_queries_count': skipped_queries_count,
         'last_refresh_at': now
     })
 
-    statsd_client.gauge('manager.seconds_since_refresh', now - float(status.get('last_refresh_at', now)))
+    outdated_queries_gauge.set(outdated_queries_count)
+    enqueued_queries_gauge.set(enqueued_queries_count)
+    deferred_queries_gauge.set(deferred_queries_count)
+    skipped_queries_gauge.set(skipped_queries_count)
+    seconds_since_refresh_gauge.set(now - float(status.get('last_refresh_at', now)))
+    # These are set once per run, so they're sent right away rather than with the worker's next update:
+    registry.flush()
 
 
 @celery.task(base=BaseTask)
@@ -205,6 +350,8 @@ def cleanup_tasks():
             # if locked task is ready already (failed, finished, revoked), we don't need the lock anymore
             logger.warning("%s is ready (%s), removing lock.", lock_keys[i], t.celery_status)
             redis_connection.delete(lock_keys[i])
+            # The lock is named after the job's data source (see QueryTask._job_lock_id):
+            redis_connection.zrem(QueryTask._in_flight_jobs_key(lock_keys[i].split(':')[1]), t.id)
 
         # if t.celery_status == 'STARTED' and t.id not in all_tasks:
         #     logger.warning("Couldn't find active job for: %s, removing lock.", lock_keys[i])
@@ -252,12 +399,53 @@ class QueryExecutionError(Exception):
     pass
 
 
+# The error the query runners report cancelled queries (by the user, or by revoking the task) with:
+CANCELLED_MESSAGE = "Query cancelled by user."
+
+
+def _query_id(metadata):
+    # Ad hoc queries (that aren't saved) have no id.
+    try:
+        return int(metadata.get('Query ID'))
+    except (TypeError, ValueError):
+        return None
+
+
+def record_rejected_execution(query, data_source, metadata):
+    """Log an execution that was rejected before being enqueued (see DataSource.check_cost)."""
+    models.QueryExecution.record({
+        'org_id': data_source.org_id,
+        'query_id': _query_id(metadata),
+        'query_hash': gen_query_hash(query),
+        'data_source_id': data_source.id,
+        'username': metadata.get('Username'),
+        'queue': None,
+        'task_id': None,
+        'wait_time': None,
+        'run_time': None,
+        'rows': None,
+        'bytes': None,
+        'outcome': models.QueryExecution.REJECTED,
+        'worker': None,
+        'started_at': time.time()
+    })
+
+
 # TODO: convert this into a class, to simplify and avoid code duplication for logging
 # class ExecuteQueryTask(BaseTask):
 #     def run(self, ...):
 #         # logic
 @celery.task(bind=True, base=BaseTask, track_started=True, throws=(QueryExecutionError,))
-def execute_query(self, query, data_source_id, metadata):
+def execute_query(self, query, data_source_id, metadata, limit_rows=False):
+    try:
+        return _execute_query(self, query, data_source_id, metadata, limit_rows)
+    finally:
+        # Whether the query succeeded or not, new executions of it shouldn't join this one anymore (nor should it
+        # count against the data source's in-flight jobs).
+        QueryTask.release(gen_query_hash(query), data_source_id, limit_rows, self.request.id)
+
+
+def _execute_query(self, query, data_source_id, metadata, limit_rows):
     signal.signal(signal.SIGINT, signal_handler)
     start_time = time.time()
 
@@ -271,51 +459,123 @@ def execute_query(self, query, data_source_id, metadata):
 
     query_hash = gen_query_hash(query)
     query_runner = data_source.query_runner
+    # Tasks executed eagerly (like with CELERY_ALWAYS_EAGER) have no routing key:
+    queue = self.request.delivery_info.get('routing_key') if self.request.delivery_info else None
+
+    trace_id = metadata.get('Trace ID')
+    # The trace is the current one of the task's thread (for the query runner's spans) until the task is done:
+    with tracing.trace(trace_id, 'execute_query', start_time=start_time, query_hash=query_hash,
+                       query_id=_query_id(metadata), data_source_id=data_source.id, data_source_type=data_source.type,
+                       task_id=self.request.id, queue=queue) as trace_attributes:
+        wait_time = None
+        if 'Enqueued At' in metadata:
+            wait_time = start_time - metadata['Enqueued At']
+            record_wait_time(queue, data_source.id, wait_time)
+            tracing.record_span(trace_id, 'queue_wait', metadata['Enqueued At'], start_time)
+
+        def record_execution(outcome, result_size=None, rows=None):
+            models.QueryExecution.record({
+                'org_id': data_source.org_id,
+                'query_id': _query_id(metadata),
+                'query_hash': query_hash,
+                'data_source_id': data_source.id,
+                'username': metadata.get('Username'),
+                'queue': queue,
+                'task_id': self.request.id,
+                'wait_time': wait_time,
+                'run_time': time.time() - run_started_at,
+                'rows': rows,
+                'bytes': result_size,
+                'outcome': outcome,
+                'worker': socket.gethostname(),
+                'started_at': start_time
+            })
+
+        if limit_rows:
+            query_runner.row_limit = data_source.row_limit
+        query_runner.result_size_limit = data_source.result_size_limit
+        if settings.QUERY_RESULTS_COMPACT_STORAGE:
+            query_runner.row_format = utils.COMPACT_FORMAT
+
+        logger.info("task=execute_query state=before query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s trace_id=%s",
+                    query_hash, data_source.type, data_source.id, self.request.id, queue,
+                    metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'), trace_id)
+
+        if query_runner.annotate_query():
+            metadata['Task ID'] = self.request.id
+            metadata['Query Hash'] = query_hash
+            metadata['Queue'] = queue
+
+            annotation = u", ".join([u"{}: {}".format(k, v) for k, v in metadata.iteritems() if k != 'Enqueued At'])
+
+            logging.debug(u"Annotation: %s", annotation)
+
+            annotated_query = u"/* {} */ {}".format(annotation, query)
+        else:
+            annotated_query = query
 
-    logger.info("task=execute_query state=before query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s",
-                query_hash, data_source.type, data_source.id, self.request.id, self.request.delivery_info['routing_key'],
-                metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'))
-
-    if query_runner.annotate_query():
-        metadata['Task ID'] = self.request.id
-        metadata['Query Hash'] = query_hash
-        metadata['Queue'] = self.request.delivery_info['routing_key']
-
-        annotation = u", ".join([u"{}: {}".format(k, v) for k, v in metadata.iteritems()])
-
-        logging.debug(u"Annotation: %s", annotation)
-
-        annotated_query = u"/* {} */ {}".format(annotation, query)
-    else:
-        annotated_query = query
-
-    with statsd_client.timer('query_runner.{}.{}.run_time'.format(data_source.type, data_source.name)):
-        data, error = query_runner.run_query(annotated_query)
-
-    logger.info("task=execute_query state=after query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s",
-                query_hash, data_source.type, data_source.id, self.request.id, self.request.delivery_info['routing_key'],
-                metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'))
-
-    run_time = time.time() - start_time
-    logger.info("Query finished... data length=%s, error=%s", data and len(data), error)
-
-    self.update_state(state='STARTED', meta={'start_time': start_time, 'error': error, 'custom_message': ''})
-
-    # Delete query_hash
-    redis_connection.delete(QueryTask._job_lock_id(query_hash, data_source.id))
-
-    if not error:
-        query_result, updated_query_ids = models.QueryResult.store_result(data_source.org_id, data_source.id, query_hash, query, data, run_time, utils.utcnow())
-        logger.info("task=execute_query state=after_store query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s",
-                    query_hash, data_source.type, data_source.id, self.request.id, self.request.delivery_info['routing_key'],
-                    metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'))
-        for query_id in updated_query_ids:
-            check_alerts_for_query.delay(query_id)
-        logger.info("task=execute_query state=after_alerts query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s",
-                    query_hash, data_source.type, data_source.id, self.request.id, self.request.delivery_info['routing_key'],
-                    metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'))
-    else:
-        raise QueryExecutionError(error)
+        too_large = False
+        run_started_at = time.time()
+        try:
+            with tracing.span('run_query') as span_attributes:
+                data, error = query_runner.run_query(annotated_query)
+                span_attributes['error'] = error
+        except ResultTooLargeError as e:
+            data, error = None, e.message
+            too_large = True
+        except Exception as e:
+            record_execution(models.QueryExecution.CANCELLED if isinstance(e, InterruptException)
+                             else models.QueryExecution.FAILED)
+            raise
+        finally:
+            query_run_time = time.time() - run_started_at
+            record_run_time(data_source.id, query_run_time)
+            query_runtime_histogram.observe(query_run_time * 1000, type=data_source.type, data_source=data_source.name)
+
+        result_size = len(data) if data else 0
+
+        # Runners that don't fetch through fetch_data can't stop early, but at least their result doesn't get stored:
+        if query_runner.result_size_limit and result_size > query_runner.result_size_limit:
+            data, error = None, result_too_large_message(query_runner.result_size_limit)
+            too_large = True
+
+        if not error:
+            record_execution(models.QueryExecution.SUCCESS, result_size, query_runner.row_count)
+        elif too_large:
+            record_execution(models.QueryExecution.TOO_LARGE)
+        elif error == CANCELLED_MESSAGE:
+            record_execution(models.QueryExecution.CANCELLED)
+        else:
+            record_execution(models.QueryExecution.FAILED)
+
+        logger.info("task=execute_query state=after query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s result_size=%d",
+                    query_hash, data_source.type, data_source.id, self.request.id, queue,
+                    metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'), result_size)
+        result_size_histogram.observe(result_size, type=data_source.type, data_source=data_source.name)
+
+        run_time = time.time() - start_time
+        logger.info("Query finished... data length=%s, error=%s", data and len(data), error)
+
+        self.update_state(state='STARTED', meta={'start_time': start_time, 'error': error, 'custom_message': ''})
+
+        if not error:
+            with tracing.span('store'):
+                query_result, updated_query_ids = models.QueryResult.store_result(
+                    data_source.org_id, data_source.id, query_hash, query, data, run_time, utils.utcnow(),
+                    truncated=query_runner.truncated)
+            logger.info("task=execute_query state=after_store query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s",
+                        query_hash, data_source.type, data_source.id, self.request.id, queue,
+                        metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'))
+            with tracing.span('alerts', queries=len(updated_query_ids)):
+                for query_id in updated_query_ids:
+                    check_alerts_for_query.delay(query_id)
+            logger.info("task=execute_query state=after_alerts query_hash=%s type=%s ds_id=%d task_id=%s queue=%s query_id=%s username=%s",
+                        query_hash, data_source.type, data_source.id, self.request.id, queue,
+                        metadata.get('Query ID', 'unknown'), metadata.get('Username', 'unknown'))
+            trace_attributes['result_size'] = result_size
+        else:
+            trace_attributes.update(result_size=result_size, error=error)
+            raise QueryExecutionError(error)
 
     return query_result.id
 
@@ -324,6 +584,16 @@ def execute_query(self, query, data_source_id, metadata):
 def record_event(event):
     models.Event.record(event)
 
+
+@celery.task(base=BaseTask)
+def flush_query_executions():
+    # A few batches at most in each run, so a backlog (like after the database was down) doesn't hold up the worker.
+    batch_size = settings.QUERY_EXECUTIONS_FLUSH_BATCH_SIZE
+    for _ in range(10):
+        if models.QueryExecution.flush(batch_size) < batch_size:
+            break
+
+
 @celery.task(base=BaseTask)
 def version_check():
     run_version_check()
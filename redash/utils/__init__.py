@@ -12,6 +12,13 @@ import pystache
 
 from funcy import distinct
 
+from redash import settings
+
+try:
+    import simplejson
+except ImportError:
+    simplejson = None
+
 COMMENTS_REGEX = re.compile("/\*.*?\*/")
 
 
@@ -49,24 +56,124 @@ def generate_token(length):
     rand = random.SystemRandom()
     return ''.join(rand.choice(chars) for x in range(length))
 
+def _isoformat(o):
+    return o.isoformat()
+
+
+# Conversions of the values JSON has no type for, looked up by the value's exact type (the isinstance checks below
+# handle subclasses):
+JSON_CONVERSIONS = {
+    decimal.Decimal: float,
+    datetime.datetime: _isoformat,
+    datetime.date: _isoformat,
+    datetime.time: _isoformat,
+    datetime.timedelta: str
+}
+
+
+def json_default(o):
+    """Convert a value JSON has no type for (like Decimal and datetime.date) to one it has."""
+    convert = JSON_CONVERSIONS.get(type(o))
+    if convert is not None:
+        return convert(o)
+
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()
+
+    if isinstance(o, datetime.timedelta):
+        return str(o)
+
+    raise TypeError(repr(o) + " is not JSON serializable")
+
+
 class JSONEncoder(json.JSONEncoder):
     """Custom JSON encoding class, to handle Decimal and datetime.date instances."""
 
     def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return float(o)
+        return json_default(o)
+
+
+def _simplejson_speedups_available():
+    return simplejson is not None and simplejson._import_c_make_encoder() is not None
+
+
+def _get_json_backend(name):
+    if name == 'auto':
+        name = 'simplejson' if _simplejson_speedups_available() else 'json'
+
+    if name == 'simplejson':
+        if simplejson is None:
+            raise Exception("REDASH_JSON_BACKEND is simplejson, but simplejson isn't installed.")
+        # The options make simplejson's output the same as the json module's: Decimals (and namedtuples) are left to
+        # json_default, and NaN/Infinity are allowed, like the json module does.
+        encoder = simplejson.JSONEncoder(default=json_default, use_decimal=False, namedtuple_as_object=False,
+                                         allow_nan=True)
+    elif name == 'json':
+        encoder = JSONEncoder()
+    else:
+        raise Exception("Unknown JSON backend: {}".format(name))
 
-        if isinstance(o, (datetime.date, datetime.time)):
-            return o.isoformat()
+    return name, encoder.encode
 
-        if isinstance(o, datetime.timedelta):
-            return str(o)
 
-        super(JSONEncoder, self).default(o)
+JSON_BACKEND, _json_encode = _get_json_backend(settings.JSON_BACKEND)
 
 
 def json_dumps(data):
-    return json.dumps(data, cls=JSONEncoder)
+    """Serialize data to JSON, with the fastest JSON backend available (see REDASH_JSON_BACKEND).
+
+    The output is the same as json.dumps(data, cls=JSONEncoder)'s.
+    """
+    return _json_encode(data)
+
+
+# Query results' data has its rows as dicts by default. In the compact format the rows are lists of values, in the
+# order of the columns, so the column names aren't repeated in every row. Compact data is marked with "format".
+COMPACT_FORMAT = 'compact'
+_COMPACT_MARKER = json.dumps({'format': COMPACT_FORMAT})[1:-1]
+
+
+def compact_data(data):
+    """Return query result data in the compact format."""
+    if data.get('format') == COMPACT_FORMAT:
+        return data
+
+    names = [c['name'] for c in data['columns']]
+    compact = dict(data, format=COMPACT_FORMAT)
+    compact['rows'] = [[row.get(name) for name in names] for row in data['rows']]
+    return compact
+
+
+def expand_data(data):
+    """Return query result data in the default format (rows as dicts)."""
+    if data.get('format') != COMPACT_FORMAT:
+        return data
+
+    names = [c['name'] for c in data['columns']]
+    expanded = dict(data)
+    del expanded['format']
+    expanded['rows'] = [dict(zip(names, row)) for row in data['rows']]
+    return expanded
+
+
+def convert_data(data, format=None):
+    """Return query result data in the given format (COMPACT_FORMAT, or None for the default one)."""
+    if format == COMPACT_FORMAT:
+        return compact_data(data)
+    return expand_data(data)
+
+
+def may_be_compact(json_data):
+    """Whether serialized query result data might be in the compact format (without decoding it).
+
+    The marker can only show up this way (with unescaped quotes) as a key of an object, so when it's missing the data is
+    in the default format for sure. When it's there it may also be a row's column, so the data has to be decoded to
+    tell.
+    """
+    return _COMPACT_MARKER in json_data
 
 
 def build_url(request, host, path):
@@ -0,0 +1,106 @@
+import bisect
+import threading
+
+MATCH_PREFIX = 'prefix'
+MATCH_SUBSTRING = 'substring'
+
+
+class SchemaIndex(object):
+    """Searchable index over a data source schema (a list of {'name': ..., 'columns': [...]} dicts).
+
+    Table and column names are kept lower cased in sorted lists, so a prefix lookup is a bisect away and a substring
+    lookup scans a flat list instead of walking the nested schema.
+    """
+
+    def __init__(self, schema):
+        self.tables = {}
+        table_keys = []
+        column_keys = []
+
+        for table in schema:
+            name = table['name']
+            self.tables[name] = table
+            table_keys.append((name.lower(), name))
+            for column in table.get('columns', []):
+                column_keys.append((unicode(column).lower(), name))
+
+        table_keys.sort()
+        column_keys.sort()
+
+        self._table_keys = table_keys
+        self._column_keys = column_keys
+        self._names = [name for _, name in table_keys]
+
+    def __len__(self):
+        return len(self.tables)
+
+    def search(self, term=None, match=MATCH_PREFIX, search_columns=True):
+        """Return the names of tables whose name (or one of its columns' names) matches term."""
+        if not term:
+            return list(self._names)
+
+        term = term.lower()
+
+        if match == MATCH_SUBSTRING:
+            finder = self._substring
+        else:
+            finder = self._prefix
+
+        names = set(finder(self._table_keys, term))
+        if search_columns:
+            names.update(finder(self._column_keys, term))
+
+        return sorted(names, key=lambda n: n.lower())
+
+    def page(self, names, page=1, page_size=50):
+        start = (page - 1) * page_size
+        return [self.summary(name) for name in names[start:start + page_size]]
+
+    def summary(self, name):
+        table = self.tables[name]
+        d = {
+            'name': name,
+            'columns_count': len(table.get('columns', []))
+        }
+
+        if 'size' in table:
+            d['size'] = table['size']
+
+        return d
+
+    def get(self, name):
+        return self.tables.get(name)
+
+    @staticmethod
+    def _prefix(keys, term):
+        position = bisect.bisect_left(keys, (term,))
+        while position < len(keys) and keys[position][0].startswith(term):
+            yield keys[position][1]
+            position += 1
+
+    @staticmethod
+    def _substring(keys, term):
+        return (name for key, name in keys if term in key)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_cached_index(key, version):
+    """Return the index built for key, as long as it was built from the given schema version."""
+    if version is None:
+        return None
+
+    with _indexes_lock:
+        cached = _indexes.get(key)
+
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    return None
+
+
+def cache_index(key, version, index):
+    with _indexes_lock:
+        _indexes[key] = (version, index)
@@ -2,7 +2,9 @@ from random import randint
 from celery import Celery
 from datetime import timedelta
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown, worker_shutdown
 from redash import settings, __version__
+from redash.metrics import registry
 
 
 celery = Celery('redash',
@@ -38,10 +40,24 @@ if settings.QUERY_RESULTS_CLEANUP_ENABLED:
         'schedule': timedelta(minutes=5)
     }
 
+if settings.QUERY_EXECUTIONS_LOG_ENABLED:
+    celery_schedule['flush_query_executions'] = {
+        'task': 'redash.tasks.flush_query_executions',
+        'schedule': timedelta(seconds=settings.QUERY_EXECUTIONS_FLUSH_INTERVAL)
+    }
+
 celery.conf.update(CELERY_RESULT_BACKEND=settings.CELERY_BACKEND,
                    CELERYBEAT_SCHEDULE=celery_schedule,
                    CELERY_TIMEZONE='UTC')
 
+
+# Prefork children exit without running atexit handlers, so the metrics they didn't flush yet would be lost:
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_metrics(**kwargs):
+    registry.flush()
+
+
 if settings.SENTRY_DSN:
     from raven import Client
     from raven.contrib.celery import register_signal, register_logger_signal
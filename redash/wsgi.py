@@ -7,6 +7,7 @@ from werkzeug.contrib.fixers import ProxyFix
 
 from redash import settings, utils, mail, __version__
 from redash.models import db
+from redash.metrics import profiler
 from redash.metrics.request import provision_app
 from redash.admin import init_admin
 from werkzeug.routing import BaseConverter, ValidationError
@@ -70,6 +71,7 @@ mail.init_app(app)
 
 from redash.authentication import setup_authentication
 setup_authentication(app)
+profiler.init_app(app)
 
 
 @api.representation('application/json')
@@ -77,7 +79,7 @@ def json_representation(data, code, headers=None):
     # Flask-Restful checks only for flask.Response but flask-login uses werkzeug.wrappers.Response
     if isinstance(data, Response):
         return data
-    resp = make_response(json.dumps(data, cls=utils.JSONEncoder), code)
+    resp = make_response(utils.json_dumps(data), code)
     resp.headers.extend(headers or {})
     return resp
 
@@ -2,6 +2,8 @@ import os
 os.environ['REDASH_REDIS_URL'] = "redis://localhost:6379/5"
 # Use different url for Celery to avoid DB being cleaned up:
 os.environ['REDASH_CELERY_BROKER'] = "redis://localhost:6379/6"
+# Metrics get to Redis when the tests flush them, not whenever the flusher thread wakes up:
+os.environ['REDASH_METRICS_FLUSH_INTERVAL'] = "3600"
 
 # Dummy values for oauth login
 os.environ['REDASH_GOOGLE_CLIENT_ID'] = "dummy"
@@ -21,6 +23,7 @@ settings.DATABASE_CONFIG = {
 }
 
 from redash import redis_connection
+from redash.metrics import registry
 import redash.models
 from tests.handlers import make_request
 
@@ -37,6 +40,8 @@ class BaseTestCase(TestCase):
     def tearDown(self):
         redash.models.db.close_db(None)
         redash.models.create_db(False, True)
+        # Metrics are aggregated in memory before they get to Redis (see redash.metrics.registry):
+        registry.flush()
         redis_connection.flushdb()
 
     def make_request(self, method, path, org=None, user=None, data=None, is_json=True):
@@ -0,0 +1,61 @@
+import json
+from tests import BaseTestCase
+
+
+class TestDashboardResults(BaseTestCase):
+    def setUp(self):
+        super(TestDashboardResults, self).setUp()
+        self.dashboard = self.factory.create_dashboard(groups=[self.factory.default_group.id])
+        data = {
+            'columns': [{'name': 'x'}, {'name': 'y'}, {'name': 'z'}, {'name': 'country::filter'}],
+            'rows': [{'x': 1, 'y': 2, 'z': 3, 'country::filter': 'IL'}]
+        }
+        self.query_result = self.factory.create_query_result(data=json.dumps(data))
+        self.query = self.factory.create_query(latest_query_data=self.query_result)
+
+    def add_widget(self, **kwargs):
+        visualization = self.factory.create_visualization(query=self.query, **kwargs)
+        self.factory.create_widget(dashboard=self.dashboard, visualization=visualization)
+        return visualization
+
+    def get_results(self):
+        response = self.make_request('get', '/api/dashboards/{}/results'.format(self.dashboard.slug))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def test_returns_each_result_once(self):
+        table = self.add_widget(type='TABLE')
+        chart = self.add_widget(type='CHART', options=json.dumps({'columnMapping': {'x': 'x', 'y': 'y'}}))
+
+        results = self.get_results()
+
+        self.assertEqual(results['visualizations'], {str(table.id): self.query_result.id,
+                                                     str(chart.id): self.query_result.id})
+        self.assertEqual(results['query_results'].keys(), [str(self.query_result.id)])
+
+    def test_returns_only_used_columns(self):
+        self.add_widget(type='CHART', options=json.dumps({'columnMapping': {'x': 'x', 'y': 'y', 'z': 'unused'}}))
+
+        data = self.get_results()['query_results'][str(self.query_result.id)]['data']
+
+        self.assertEqual([c['name'] for c in data['columns']], ['x', 'y', 'country::filter'])
+        self.assertEqual(data['rows'], [{'x': 1, 'y': 2, 'country::filter': 'IL'}])
+
+    def test_returns_all_columns_when_some_visualization_needs_them(self):
+        self.add_widget(type='COUNTER', options=json.dumps({'counterColName': 'x'}))
+        self.add_widget(type='TABLE')
+
+        data = self.get_results()['query_results'][str(self.query_result.id)]['data']
+
+        self.assertEqual(data, json.loads(self.query_result.data))
+
+    def test_skips_results_of_data_sources_without_access(self):
+        data_source = self.factory.create_data_source(group=self.factory.create_group())
+        query = self.factory.create_query(data_source=data_source,
+                                          latest_query_data=self.factory.create_query_result(data_source=data_source))
+        visualization = self.factory.create_visualization(query=query)
+        self.factory.create_widget(dashboard=self.dashboard, visualization=visualization)
+
+        results = self.get_results()
+
+        self.assertEqual(results, {'visualizations': {}, 'query_results': {}})
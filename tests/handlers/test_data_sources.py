@@ -1,4 +1,5 @@
 import json
+from mock import patch
 from tests import BaseTestCase
 from redash.models import DataSource
 
@@ -63,6 +64,27 @@ class TestDataSourceAPIPost(BaseTestCase):
         self.assertEqual(data_source.name, new_name)
         self.assertEqual(data_source.options.to_dict(), new_options)
 
+    def test_returns_400_when_settings_invalid(self):
+        admin = self.factory.create_admin()
+        for settings in ({'max_rows': '1000'}, {'schedule_jitter': -1}, {'max_estimated_cost': True}):
+            rv = self.make_request('post', self.path,
+                                   data={'name': 'DS 1', 'type': 'pg', 'options': {"dbname": "newdb"},
+                                         'settings': settings},
+                                   user=admin)
+
+            self.assertEqual(rv.status_code, 400)
+
+    def test_updates_settings(self):
+        admin = self.factory.create_admin()
+        settings = {'max_rows': 1000, 'max_estimated_cost': 10.5}
+        rv = self.make_request('post', self.path,
+                               data={'name': 'DS 1', 'type': 'pg', 'options': {"dbname": "newdb"},
+                                     'settings': settings},
+                               user=admin)
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(DataSource.get_by_id(self.factory.data_source.id).settings, settings)
+
 
 class TestDataSourceListAPIPost(BaseTestCase):
     def test_returns_400_when_missing_fields(self):
@@ -87,3 +109,38 @@ class TestDataSourceListAPIPost(BaseTestCase):
                                data={'name': 'DS 1', 'type': 'pg', 'options': {"dbname": "redash"}}, user=admin)
 
         self.assertEqual(rv.status_code, 200)
+
+
+class TestDataSourceSchemaTableList(BaseTestCase):
+    def setUp(self):
+        super(TestDataSourceSchemaTableList, self).setUp()
+        schema = [{'name': 'users', 'columns': ['id', 'email']}, {'name': 'events', 'columns': ['user_id']}]
+        patcher = patch.object(DataSource, 'get_schema', return_value=schema)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_returns_paginated_tables(self):
+        path = "/api/data_sources/{}/schema/tables?page_size=1".format(self.factory.data_source.id)
+        response = self.make_request("get", path)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['count'], 2)
+        self.assertEqual(response.json['tables'], [{'name': 'events', 'columns_count': 1}])
+
+    def test_searches_table_and_column_names(self):
+        path = "/api/data_sources/{}/schema/tables?q=user&match=substring".format(self.factory.data_source.id)
+        response = self.make_request("get", path)
+
+        self.assertEqual([t['name'] for t in response.json['tables']], ['events', 'users'])
+
+    def test_returns_table_columns(self):
+        path = "/api/data_sources/{}/schema/tables/users".format(self.factory.data_source.id)
+        response = self.make_request("get", path)
+
+        self.assertEqual(response.json, {'name': 'users', 'columns': ['id', 'email']})
+
+    def test_returns_404_for_unknown_table(self):
+        path = "/api/data_sources/{}/schema/tables/missing".format(self.factory.data_source.id)
+        response = self.make_request("get", path)
+
+        self.assertEqual(response.status_code, 404)
@@ -108,3 +108,70 @@ class QueryRefreshTest(BaseTestCase):
         user = self.factory.create_user(groups=[group.id])
         response = self.make_request('post', self.path, user=user)
         self.assertEqual(403, response.status_code)
+
+
+class QueryListPaginationTest(BaseTestCase):
+    def setUp(self):
+        super(QueryListPaginationTest, self).setUp()
+        self.queries = [self.factory.create_query(name='Query {}'.format(i)) for i in range(5)]
+
+    def get_all_pages(self, path):
+        ids = []
+        while path:
+            rv = self.make_request('get', path)
+            self.assertEqual(rv.status_code, 200)
+            ids.extend(q['id'] for q in rv.json['results'])
+            cursor = rv.json['next_cursor']
+            path = '/api/queries?page_size=2&cursor={}'.format(cursor) if cursor else None
+        return ids
+
+    def test_pages_through_all_queries(self):
+        ids = self.get_all_pages('/api/queries?page_size=2')
+
+        self.assertEqual(ids, [q.id for q in reversed(self.queries)])
+
+    def test_sorts_by_name(self):
+        rv = self.make_request('get', '/api/queries?page_size=2&sort=name')
+
+        self.assertEqual([q['name'] for q in rv.json['results']], ['Query 0', 'Query 1'])
+        self.assertIsNotNone(rv.json['next_cursor'])
+
+    def test_filters_by_data_source(self):
+        data_source = self.factory.create_data_source(group=self.factory.org.default_group)
+        query = self.factory.create_query(data_source=data_source)
+
+        rv = self.make_request('get', '/api/queries?page_size=10&data_source_id={}'.format(data_source.id))
+
+        self.assertEqual([q['id'] for q in rv.json['results']], [query.id])
+
+    def test_skips_queries_without_access(self):
+        data_source = self.factory.create_data_source(group=self.factory.create_group())
+        self.factory.create_query(data_source=data_source)
+
+        rv = self.make_request('get', '/api/queries?page_size=10')
+
+        self.assertEqual(len(rv.json['results']), len(self.queries))
+
+    def test_skips_queries_of_other_groups_for_admins(self):
+        data_source = self.factory.create_data_source(group=self.factory.create_group())
+        self.factory.create_query(data_source=data_source)
+        admin = self.factory.create_admin()
+
+        rv = self.make_request('get', '/api/queries?page_size=10', user=admin)
+        self.assertEqual(len(rv.json['results']), len(self.queries))
+
+        rv = self.make_request('get', '/api/queries/count', user=admin)
+        self.assertEqual(rv.json['count'], len(self.queries))
+
+    def test_rejects_unknown_sort_field(self):
+        rv = self.make_request('get', '/api/queries?page_size=10&sort=query')
+        self.assertEqual(rv.status_code, 400)
+
+    def test_count(self):
+        self.factory.create_query(schedule='3600')
+
+        rv = self.make_request('get', '/api/queries/count')
+        self.assertEqual(rv.json['count'], len(self.queries) + 1)
+
+        rv = self.make_request('get', '/api/queries/count?scheduled=true')
+        self.assertEqual(rv.json['count'], 1)
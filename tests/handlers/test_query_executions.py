@@ -0,0 +1,21 @@
+from tests import BaseTestCase
+
+
+class TestQueryExecutionReportResource(BaseTestCase):
+    def test_returns_report(self):
+        admin = self.factory.create_admin()
+        rv = self.make_request('get', '/api/query_executions/slowest_queries?days=1', user=admin)
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.json, {'report': 'slowest_queries', 'days': 1, 'rows': []})
+
+    def test_unknown_report(self):
+        admin = self.factory.create_admin()
+        rv = self.make_request('get', '/api/query_executions/nothing', user=admin)
+
+        self.assertEqual(rv.status_code, 404)
+
+    def test_requires_admin(self):
+        rv = self.make_request('get', '/api/query_executions/slowest_queries')
+
+        self.assertEqual(rv.status_code, 403)
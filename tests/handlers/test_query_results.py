@@ -1,4 +1,10 @@
+from mock import patch
+
 from tests import BaseTestCase
+from redash import redis_connection
+from redash.models import DataSource
+from redash.tasks import QueryTask
+from redash.utils import gen_query_hash
 
 
 class TestQueryResultsCacheHeaders(BaseTestCase):
@@ -41,6 +47,50 @@ class QueryResultListAPITest(BaseTestCase):
         self.assertNotIn('query_result', rv.json)
         self.assertIn('job', rv.json)
 
+    def test_full_results_dont_use_truncated_result(self):
+        self.factory.create_query_result(truncated=True)
+
+        with patch.object(QueryTask, 'add_task') as add_task:
+            add_task.return_value.to_dict.return_value = {'id': '123'}
+            rv = self.make_request('post', '/api/query_results',
+                                   data={'data_source_id': self.factory.data_source.id,
+                                         'query': 'SELECT 1',
+                                         'full_results': True})
+
+            self.assertEquals(rv.status_code, 200)
+            self.assertNotIn('query_result', rv.json)
+            self.assertEquals(rv.json['job']['id'], '123')
+            self.assertFalse(add_task.call_args[1]['limit_rows'])
+
+    def test_full_results_dont_join_capped_job(self):
+        lock_id = QueryTask._job_lock_id(gen_query_hash('SELECT 1'), self.factory.data_source.id, limit_rows=True)
+        redis_connection.set(lock_id, 'capped-job')
+
+        with patch('redash.tasks.execute_query.apply_async') as apply_async,\
+                patch.object(QueryTask, 'to_dict', return_value={'id': 'full-job'}):
+            apply_async.return_value.id = 'full-job'
+            rv = self.make_request('post', '/api/query_results',
+                                   data={'data_source_id': self.factory.data_source.id,
+                                         'query': 'SELECT 1',
+                                         'max_age': 0,
+                                         'full_results': True})
+
+            self.assertEquals(rv.status_code, 200)
+            self.assertEquals(rv.json['job']['id'], 'full-job')
+            self.assertEquals(apply_async.call_args[1]['kwargs'], {'limit_rows': False})
+            self.assertEquals(redis_connection.get(lock_id), 'capped-job')
+
+    def test_returns_trace_id(self):
+        with patch.object(QueryTask, 'add_task') as add_task:
+            add_task.return_value.to_dict.return_value = {'id': '123'}
+            rv = self.make_request('post', '/api/query_results',
+                                   data={'data_source_id': self.factory.data_source.id,
+                                         'query': 'SELECT 1',
+                                         'max_age': 0})
+
+            trace_id = add_task.call_args[1]['metadata']['Trace ID']
+            self.assertEquals(rv.headers['X-Redash-Trace-Id'], trace_id)
+
     def test_execute_query_without_access(self):
         user = self.factory.create_user(groups=[self.factory.create_group().id])
         query = self.factory.create_query()
@@ -72,3 +122,31 @@ class QueryResultListAPITest(BaseTestCase):
 
         self.assertEquals(rv.status_code, 200)
         self.assertIn('job', rv.json)
+
+    def test_execute_query_over_cost_limits(self):
+        with patch.object(DataSource, 'check_cost', return_value="Too expensive.") as check_cost,\
+                patch.object(QueryTask, 'add_task') as add_task:
+            rv = self.make_request('post', '/api/query_results',
+                                   data={'data_source_id': self.factory.data_source.id,
+                                         'query': 'SELECT 1',
+                                         'max_age': 0})
+
+            self.assertEquals(rv.status_code, 400)
+            self.assertEquals(rv.json['job']['error'], "Too expensive.")
+            self.assertTrue(rv.json['job']['confirm_cost'])
+            check_cost.assert_called_once_with('SELECT 1')
+            self.assertFalse(add_task.called)
+
+    def test_execute_confirmed_query_over_cost_limits(self):
+        with patch.object(DataSource, 'check_cost', return_value="Too expensive.") as check_cost,\
+                patch.object(QueryTask, 'add_task') as add_task:
+            add_task.return_value.to_dict.return_value = {'id': '123'}
+            rv = self.make_request('post', '/api/query_results',
+                                   data={'data_source_id': self.factory.data_source.id,
+                                         'query': 'SELECT 1',
+                                         'max_age': 0,
+                                         'confirm_cost': True})
+
+            self.assertEquals(rv.status_code, 200)
+            self.assertEquals(rv.json['job']['id'], '123')
+            self.assertFalse(check_cost.called)
@@ -1,5 +1,6 @@
+from mock import patch
 from tests import BaseTestCase
-from redash.models import DataSource
+from redash.models import DataSource, DataSourceGroup, _data_source_groups_indexes
 from redash.utils.configuration import ConfigurationContainer
 
 
@@ -7,3 +8,87 @@ class TestDataSourceCreate(BaseTestCase):
     def test_adds_data_source_to_default_group(self):
         data_source = DataSource.create_with_group(org=self.factory.org, name='test', options=ConfigurationContainer.from_json('{"dbname": "test"}'), type='pg')
         self.assertIn(self.factory.org.default_group.id, data_source.groups)
+
+
+class TestDataSourceGroups(BaseTestCase):
+    def test_reflects_group_changes(self):
+        group = self.factory.create_group()
+        data_source = self.factory.data_source
+        self.assertNotIn(group.id, data_source.groups)
+
+        data_source.add_group(group)
+        self.assertEqual(data_source.groups[group.id], False)
+
+        data_source.update_group_permission(group, True)
+        self.assertEqual(data_source.groups[group.id], True)
+
+        data_source.remove_group(group)
+        self.assertNotIn(group.id, data_source.groups)
+
+    def test_uses_cached_index(self):
+        groups = self.factory.data_source.groups
+
+        with patch.object(DataSourceGroup, 'select') as select:
+            self.assertEqual(groups, self.factory.data_source.groups)
+            self.assertFalse(select.called)
+
+    def test_index_is_built_from_redis_copy(self):
+        groups = self.factory.data_source.groups
+        _data_source_groups_indexes.clear()
+
+        with patch.object(DataSourceGroup, 'select') as select:
+            self.assertEqual(groups, self.factory.data_source.groups)
+            self.assertFalse(select.called)
+
+
+class TestDataSourceCheckCost(BaseTestCase):
+    def check_cost(self, settings, estimate):
+        data_source = self.factory.create_data_source(settings=settings)
+        with patch.object(DataSource, 'query_runner') as query_runner:
+            query_runner.estimate_cost.return_value = estimate
+            return data_source.check_cost('SELECT * FROM t')
+
+    def test_passes_without_limits(self):
+        self.assertIsNone(self.check_cost({}, {'rows': 10 ** 9, 'cost': None}))
+
+    def test_passes_when_no_estimate(self):
+        self.assertIsNone(self.check_cost({DataSource.SETTING_MAX_ESTIMATED_ROWS: 1000}, None))
+
+    def test_rejects_too_many_rows(self):
+        error = self.check_cost({DataSource.SETTING_MAX_ESTIMATED_ROWS: 1000}, {'rows': 5000, 'cost': None})
+        self.assertIn('5,000 rows', error)
+
+    def test_rejects_too_high_cost(self):
+        error = self.check_cost({DataSource.SETTING_MAX_ESTIMATED_COST: 100}, {'rows': None, 'cost': 500.0})
+        self.assertIsNotNone(error)
+
+
+class TestDataSourceRowLimit(BaseTestCase):
+    def test_uses_data_source_setting(self):
+        data_source = self.factory.create_data_source(settings={DataSource.SETTING_MAX_ROWS: 1000})
+        self.assertEqual(data_source.row_limit, 1000)
+
+    def test_falls_back_to_global_setting(self):
+        data_source = self.factory.create_data_source()
+        with patch('redash.models.settings.QUERY_RESULTS_MAX_ROWS', 5000):
+            self.assertEqual(data_source.row_limit, 5000)
+        with patch('redash.models.settings.QUERY_RESULTS_MAX_ROWS', 0):
+            self.assertIsNone(data_source.row_limit)
+
+    def test_result_size_limit(self):
+        data_source = self.factory.create_data_source(settings={DataSource.SETTING_MAX_RESULT_SIZE: 10 ** 6})
+        self.assertEqual(data_source.result_size_limit, 10 ** 6)
+
+    def test_coerces_settings_saved_as_strings(self):
+        data_source = self.factory.create_data_source(settings={DataSource.SETTING_MAX_ROWS: '1000',
+                                                                DataSource.SETTING_SCHEDULE_JITTER: '60'})
+        self.assertEqual(data_source.row_limit, 1000)
+        self.assertEqual(data_source.schedule_jitter, 60)
+
+    def test_ignores_invalid_settings(self):
+        data_source = self.factory.create_data_source(settings={DataSource.SETTING_MAX_IN_FLIGHT_JOBS: 'many',
+                                                                DataSource.SETTING_MAX_ROWS: -1})
+        with patch('redash.models.settings.SCHEDULED_MAX_IN_FLIGHT_JOBS', 0):
+            self.assertIsNone(data_source.max_in_flight_jobs)
+        with patch('redash.models.settings.QUERY_RESULTS_MAX_ROWS', 5000):
+            self.assertEqual(data_source.row_limit, 5000)
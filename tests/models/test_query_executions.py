@@ -0,0 +1,135 @@
+import datetime
+import time
+
+import pytz
+from mock import patch
+from tests import BaseTestCase
+from redash import redis_connection, settings
+from redash.models import db, QueryExecution
+
+
+class QueryExecutionTestCase(BaseTestCase):
+    def record(self, **kwargs):
+        execution = {
+            'org_id': self.factory.org.id,
+            'query_id': None,
+            'query_hash': 'hash',
+            'data_source_id': self.factory.data_source.id,
+            'username': 'Scheduled',
+            'queue': 'queries',
+            'task_id': 'task',
+            'wait_time': 1,
+            'run_time': 2,
+            'rows': 10,
+            'bytes': 100,
+            'outcome': QueryExecution.SUCCESS,
+            'worker': 'worker',
+            'started_at': time.time()
+        }
+        execution.update(kwargs)
+        QueryExecution.record(execution)
+
+
+class TestQueryExecutionFlush(QueryExecutionTestCase):
+    def test_writes_buffered_executions(self):
+        self.record(task_id='first')
+        self.record(task_id='second', outcome=QueryExecution.FAILED)
+
+        self.assertEqual(QueryExecution.flush(), 2)
+
+        executions = list(QueryExecution.select().order_by(QueryExecution.id))
+        self.assertEqual([e.task_id for e in executions], ['first', 'second'])
+        self.assertEqual(executions[1].outcome, QueryExecution.FAILED)
+        self.assertEqual(redis_connection.llen(QueryExecution.BUFFER_KEY), 0)
+
+    def test_writes_oldest_first_in_batches(self):
+        for i in range(3):
+            self.record(task_id=str(i))
+
+        self.assertEqual(QueryExecution.flush(batch_size=2), 2)
+        self.assertEqual([e.task_id for e in QueryExecution.select().order_by(QueryExecution.id)], ['0', '1'])
+        self.assertEqual(QueryExecution.flush(batch_size=2), 1)
+
+    def test_keeps_executions_when_writing_fails(self):
+        self.record()
+
+        with patch.object(QueryExecution, 'insert_many', side_effect=Exception("database is down")):
+            self.assertRaises(Exception, QueryExecution.flush)
+
+        self.assertEqual(redis_connection.llen(QueryExecution.BUFFER_KEY), 1)
+
+    def test_stores_start_time_in_utc(self):
+        # A timestamp without a time zone would be read in the connection's one:
+        db.database.execute_sql("SET TIME ZONE 'America/New_York'")
+        self.record(started_at=1000000000)
+
+        QueryExecution.flush()
+
+        self.assertEqual(QueryExecution.get().started_at, datetime.datetime(2001, 9, 9, 1, 46, 40, tzinfo=pytz.utc))
+
+    def test_drops_executions_the_database_rejects(self):
+        self.record(task_id='first')
+        self.record(task_id='second', outcome='x' * 100)
+        self.record(task_id='third')
+
+        self.assertEqual(QueryExecution.flush(), 2)
+
+        self.assertEqual([e.task_id for e in QueryExecution.select().order_by(QueryExecution.id)], ['first', 'third'])
+        self.assertEqual(redis_connection.llen(QueryExecution.BUFFER_KEY), 0)
+
+    def test_caps_buffer(self):
+        with patch.object(settings, 'QUERY_EXECUTIONS_BUFFER_MAX_SIZE', 2):
+            for i in range(3):
+                self.record(task_id=str(i))
+
+        self.assertEqual(QueryExecution.flush(), 2)
+        self.assertEqual([e.task_id for e in QueryExecution.select().order_by(QueryExecution.id)], ['1', '2'])
+
+    def test_disabled(self):
+        with patch.object(settings, 'QUERY_EXECUTIONS_LOG_ENABLED', False):
+            self.record()
+
+        self.assertEqual(QueryExecution.flush(), 0)
+
+
+class TestQueryExecutionReports(QueryExecutionTestCase):
+    def test_slowest_queries(self):
+        fast = self.factory.create_query()
+        slow = self.factory.create_query(name='Slow')
+        self.record(query_id=fast.id, run_time=1)
+        self.record(query_id=slow.id, run_time=10)
+        self.record(query_id=slow.id, run_time=20, outcome=QueryExecution.FAILED)
+        self.record(query_id=None, run_time=100)
+        QueryExecution.flush()
+
+        rows = QueryExecution.slowest_queries(self.factory.org)
+
+        self.assertEqual([r['query_id'] for r in rows], [slow.id, fast.id])
+        self.assertEqual(rows[0]['name'], 'Slow')
+        self.assertEqual(rows[0]['executions'], 2)
+        self.assertEqual(rows[0]['failures'], 1)
+        self.assertEqual(rows[0]['avg_run_time'], 15)
+
+    def test_heaviest_data_sources(self):
+        self.record(run_time=5)
+        self.record(run_time=5)
+        QueryExecution.flush()
+
+        rows = QueryExecution.heaviest_data_sources(self.factory.org)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['name'], self.factory.data_source.name)
+        self.assertEqual(rows[0]['total_run_time'], 10)
+        self.assertEqual(rows[0]['total_bytes'], 200)
+
+    def test_busiest_hours(self):
+        self.record(started_at=3600 * 24 * 365 * 50 + 3 * 3600)
+        QueryExecution.flush()
+
+        self.assertEqual(QueryExecution.busiest_hours(self.factory.org, days=365 * 100)[0]['hour'], 3)
+
+    def test_other_organizations(self):
+        self.record(org_id=self.factory.org.id + 1)
+        QueryExecution.flush()
+
+        self.assertEqual(QueryExecution.heaviest_data_sources(self.factory.org), [])
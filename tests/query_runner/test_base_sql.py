@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from mock import patch
+
+from redash import settings
+from redash.query_runner import BaseSQLQueryRunner
+
+
+class CatalogRunner(BaseSQLQueryRunner):
+    def __init__(self, catalog_sizes):
+        super(CatalogRunner, self).__init__({})
+        self.catalog_sizes = catalog_sizes
+        self.queries = []
+
+    def _get_catalog_tables_sizes(self):
+        return self.catalog_sizes
+
+    def _run_query_internal(self, query):
+        self.queries.append(query)
+        return [{'cnt': 42}]
+
+
+class TestGetTablesStats(TestCase):
+    def test_uses_catalog_statistics(self):
+        runner = CatalogRunner({'users': 10, 'events': 20})
+        tables = {'users': {'name': 'users'}, 'events': {'name': 'events'}}
+
+        runner._get_tables_stats(tables)
+
+        self.assertEqual(10, tables['users']['size'])
+        self.assertEqual(20, tables['events']['size'])
+        self.assertEqual([], runner.queries)
+
+    def test_counts_tables_missing_from_catalog(self):
+        runner = CatalogRunner({'users': 10})
+        tables = {'users': {'name': 'users'}, 'events': {'name': 'events'}, 'views': {'name': 'views'}}
+
+        runner._get_tables_stats(tables)
+
+        self.assertEqual(10, tables['users']['size'])
+        self.assertEqual(42, tables['events']['size'])
+        self.assertEqual(42, tables['views']['size'])
+        self.assertItemsEqual(['select count(*) as cnt from events', 'select count(*) as cnt from views'],
+                              runner.queries)
+
+    def test_counts_serially_without_concurrency(self):
+        runner = CatalogRunner({})
+        tables = {'users': {'name': 'users'}, 'events': {'name': 'events'}}
+
+        with patch.object(settings, 'SCHEMA_TABLE_SIZE_CALCULATIONS_CONCURRENCY', 0):
+            runner._get_tables_stats(tables)
+
+        self.assertEqual(42, tables['users']['size'])
+        self.assertEqual(42, tables['events']['size'])
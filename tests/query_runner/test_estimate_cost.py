@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from redash.query_runner import parse_estimate
+from redash.query_runner.pg import PostgreSQL
+from redash.query_runner.mysql import Mysql
+
+
+class TestParseEstimate(TestCase):
+    def test_parses_plain_and_suffixed_numbers(self):
+        self.assertEqual(parse_estimate('1234'), 1234)
+        self.assertEqual(parse_estimate('1,234'), 1234)
+        self.assertEqual(parse_estimate('1.5K'), 1500)
+        self.assertEqual(parse_estimate('2m'), 2000000)
+
+    def test_returns_none_for_unknown_values(self):
+        self.assertIsNone(parse_estimate('?'))
+        self.assertIsNone(parse_estimate('-1'))
+
+
+class TestPostgreSQLEstimateCost(TestCase):
+    def test_reads_top_plan_node(self):
+        runner = PostgreSQL({'dbname': 'test'})
+        plan = [{'Plan': {'Node Type': 'Seq Scan', 'Plan Rows': 1000, 'Total Cost': 15.5}}]
+        runner._run_query_internal = lambda query: [{'QUERY PLAN': plan}]
+
+        self.assertEqual(runner.estimate_cost('SELECT * FROM t'), {'rows': 1000, 'cost': 15.5})
+
+
+class TestMysqlEstimateCost(TestCase):
+    def test_multiplies_join_steps_rows(self):
+        runner = Mysql({'db': 'test'})
+        runner._run_query_internal = lambda query: [{'rows': 100}, {'rows': 10}, {'rows': None}]
+
+        self.assertEqual(runner.estimate_cost('SELECT * FROM a JOIN b'), {'rows': 1000, 'cost': None})
@@ -0,0 +1,160 @@
+import datetime
+import decimal
+import json
+from unittest import TestCase
+
+from redash.query_runner import BaseQueryRunner, ResultTooLargeError, TYPE_DATE, TYPE_FLOAT, TYPE_INTEGER, TYPE_STRING
+from redash.query_runner.oracle import Oracle
+from redash.query_runner.sqlite import Sqlite
+
+
+class FakeCursor(object):
+    def __init__(self, rows, rowcount=-1):
+        self.rows = rows
+        self.rowcount = rowcount
+        self.fetched = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fetchmany(self, size):
+        batch = self.rows[self.fetched:self.fetched + size]
+        self.fetched += len(batch)
+        return batch
+
+
+class TestFetchData(TestCase):
+    columns = [{'name': 'a', 'friendly_name': 'a', 'type': None}, {'name': 'b', 'friendly_name': 'b', 'type': None}]
+
+    def test_fetches_all_rows_without_limit(self):
+        runner = BaseQueryRunner({})
+        data = runner.fetch_data(FakeCursor([(i, i * 2) for i in range(2500)]), self.columns)
+
+        self.assertEqual(len(data['rows']), 2500)
+        self.assertEqual(data['rows'][1], {'a': 1, 'b': 2})
+        self.assertNotIn('truncated', data)
+
+    def test_stops_fetching_at_limit(self):
+        runner = BaseQueryRunner({})
+        runner.row_limit = 10
+        cursor = FakeCursor([(i, i) for i in range(100)], rowcount=100)
+
+        data = runner.fetch_data(cursor, self.columns)
+
+        self.assertEqual(len(data['rows']), 10)
+        self.assertEqual(cursor.fetched, 11)
+        self.assertTrue(data['truncated'])
+        self.assertEqual(data['total_rows'], 100)
+        self.assertTrue(runner.truncated)
+
+    def test_total_rows_unknown(self):
+        runner = BaseQueryRunner({})
+        runner.row_limit = 10
+
+        data = runner.fetch_data(FakeCursor([(i, i) for i in range(100)]), self.columns)
+
+        self.assertTrue(data['truncated'])
+        self.assertIsNone(data['total_rows'])
+
+    def test_not_truncated_at_exact_limit(self):
+        runner = BaseQueryRunner({})
+        runner.row_limit = 10
+
+        data = runner.fetch_data(FakeCursor([(i, i) for i in range(10)]), self.columns)
+
+        self.assertEqual(len(data['rows']), 10)
+        self.assertNotIn('truncated', data)
+        self.assertFalse(runner.truncated)
+
+    def test_aborts_when_result_size_limit_exceeded(self):
+        runner = BaseQueryRunner({})
+        runner.result_size_limit = 10000
+        cursor = FakeCursor([(i, 'x' * 100) for i in range(10000)])
+
+        self.assertRaises(ResultTooLargeError, runner.fetch_data, cursor, self.columns)
+        self.assertTrue(cursor.cancelled)
+        self.assertLess(cursor.fetched, 10000)
+
+    def test_passes_within_result_size_limit(self):
+        runner = BaseQueryRunner({})
+        runner.result_size_limit = 10000
+
+        data = runner.fetch_data(FakeCursor([(1, 'x')]), self.columns)
+
+        self.assertEqual(data['rows'], [{'a': 1, 'b': 'x'}])
+
+    def test_compact_format(self):
+        runner = BaseQueryRunner({})
+        runner.row_format = 'compact'
+
+        data = runner.fetch_data(FakeCursor([(1, 2), (3, 4)]), self.columns)
+
+        self.assertEqual(data['format'], 'compact')
+        self.assertEqual(data['rows'], [(1, 2), (3, 4)])
+
+
+class TestSqliteRowLimit(TestCase):
+    def test_truncates_results(self):
+        runner = Sqlite({'dbpath': ':memory:'})
+        runner.row_limit = 2
+
+        json_data, error = runner.run_query("SELECT 1 AS n UNION ALL SELECT 2 UNION ALL SELECT 3")
+        data = json.loads(json_data)
+
+        self.assertIsNone(error)
+        self.assertEqual(data['rows'], [{'n': 1}, {'n': 2}])
+        self.assertTrue(data['truncated'])
+
+
+class TestColumnConverters(TestCase):
+    def test_converts_values_by_column_type(self):
+        columns = [{'name': 'n', 'type': TYPE_FLOAT}, {'name': 'd', 'type': TYPE_DATE}, {'name': 's', 'type': TYPE_STRING}]
+        cursor = FakeCursor([(decimal.Decimal('1.5'), datetime.date(2016, 1, 2), 'text'), (None, None, None)])
+
+        data = BaseQueryRunner({}).fetch_data(cursor, columns)
+
+        self.assertEqual(data['rows'], [{'n': 1.5, 'd': '2016-01-02', 's': 'text'}, {'n': None, 'd': None, 's': None}])
+        self.assertIs(type(data['rows'][0]['n']), float)
+
+    def test_converts_unexpected_values(self):
+        columns = [{'name': 'd', 'type': TYPE_FLOAT}]
+
+        data = BaseQueryRunner({}).fetch_data(FakeCursor([(datetime.date(2016, 1, 2),)]), columns)
+
+        self.assertEqual(data['rows'], [{'d': '2016-01-02'}])
+
+    def test_oracle_converts_integer_numbers(self):
+        # Skips __init__, which needs cx_Oracle:
+        runner = Oracle.__new__(Oracle)
+        columns = [{'name': 'id', 'type': TYPE_INTEGER}]
+
+        data = runner.fetch_data(FakeCursor([('12345678901234567890',), (None,)]), columns)
+
+        self.assertEqual(data['rows'], [{'id': 12345678901234567890}, {'id': None}])
+
+    def test_leaves_native_values_alone(self):
+        columns = [{'name': 'n', 'type': TYPE_FLOAT}, {'name': 's', 'type': TYPE_STRING}]
+        rows = [(1.5, 'text'), (2.5, None)]
+        runner = BaseQueryRunner({})
+        runner.row_format = 'compact'
+
+        data = runner.fetch_data(FakeCursor(rows), columns)
+
+        self.assertIs(data['rows'][0], rows[0])
+
+    def test_picks_converter_from_first_value(self):
+        columns = [{'name': 'n', 'type': TYPE_FLOAT}]
+        rows = [(None,)] * 1500 + [(decimal.Decimal('1.5'),)]
+
+        data = BaseQueryRunner({}).fetch_data(FakeCursor(rows), columns)
+
+        self.assertIsNone(data['rows'][0]['n'])
+        self.assertIs(type(data['rows'][-1]['n']), float)
+
+    def test_converts_values_of_columns_of_unknown_type(self):
+        columns = [{'name': 'n', 'type': None}]
+
+        data = BaseQueryRunner({}).fetch_data(FakeCursor([(decimal.Decimal('1.5'),)]), columns)
+
+        self.assertIs(type(data['rows'][0]['n']), float)
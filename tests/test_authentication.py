@@ -57,6 +57,25 @@ class TestApiKeyAuthentication(BaseTestCase):
             rv = c.get(self.query_url, headers={'Authorization': "Key oops"})
             self.assertIsNone(api_key_load_user_from_request(request))
 
+    def test_user_api_key_is_cached(self):
+        user = self.factory.create_user(api_key="user_key")
+        with app.test_client() as c:
+            rv = c.get(self.queries_url, query_string={'api_key': user.api_key})
+            api_key_load_user_from_request(request)
+
+            with patch.object(models.User, 'get_by_api_key_and_org') as get_by_api_key_and_org:
+                self.assertEqual(user.id, api_key_load_user_from_request(request).id)
+                self.assertFalse(get_by_api_key_and_org.called)
+
+    def test_changed_query_api_key_is_not_cached(self):
+        with app.test_client() as c:
+            rv = c.get(self.query_url, query_string={'api_key': self.api_key})
+            self.assertIsNotNone(api_key_load_user_from_request(request))
+
+            self.query.api_key = 'new_key'
+            self.query.save()
+            self.assertIsNone(api_key_load_user_from_request(request))
+
     def test_api_key_for_wrong_org(self):
         other_user = self.factory.create_admin(org=self.factory.create_org())
 
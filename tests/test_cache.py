@@ -0,0 +1,67 @@
+import time
+from unittest import TestCase
+
+from tests import BaseTestCase
+from redash import models
+from redash.cache import ProcessCache, ModelCache, get_version, bump_version
+
+
+class TestProcessCache(TestCase):
+    def test_returns_value_stored_with_same_version(self):
+        cache = ProcessCache(60)
+        cache.set('key', 'v1', 'value')
+
+        self.assertEqual(cache.get('key', 'v1'), 'value')
+        self.assertIsNone(cache.get('key', 'v2'))
+
+    def test_expires_entries(self):
+        cache = ProcessCache(-1)
+        cache.set('key', 'v1', 'value')
+
+        self.assertIsNone(cache.get('key', 'v1'))
+
+
+class TestModelCache(BaseTestCase):
+    def test_returns_a_new_clean_instance_on_each_get(self):
+        cache = ModelCache(models.Organization, 60)
+        cache.set(self.factory.org.slug, 'v1', self.factory.org)
+
+        org = cache.get(self.factory.org.slug, 'v1')
+        self.assertEqual(org.id, self.factory.org.id)
+        self.assertEqual(org.settings, self.factory.org.settings)
+        self.assertEqual(org.dirty_fields, [])
+
+        org.settings['changed'] = True
+        self.assertNotIn('changed', cache.get(self.factory.org.slug, 'v1').settings)
+
+
+class TestVersions(BaseTestCase):
+    def test_bump_version_changes_version(self):
+        version = get_version('test')
+        self.assertEqual(version, get_version('test'))
+
+        bump_version('test')
+        self.assertNotEqual(version, get_version('test'))
+
+    def test_saving_organization_bumps_its_version(self):
+        version = get_version(models.Organization.CACHE_VERSION)
+        self.factory.org.save()
+
+        self.assertNotEqual(version, get_version(models.Organization.CACHE_VERSION))
+
+    def test_saving_query_bumps_users_version_only_when_its_access_changes(self):
+        query = self.factory.create_query()
+        version = get_version(models.User.CACHE_VERSION)
+
+        query.name = 'New name'
+        query.save()
+        self.assertEqual(version, get_version(models.User.CACHE_VERSION))
+
+        query.api_key = 'new key'
+        query.save()
+        self.assertNotEqual(version, get_version(models.User.CACHE_VERSION))
+
+        version = get_version(models.User.CACHE_VERSION)
+        query.data_source = self.factory.create_data_source()
+        query.save()
+        self.assertNotEqual(version, get_version(models.User.CACHE_VERSION))
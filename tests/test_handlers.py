@@ -71,6 +71,48 @@ class StatusTest(BaseTestCase):
             self.assertEqual(rv.status_code, 302)
 
 
+class ProfilerTest(BaseTestCase):
+    def test_stores_report_for_super_admin(self):
+        admin = self.factory.create_admin()
+
+        rv = self.make_request('get', '/api/dashboards?_profile=1', user=admin)
+        report_id = rv.headers.get('X-Redash-Profile')
+        self.assertIsNotNone(report_id)
+
+        rv = self.make_request('get', '/api/admin/profiles/{}'.format(report_id), org=False, user=admin)
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.json['endpoint'], 'dashboards')
+        self.assertTrue(len(rv.json['sql_statements']) > 0)
+        self.assertIn('cumulative', rv.json['profile'])
+
+    def test_ignores_flag_for_other_users(self):
+        with patch('redash.metrics.profiler.cProfile.Profile') as profile:
+            rv = self.make_request('get', '/api/dashboards?_profile=1')
+
+        self.assertNotIn('X-Redash-Profile', rv.headers)
+        self.assertFalse(profile.called)
+
+    def test_reports_are_for_super_admins_only(self):
+        rv = self.make_request('get', '/api/admin/profiles', org=False, is_json=False)
+        self.assertEqual(rv.status_code, 403)
+
+
+class MetricsTest(BaseTestCase):
+    def test_exposes_request_metrics(self):
+        admin = self.factory.create_admin()
+        self.make_request('get', '/api/dashboards', user=admin)
+
+        rv = self.make_request('get', '/metrics', org=False, user=admin, is_json=False)
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn('redash_request_duration_milliseconds_count{endpoint="dashboards",method="get",status="200"} 1',
+                      rv.data)
+        self.assertIn('redash_request_database_queries_count{endpoint="dashboards",method="get"} 1', rv.data)
+
+    def test_metrics_are_for_super_admins_only(self):
+        rv = self.make_request('get', '/metrics', org=False, is_json=False)
+        self.assertEqual(rv.status_code, 403)
+
+
 class DashboardAPITest(BaseTestCase, AuthenticationTestMixin):
     def setUp(self):
         self.paths = ['/api/dashboards']
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import datetime
+import decimal
+import json
+from collections import namedtuple
+from unittest import TestCase
+
+from redash import utils
+from redash.utils import JSONEncoder, json_dumps, json_default
+
+
+Point = namedtuple('Point', ['x', 'y'])
+
+DATA = {
+    'columns': [{'name': u'עברית', 'friendly_name': 'name', 'type': None}],
+    'rows': [
+        {
+            'decimal': decimal.Decimal('1.10'),
+            'date': datetime.date(2016, 1, 2),
+            'datetime': datetime.datetime(2016, 1, 2, 3, 4, 5, 6),
+            'time': datetime.time(3, 4, 5),
+            'timedelta': datetime.timedelta(days=1, seconds=5),
+            'float': 0.1,
+            'big': 2 ** 70,
+            'nan': float('nan'),
+            'unicode': u'שלום "quoted"',
+            'bytes': 'caf\xc3\xa9',
+            'none': None,
+            'bool': True,
+            'tuple': (1, 2),
+            'namedtuple': Point(1, 2),
+            1.5: 'float key'
+        }
+    ]
+}
+
+
+class TestJSONDumps(TestCase):
+    def test_same_output_as_json_module(self):
+        self.assertEqual(json_dumps(DATA), json.dumps(DATA, cls=JSONEncoder))
+
+    def test_every_backend_has_the_same_output(self):
+        expected = json.dumps(DATA, cls=JSONEncoder)
+
+        for backend in ('json', 'simplejson'):
+            if backend == 'simplejson' and utils.simplejson is None:
+                continue
+            name, encode = utils._get_json_backend(backend)
+            self.assertEqual(encode(DATA), expected, backend)
+
+    def test_unknown_types_fail(self):
+        self.assertRaises(TypeError, json_dumps, {'a': object()})
+
+    def test_default_handles_subclasses(self):
+        class MyDecimal(decimal.Decimal):
+            pass
+
+        self.assertEqual(json_default(MyDecimal('1.5')), 1.5)
@@ -0,0 +1,122 @@
+import os
+
+from celery.signals import worker_process_shutdown
+from mock import patch
+
+from tests import BaseTestCase
+from redash import redis_connection
+from redash.metrics import registry
+from redash.metrics.registry import Counter, Gauge, Histogram
+# Connects the Celery signals the worker processes flush their metrics on:
+import redash.worker
+
+
+class RegistryTestCase(BaseTestCase):
+    def setUp(self):
+        super(RegistryTestCase, self).setUp()
+        self.names = []
+
+    def tearDown(self):
+        for name in self.names:
+            registry._metrics.pop(name, None)
+        super(RegistryTestCase, self).tearDown()
+
+    def metric(self, cls, name, *args, **kwargs):
+        self.names.append(name)
+        return cls(name, "Test metric.", *args, **kwargs)
+
+    def rendered_lines(self, name):
+        return [l for l in registry.render().splitlines() if l.startswith(name)]
+
+
+class TestCounter(RegistryTestCase):
+    def test_increments_per_labels(self):
+        counter = self.metric(Counter, 'test_counter', labels=('kind',))
+        counter.inc(kind='a')
+        counter.inc(2, kind='a')
+        counter.inc(kind='b')
+
+        self.assertEqual(self.rendered_lines('test_counter'), ['test_counter{kind="a"} 3', 'test_counter{kind="b"} 1'])
+
+    def test_rejects_wrong_labels(self):
+        counter = self.metric(Counter, 'test_counter', labels=('kind',))
+        self.assertRaises(ValueError, counter.inc, other='a')
+
+
+class TestGauge(RegistryTestCase):
+    def test_set(self):
+        gauge = self.metric(Gauge, 'test_gauge')
+        gauge.set(5)
+        gauge.set(2.5)
+
+        self.assertEqual(self.rendered_lines('test_gauge'), ['test_gauge 2.5'])
+
+    def test_collect(self):
+        self.metric(Gauge, 'test_gauge', labels=('queue',), collect=lambda: [({'queue': 'queries'}, 3)])
+
+        self.assertEqual(self.rendered_lines('test_gauge'), ['test_gauge{queue="queries"} 3'])
+
+
+class TestHistogram(RegistryTestCase):
+    def test_cumulative_buckets(self):
+        histogram = self.metric(Histogram, 'test_histogram', buckets=(1, 10), labels=('kind',))
+        histogram.observe(0.5, kind='a')
+        histogram.observe(5, kind='a')
+        histogram.observe(50, kind='a')
+
+        self.assertEqual(self.rendered_lines('test_histogram'), [
+            'test_histogram_bucket{kind="a",le="1"} 1',
+            'test_histogram_bucket{kind="a",le="10"} 2',
+            'test_histogram_bucket{kind="a",le="+Inf"} 3',
+            'test_histogram_sum{kind="a"} 55.5',
+            'test_histogram_count{kind="a"} 3',
+        ])
+
+
+class TestFlush(RegistryTestCase):
+    def test_aggregates_updates_until_flushed(self):
+        counter = self.metric(Counter, 'test_counter')
+        with patch('redash.metrics.registry.settings.METRICS_FLUSH_INTERVAL', 3600):
+            registry.flush()
+            counter.inc()
+            counter.inc(2)
+
+            self.assertEqual(redis_connection.hgetall(counter.key), {})
+
+            registry.flush()
+
+        self.assertEqual(float(redis_connection.hget(counter.key, '')), 3)
+
+    def test_flushes_each_update_without_interval(self):
+        counter = self.metric(Counter, 'test_counter')
+        with patch('redash.metrics.registry.settings.METRICS_FLUSH_INTERVAL', 0):
+            counter.inc()
+
+        self.assertEqual(float(redis_connection.hget(counter.key, '')), 1)
+
+    def test_update_starts_flusher(self):
+        counter = self.metric(Counter, 'test_counter')
+        with patch('redash.metrics.registry.settings.METRICS_FLUSH_INTERVAL', 3600):
+            counter.inc()
+
+        self.assertEqual(registry._flusher_pid, os.getpid())
+
+    def test_flusher_flushes_every_interval(self):
+        counter = self.metric(Counter, 'test_counter')
+        with patch('redash.metrics.registry.settings.METRICS_FLUSH_INTERVAL', 3600):
+            counter.inc()
+
+        with patch('redash.metrics.registry.time.sleep', side_effect=[None, SystemExit]) as sleep:
+            self.assertRaises(SystemExit, registry._flush_periodically)
+
+        sleep.assert_called_with(registry.settings.METRICS_FLUSH_INTERVAL)
+        self.assertEqual(float(redis_connection.hget(counter.key, '')), 1)
+
+    def test_flushes_when_worker_process_shuts_down(self):
+        counter = self.metric(Counter, 'test_counter')
+        with patch('redash.metrics.registry.settings.METRICS_FLUSH_INTERVAL', 3600):
+            counter.inc()
+
+        worker_process_shutdown.send(sender=None)
+
+        self.assertEqual(float(redis_connection.hget(counter.key, '')), 1)
@@ -5,7 +5,7 @@ from unittest import TestCase
 import mock
 from dateutil.parser import parse as date_parse
 from tests import BaseTestCase
-from redash import models
+from redash import models, redis_connection
 from redash.utils import gen_query_hash, utcnow
 
 
@@ -21,6 +21,94 @@ class DashboardTest(BaseTestCase):
         self.assertNotEquals(d1.slug, d3.slug)
         self.assertNotEquals(d2.slug, d3.slug)
 
+    def _count_to_dict_queries(self, dashboard):
+        user = models.User.get_by_id(self.factory.user.id)
+        # Start without a cached permissions index, so both dashboards pay for building it:
+        models.DataSourceGroup.invalidate_index()
+        models.db.database.reset_metrics()
+        dashboard.to_dict(with_widgets=True, user=user)
+        return models.db.database.query_count
+
+    def _add_widgets(self, dashboard, count):
+        widgets = []
+        for i in range(count):
+            data_source = self.factory.create_data_source(group=self.factory.default_group)
+            query = self.factory.create_query(data_source=data_source, last_modified_by=self.factory.create_user())
+            visualization = self.factory.create_visualization(query=query)
+            widgets.append(self.factory.create_widget(dashboard=dashboard, visualization=visualization))
+
+        dashboard.layout = json.dumps([[w.id] for w in widgets])
+        dashboard.save()
+
+    def test_to_dict_with_widgets_runs_constant_number_of_queries(self):
+        small = self.factory.create_dashboard()
+        self._add_widgets(small, 2)
+        large = self.factory.create_dashboard()
+        self._add_widgets(large, 40)
+
+        self.assertEqual(self._count_to_dict_queries(small), self._count_to_dict_queries(large))
+
+    def test_to_dict_with_widgets_restricts_widgets_without_access(self):
+        dashboard = self.factory.create_dashboard()
+        data_source = self.factory.create_data_source(group=self.factory.create_group())
+        visualization = self.factory.create_visualization(query=self.factory.create_query(data_source=data_source))
+        widget = self.factory.create_widget(dashboard=dashboard, visualization=visualization)
+        dashboard.layout = json.dumps([[widget.id]])
+        dashboard.save()
+
+        widgets = dashboard.to_dict(with_widgets=True, user=self.factory.user)['widgets']
+
+        self.assertTrue(widgets[0][0]['restricted'])
+
+    def test_to_json_with_widgets_is_cached(self):
+        dashboard = self.factory.create_dashboard()
+        payload = dashboard.to_json_with_widgets(self.factory.user)
+
+        with mock.patch.object(models.Dashboard, 'to_dict') as to_dict:
+            self.assertEqual(payload, dashboard.to_json_with_widgets(self.factory.user))
+            self.assertFalse(to_dict.called)
+
+    def test_to_json_with_widgets_cache_is_per_permission_profile(self):
+        dashboard = self.factory.create_dashboard()
+        dashboard.to_json_with_widgets(self.factory.user)
+
+        admin = self.factory.create_admin()
+        self.assertNotEqual(dashboard._cache_key(self.factory.user), dashboard._cache_key(admin))
+
+    def test_to_json_with_widgets_cache_invalidated_on_data_source_access_change(self):
+        widget = self.factory.create_widget()
+        dashboard = widget.dashboard
+        dashboard.layout = json.dumps([[widget.id]])
+        dashboard.save()
+        dashboard.to_json_with_widgets(self.factory.user)
+
+        widget.visualization.query.data_source.remove_group(self.factory.default_group)
+        payload = json.loads(models.Dashboard.get_by_id(dashboard.id).to_json_with_widgets(self.factory.user))
+
+        self.assertTrue(payload['widgets'][0][0]['restricted'])
+
+    def test_to_json_with_widgets_cache_invalidated_on_widget_save(self):
+        dashboard = self.factory.create_dashboard()
+        dashboard.to_json_with_widgets(self.factory.user)
+        widget = self.factory.create_widget(dashboard=dashboard)
+        dashboard.layout = json.dumps([[widget.id]])
+        dashboard.save()
+
+        payload = json.loads(models.Dashboard.get_by_id(dashboard.id).to_json_with_widgets(self.factory.user))
+
+        self.assertEqual(payload['widgets'][0][0]['id'], widget.id)
+
+    def test_store_result_invalidates_dashboards_cache(self):
+        widget = self.factory.create_widget()
+        query = widget.visualization.query
+        widget.dashboard.to_json_with_widgets(self.factory.user)
+
+        with mock.patch.object(models.Dashboard, 'invalidate_cache') as invalidate_cache:
+            models.QueryResult.store_result(query.org_id, query.data_source_id, query.query_hash, query.query, '{}', 1,
+                                            utcnow())
+
+            self.assertEqual(list(invalidate_cache.call_args[0][0]), [widget.dashboard_id])
+
 
 class QueryTest(BaseTestCase):
     def test_changing_query_text_changes_hash(self):
@@ -179,6 +267,57 @@ class ShouldScheduleNextTest(TestCase):
         schedule = "23:59".format(now.hour + 3)
         self.assertTrue(models.should_schedule_next(previous, now, schedule))
 
+    def test_interval_schedule_with_jitter(self):
+        jitter = models.schedule_jitter(1, 3600)
+        self.assertTrue(0 < jitter < 3600)
+        # Runs of the query are due at its phase: the jitter (spread over the whole interval, whatever the window) past
+        # each hour (as 3600 divides the time since the epoch).
+        phase = datetime.datetime(2016, 1, 1, 0, 0) + datetime.timedelta(seconds=jitter)
+        next_phase = phase + datetime.timedelta(hours=1)
+        second = datetime.timedelta(seconds=1)
+
+        for previous in (phase, phase + datetime.timedelta(minutes=5), next_phase - second):
+            self.assertFalse(models.should_schedule_next(previous, next_phase - second, "3600", 600, 1))
+            self.assertTrue(models.should_schedule_next(previous, next_phase + second, "3600", 600, 1))
+
+    def test_interval_schedule_with_jitter_keeps_interval(self):
+        previous = datetime.datetime(2016, 1, 1, 0, 0) + datetime.timedelta(seconds=models.schedule_jitter(1, 3600))
+        for _ in range(3):
+            next_iteration = previous + datetime.timedelta(seconds=3600)
+            self.assertFalse(models.should_schedule_next(previous, next_iteration, "3600", 600, 1))
+            self.assertTrue(models.should_schedule_next(previous, next_iteration + datetime.timedelta(seconds=1),
+                                                        "3600", 600, 1))
+            previous = next_iteration
+
+    def test_interval_schedule_with_small_jitter_window_spreads_over_interval(self):
+        previous = datetime.datetime(2016, 1, 1, 0, 0)
+
+        def due(minutes):
+            now = previous + datetime.timedelta(minutes=minutes)
+            return sum(models.should_schedule_next(previous, now, "3600", 60, query_id) for query_id in range(200))
+
+        # With phases spread over the whole hour (not just its first minute), about a quarter of the queries are due
+        # 15 minutes past it, about half by 30 minutes and nearly all by its end.
+        self.assertTrue(due(1) < 20)
+        self.assertTrue(25 < due(15) < 75)
+        self.assertTrue(75 < due(30) < 125)
+        self.assertTrue(due(59) > 180)
+
+    def test_exact_time_with_jitter(self):
+        now = date_parse("2015-10-16 23:03")
+        yesterday = date_parse("2015-10-15 23:01")
+        jitter = models.schedule_jitter(1, 600)
+
+        self.assertTrue(models.should_schedule_next(yesterday, now, "23:00"))
+        self.assertEqual(models.should_schedule_next(yesterday, now, "23:00", 600, 1), jitter < 180)
+        self.assertTrue(models.should_schedule_next(yesterday, now + datetime.timedelta(seconds=600), "23:00", 600, 1))
+
+    def test_jitter_is_stable_and_spread(self):
+        self.assertEqual(models.schedule_jitter(1, 600), models.schedule_jitter(1, 600))
+        self.assertEqual(models.schedule_jitter(1, 0), 0)
+        self.assertEqual(models.schedule_jitter(None, 600), 0)
+        self.assertTrue(len(set(models.schedule_jitter(i, 600) for i in range(100))) > 50)
+
 
 class QueryOutdatedQueriesTest(BaseTestCase):
     # TODO: this test can be refactored to use mock version of should_schedule_next to simplify it.
@@ -300,6 +439,19 @@ class DataSourceTest(BaseTestCase):
             self.assertEqual(new_return_value, schema)
             self.assertEqual(patched_get_schema.call_count, 2)
 
+    def test_get_schema_index_versions_unversioned_cached_schema(self):
+        data_source = self.factory.data_source
+        # A schema cached before schemas had versions:
+        redis_connection.set("data_source:schema:{}".format(data_source.id),
+                             json.dumps([{'name': 'table', 'columns': ['a']}]))
+
+        with mock.patch('redash.models.SchemaIndex', wraps=models.SchemaIndex) as index_class:
+            index = data_source.get_schema_index()
+            self.assertIs(data_source.get_schema_index(), index)
+            self.assertEqual(index_class.call_count, 1)
+
+        self.assertIsNotNone(redis_connection.get("data_source:schema_version:{}".format(data_source.id)))
+
 
 class QueryResultTest(BaseTestCase):
     def setUp(self):
@@ -321,6 +473,12 @@ class QueryResultTest(BaseTestCase):
 
         self.assertEqual(qr, found_query_result)
 
+    def test_get_latest_doesnt_return_truncated_result(self):
+        qr = self.factory.create_query_result(truncated=True)
+
+        self.assertIsNone(models.QueryResult.get_latest(qr.data_source, qr.query, 60))
+        self.assertIsNone(models.QueryResult.get_latest(qr.data_source, qr.query, -1))
+
     def test_get_latest_doesnt_return_query_from_different_data_source(self):
         qr = self.factory.create_query_result()
         data_source = self.factory.create_data_source()
@@ -363,6 +521,17 @@ class QueryResultTest(BaseTestCase):
 
         self.assertEqual(found_query_result.id, qr.id)
 
+    def test_to_json_in_both_formats(self):
+        data = {'columns': [{'name': 'a'}, {'name': 'b'}], 'rows': [{'a': 1, 'b': 2}]}
+        compact = {'columns': data['columns'], 'rows': [[1, 2]], 'format': 'compact'}
+
+        for stored in (data, compact):
+            qr = self.factory.create_query_result(data=json.dumps(stored))
+
+            self.assertEqual(json.loads(qr.to_json())['data'], data)
+            self.assertEqual(json.loads(qr.to_json(format='compact'))['data'], compact)
+            self.assertEqual(qr.get_data(), data)
+
 
 class TestUnusedQueryResults(BaseTestCase):
     def test_returns_only_unused_query_results(self):
@@ -464,6 +633,17 @@ class TestQueryResultStoreResult(BaseTestCase):
         self.assertEqual(models.Query.get_by_id(query2.id)._data['latest_query_data'], query_result.id)
         self.assertNotEqual(models.Query.get_by_id(query3.id)._data['latest_query_data'], query_result.id)
 
+    def test_doesnt_update_queries_with_truncated_result(self):
+        query = self.factory.create_query(query=self.query)
+
+        query_result, updated_query_ids = models.QueryResult.store_result(self.data_source.org_id, self.data_source.id,
+                                                                          self.query_hash, self.query, self.data,
+                                                                          self.runtime, self.utcnow, truncated=True)
+
+        self.assertTrue(query_result.truncated)
+        self.assertEqual(updated_query_ids, [])
+        self.assertNotEqual(models.Query.get_by_id(query.id)._data['latest_query_data'], query_result.id)
+
 
 class TestEvents(BaseTestCase):
     def raw_event(self):
@@ -0,0 +1,39 @@
+from mock import patch
+
+from tests import BaseTestCase
+from redash import monitor, settings
+
+
+class TestPercentiles(BaseTestCase):
+    def test_nearest_rank(self):
+        result = monitor.percentiles([str(i) for i in range(100, 0, -1)])
+
+        self.assertEqual(result, {'samples': 100, 'p50': 50, 'p90': 90, 'p95': 95, 'p99': 99})
+
+    def test_no_samples(self):
+        self.assertEqual(monitor.percentiles([]), {'samples': 0, 'p50': None, 'p90': None, 'p95': None, 'p99': None})
+
+
+class TestGetStatus(BaseTestCase):
+    def test_includes_wait_and_run_times(self):
+        data_source = self.factory.data_source
+        monitor.record_wait_time(data_source.queue_name, data_source.id, 2)
+        monitor.record_wait_time(data_source.queue_name, data_source.id, 4)
+        monitor.record_run_time(data_source.id, 10)
+
+        status = monitor.get_status()
+
+        self.assertEqual(status['manager']['queues'][data_source.queue_name]['wait_time']['p99'], 4)
+        self.assertEqual(status['data_sources'][data_source.id]['wait_time']['samples'], 2)
+        self.assertEqual(status['data_sources'][data_source.id]['run_time']['p50'], 10)
+        self.assertEqual(status['manager']['queues'][data_source.scheduled_queue_name]['wait_time']['samples'], 0)
+
+    def test_keeps_most_recent_samples(self):
+        data_source = self.factory.data_source
+        with patch.object(settings, 'STATUS_SAMPLES_SIZE', 3):
+            for i in range(5):
+                monitor.record_run_time(data_source.id, i)
+
+        run_time = monitor.get_status()['data_sources'][data_source.id]['run_time']
+        self.assertEqual(run_time['samples'], 3)
+        self.assertEqual(run_time['p50'], 3)
@@ -1,8 +1,11 @@
 import datetime
+import time
 from mock import patch, call, ANY
 from tests import BaseTestCase
-from redash.utils import utcnow
-from redash.tasks import refresh_queries
+from redash import redis_connection, settings
+from redash.models import DataSource
+from redash.utils import gen_query_hash, utcnow
+from redash.tasks import refresh_queries, execute_query, QueryTask
 
 
 # TODO: this test should be split into two:
@@ -89,3 +92,98 @@ class TestRefreshQueries(BaseTestCase):
         with patch('redash.tasks.QueryTask.add_task') as add_job_mock:
             refresh_queries()
             add_job_mock.assert_called_once_with(query.query, query.data_source, scheduled=True, metadata=ANY)
+
+
+class TestRefreshQueriesThrottling(BaseTestCase):
+    def create_outdated_query(self, runtime=1, minutes_ago=10, **kwargs):
+        query = self.factory.create_query(schedule="60", **kwargs)
+        retrieved_at = utcnow() - datetime.timedelta(minutes=minutes_ago)
+        query_result = self.factory.create_query_result(retrieved_at=retrieved_at, query=query.query,
+                                                        query_hash=query.query_hash, runtime=runtime)
+        query.latest_query_data = query_result
+        query.save()
+        return query
+
+    def test_defers_queries_when_scheduled_queue_is_full(self):
+        query = self.create_outdated_query()
+        redis_connection.rpush(query.data_source.scheduled_queue_name, 'task1', 'task2')
+
+        with patch('redash.tasks.QueryTask.add_task') as add_job_mock, \
+                patch.object(settings, 'SCHEDULED_QUEUE_MAX_SIZE', 2):
+            refresh_queries()
+            self.assertFalse(add_job_mock.called)
+
+        self.assertEqual(redis_connection.hget('redash:status', 'deferred_queries_count'), '1')
+
+    def test_enqueues_up_to_in_flight_limit(self):
+        data_source = self.factory.create_data_source()
+        data_source.settings[DataSource.SETTING_MAX_IN_FLIGHT_JOBS] = 2
+        data_source.save()
+
+        old_query = self.create_outdated_query(data_source=data_source, query="SELECT 1", minutes_ago=20)
+        self.create_outdated_query(data_source=data_source, query="SELECT 2")
+        redis_connection.zadd(QueryTask._in_flight_jobs_key(data_source.id), job=time.time())
+
+        with patch('redash.tasks.QueryTask.add_task') as add_job_mock:
+            refresh_queries()
+            add_job_mock.assert_called_once_with(old_query.query, old_query.data_source, scheduled=True, metadata=ANY)
+
+        self.assertEqual(redis_connection.hget('redash:status', 'outdated_queries_count'), '2')
+        self.assertEqual(redis_connection.hget('redash:status', 'enqueued_queries_count'), '1')
+        self.assertEqual(redis_connection.hget('redash:status', 'deferred_queries_count'), '1')
+
+    def test_skips_queries_running_longer_than_their_schedule(self):
+        self.create_outdated_query(runtime=900)
+
+        with patch('redash.tasks.QueryTask.add_task') as add_job_mock, \
+                patch.object(settings, 'SCHEDULED_SKIP_SLOW_QUERIES', True):
+            refresh_queries()
+            self.assertFalse(add_job_mock.called)
+
+        self.assertEqual(redis_connection.hget('redash:status', 'skipped_queries_count'), '1')
+
+    def test_refreshes_slow_queries_once_their_runtime_passed(self):
+        query = self.create_outdated_query(runtime=300)
+
+        with patch('redash.tasks.QueryTask.add_task') as add_job_mock, \
+                patch.object(settings, 'SCHEDULED_SKIP_SLOW_QUERIES', True):
+            refresh_queries()
+            add_job_mock.assert_called_once_with(query.query, query.data_source, scheduled=True, metadata=ANY)
+
+    def test_refreshes_slow_queries_by_default(self):
+        query = self.create_outdated_query(runtime=900)
+
+        with patch('redash.tasks.QueryTask.add_task') as add_job_mock:
+            refresh_queries()
+            add_job_mock.assert_called_once_with(query.query, query.data_source, scheduled=True, metadata=ANY)
+
+
+class TestInFlightJobs(BaseTestCase):
+    def test_counts_enqueued_jobs(self):
+        with patch('redash.tasks.execute_query.apply_async') as apply_async:
+            apply_async.return_value.id = 'job'
+            QueryTask.add_task('SELECT 1', self.factory.data_source)
+
+        self.assertEqual(QueryTask.in_flight_jobs(self.factory.data_source.id), 1)
+
+    def test_expires_jobs_that_never_ran(self):
+        key = QueryTask._in_flight_jobs_key(self.factory.data_source.id)
+        redis_connection.zadd(key, old=time.time() - settings.JOB_EXPIRY_TIME - 1, new=time.time())
+
+        self.assertEqual(QueryTask.in_flight_jobs(self.factory.data_source.id), 1)
+
+    def test_failed_execution_releases_its_job(self):
+        data_source = self.factory.data_source
+        lock_id = QueryTask._job_lock_id(gen_query_hash('SELECT 1'), data_source.id)
+        redis_connection.set(lock_id, 'job')
+        redis_connection.zadd(QueryTask._in_flight_jobs_key(data_source.id), job=time.time())
+
+        execute_query.push_request(id='job')
+        try:
+            with patch('redash.query_runner.pg.PostgreSQL.run_query', side_effect=ValueError):
+                self.assertRaises(ValueError, execute_query.run, 'SELECT 1', data_source.id, {})
+        finally:
+            execute_query.pop_request()
+
+        self.assertIsNone(redis_connection.get(lock_id))
+        self.assertEqual(QueryTask.in_flight_jobs(data_source.id), 0)
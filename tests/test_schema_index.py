@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from redash.utils.schema_index import SchemaIndex, MATCH_SUBSTRING
+
+SCHEMA = [
+    {'name': 'public_users', 'columns': ['id', 'email', 'created_at']},
+    {'name': 'events', 'columns': ['id', 'user_id', 'action']},
+    {'name': 'Payments', 'columns': ['id', 'amount'], 'size': 10},
+]
+
+
+class TestSchemaIndexSearch(TestCase):
+    def setUp(self):
+        self.index = SchemaIndex(SCHEMA)
+
+    def test_returns_all_tables_without_term(self):
+        self.assertEqual(['events', 'Payments', 'public_users'], self.index.search())
+
+    def test_prefix_search_on_table_names(self):
+        self.assertEqual(['Payments', 'public_users'], self.index.search('p', search_columns=False))
+
+    def test_prefix_search_is_case_insensitive(self):
+        self.assertEqual(['Payments'], self.index.search('PAY'))
+
+    def test_prefix_search_on_column_names(self):
+        self.assertEqual(['Payments'], self.index.search('amo'))
+
+    def test_substring_search(self):
+        self.assertEqual(['events', 'public_users'], self.index.search('user', match=MATCH_SUBSTRING))
+
+
+class TestSchemaIndexPage(TestCase):
+    def test_returns_requested_page_without_columns(self):
+        index = SchemaIndex(SCHEMA)
+        names = index.search()
+
+        self.assertEqual([{'name': 'Payments', 'columns_count': 2, 'size': 10}], index.page(names, page=2, page_size=1))
+        self.assertEqual([], index.page(names, page=4, page_size=1))
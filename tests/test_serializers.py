@@ -0,0 +1,41 @@
+from tests import BaseTestCase
+from redash import models
+from redash.serializers import serialize_queries, serialize_alerts
+
+
+class TestSerializeQueries(BaseTestCase):
+    def test_same_as_to_dict(self):
+        q1 = self.factory.create_query(last_modified_by=self.factory.create_user())
+        q2 = self.factory.create_query()
+
+        queries = models.Query.select().where(models.Query.id << [q1.id, q2.id]).order_by(models.Query.id)
+
+        self.assertEqual(serialize_queries(queries), [q.to_dict() for q in queries])
+        self.assertEqual(serialize_queries(queries, with_user=False, with_last_modified_by=False),
+                         [q.to_dict(with_user=False, with_last_modified_by=False) for q in queries])
+
+    def test_with_stats(self):
+        query_result = self.factory.create_query_result()
+        query = self.factory.create_query(latest_query_data=query_result)
+
+        results = serialize_queries(models.Query.all_queries(self.factory.user.groups), with_stats=True)
+
+        self.assertEqual(results[0]['id'], query.id)
+        self.assertEqual(results[0]['runtime'], query_result.runtime)
+
+    def test_loads_users_in_a_single_query(self):
+        for i in range(5):
+            self.factory.create_query(user=self.factory.create_user())
+
+        models.db.database.reset_metrics()
+        serialize_queries(models.Query.select())
+
+        self.assertEqual(models.db.database.query_count, 2)
+
+
+class TestSerializeAlerts(BaseTestCase):
+    def test_same_as_to_dict(self):
+        alert = self.factory.create_alert()
+        alert = models.Alert.get_by_id_and_org(alert.id, self.factory.org)
+
+        self.assertEqual(serialize_alerts(models.Alert.all(self.factory.user.groups)), [alert.to_dict()])
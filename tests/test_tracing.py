@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from redash import redis_connection
+from redash.metrics import tracing
+from redash.query_runner.sqlite import Sqlite
+from redash.tasks import QueryTask
+
+
+class TracingTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'traces.jsonl')
+        self.previous_exporter = tracing.set_exporter(tracing.FileExporter(self.path))
+        tracing.set_current_trace(None)
+
+    def tearDown(self):
+        tracing.set_exporter(self.previous_exporter)
+        tracing.set_current_trace(None)
+        shutil.rmtree(self.directory)
+
+    def exported_spans(self):
+        if not os.path.exists(self.path):
+            return []
+
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+
+class TestSpans(TracingTestCase):
+    def test_records_span_of_given_trace(self):
+        with tracing.span('execute', trace_id='abc', rows=1) as attributes:
+            attributes['extra'] = True
+
+        spans = self.exported_spans()
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]['trace_id'], 'abc')
+        self.assertEqual(spans[0]['name'], 'execute')
+        self.assertEqual(spans[0]['attributes'], {'rows': 1, 'extra': True})
+        self.assertGreaterEqual(spans[0]['duration'], 0)
+
+    def test_uses_current_trace_and_its_attributes(self):
+        tracing.set_current_trace('abc', query_hash='hash')
+        with tracing.span('execute', rows=1):
+            pass
+
+        spans = self.exported_spans()
+        self.assertEqual(spans[0]['trace_id'], 'abc')
+        self.assertEqual(spans[0]['attributes'], {'query_hash': 'hash', 'rows': 1})
+
+    def test_records_error(self):
+        def fail():
+            with tracing.span('execute', trace_id='abc'):
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(self.exported_spans()[0]['attributes'], {'error': 'ValueError'})
+
+    def test_skips_spans_without_trace(self):
+        with tracing.span('execute'):
+            pass
+        tracing.record_span(None, 'queue_wait', 1, 2)
+
+        self.assertEqual(self.exported_spans(), [])
+
+    def test_skips_spans_when_disabled(self):
+        tracing.set_exporter(None)
+        with tracing.span('execute', trace_id='abc'):
+            pass
+
+        self.assertEqual(self.exported_spans(), [])
+
+    def test_record_span(self):
+        tracing.record_span('abc', 'queue_wait', 10, 12.5)
+
+        self.assertEqual(self.exported_spans()[0]['duration'], 2500)
+
+
+class TestQueryRunnerSpans(TracingTestCase):
+    def test_sqlite_stages(self):
+        runner = Sqlite({'dbpath': os.path.join(self.directory, 'test.sqlite')})
+        tracing.set_current_trace('abc')
+
+        data, error = runner.run_query("SELECT 1 AS a UNION ALL SELECT 2")
+
+        self.assertIsNone(error)
+        spans = self.exported_spans()
+        self.assertEqual([s['name'] for s in spans], ['connect', 'execute', 'fetch', 'serialize'])
+        self.assertEqual(spans[2]['attributes'], {'rows': 2})
+
+
+class TestTrace(TracingTestCase):
+    def test_sets_and_resets_current_trace(self):
+        with tracing.trace('abc', 'task', query_hash='hash') as attributes:
+            self.assertEqual(tracing.current_trace(), 'abc')
+            attributes['result_size'] = 10
+
+        self.assertIsNone(tracing.current_trace())
+        spans = self.exported_spans()
+        self.assertEqual(spans[0]['name'], 'task')
+        self.assertEqual(spans[0]['attributes'], {'query_hash': 'hash', 'result_size': 10})
+
+    def test_resets_current_trace_and_records_span_on_error(self):
+        def fail():
+            with tracing.trace('abc', 'task'):
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertIsNone(tracing.current_trace())
+        self.assertEqual(self.exported_spans()[0]['attributes'], {'error': 'ValueError'})
+
+    def test_use_trace_sets_and_resets_current_trace_without_span(self):
+        with tracing.use_trace('abc', endpoint='query_results'):
+            self.assertEqual(tracing.current_trace(), 'abc')
+            tracing.record_span('abc', 'enqueue', 1, 2, task_id='job')
+
+        self.assertIsNone(tracing.current_trace())
+        spans = self.exported_spans()
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]['attributes'], {'endpoint': 'query_results', 'task_id': 'job'})
+
+    def test_keeps_error_set_by_block(self):
+        def fail():
+            with tracing.trace('abc', 'task') as attributes:
+                attributes['error'] = "Query failed."
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(self.exported_spans()[0]['attributes'], {'error': "Query failed."})
+
+
+class TestQueryTaskSpans(TracingTestCase):
+    def setUp(self):
+        super(TestQueryTaskSpans, self).setUp()
+        self.data_source = Mock(id=1, queue_name='queries', scheduled_queue_name='scheduled_queries')
+
+    def tearDown(self):
+        redis_connection.flushdb()
+        super(TestQueryTaskSpans, self).tearDown()
+
+    def test_records_enqueue_and_join(self):
+        with patch('redash.tasks.execute_query.apply_async') as apply_async:
+            apply_async.return_value.id = 'job'
+            QueryTask.add_task('SELECT 1', self.data_source, metadata={'Query ID': '5', 'Trace ID': 'first'})
+            job = QueryTask.add_task('SELECT 1', self.data_source, metadata={'Query ID': 'adhoc', 'Trace ID': 'second'})
+
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(job.id, 'job')
+
+        enqueue, join = self.exported_spans()
+        self.assertEqual((enqueue['trace_id'], enqueue['name']), ('first', 'enqueue'))
+        self.assertEqual(enqueue['attributes']['query_id'], 5)
+        self.assertEqual((join['trace_id'], join['name']), ('second', 'join'))
+        self.assertEqual(join['attributes']['task_id'], 'job')
+        self.assertIsNone(join['attributes']['query_id'])
@@ -1,4 +1,7 @@
+import json
+
 from redash.utils import build_url, collect_query_parameters, collect_parameters_from_request
+from redash.utils import compact_data, expand_data, may_be_compact
 from collections import namedtuple
 from unittest import TestCase
 
@@ -49,3 +52,28 @@ class TestCollectParametersFromRequest(TestCase):
 
     def test_takes_prefixed_values(self):
         self.assertDictEqual({'test': 1, 'something_else': 'test'}, collect_parameters_from_request({'p_test': 1, 'p_something_else': 'test'}))
+
+
+class TestCompactFormat(TestCase):
+    data = {'columns': [{'name': 'a'}, {'name': 'b'}], 'rows': [{'a': 1, 'b': 2}, {'a': 3}], 'truncated': True}
+
+    def test_compact_data(self):
+        compact = compact_data(self.data)
+
+        self.assertEqual(compact['rows'], [[1, 2], [3, None]])
+        self.assertEqual(compact['format'], 'compact')
+        self.assertTrue(compact['truncated'])
+
+    def test_round_trip(self):
+        expanded = expand_data(compact_data(self.data))
+
+        self.assertEqual(expanded['rows'], [{'a': 1, 'b': 2}, {'a': 3, 'b': None}])
+        self.assertNotIn('format', expanded)
+
+    def test_expand_data_leaves_default_format_as_is(self):
+        self.assertIs(expand_data(self.data), self.data)
+
+    def test_may_be_compact(self):
+        self.assertTrue(may_be_compact(json.dumps(compact_data(self.data))))
+        self.assertFalse(may_be_compact(json.dumps(self.data)))
+        self.assertFalse(may_be_compact(json.dumps({'columns': [], 'rows': [{'a': '"format": "compact"'}]})))